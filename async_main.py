@@ -0,0 +1,394 @@
+"""
+The game loop on Playwright's async API (RUNTIME=async).
+
+Capture, inference and action run as three cooperating tasks: the next frame is captured while
+the current one is detected, and the action task never sleeps blindly after a click but waits,
+up to ACTION_TIMEOUT, for a frame captured after the click that shows the expected change.
+"""
+import asyncio
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
+from time import perf_counter
+
+from colorama import Fore
+
+from config import config
+from game_state import LOGIN, LOBBY, QUEUE, IN_GAME, OUR_TURN, CALL_PROMPT, ROUND_END
+from main import MajsoulGame
+from strategy.calls import CALL_KINDS, PASS
+from utils.async_window import AsyncMajsoulWindow
+from utils.window import storage_state_path
+from utils.render import render_profile_from_config
+from utils.click import AsyncClick
+from utils.log import get_logger
+from utils.metrics import metrics
+
+log = get_logger(__name__)
+
+
+class AsyncMajsoulGame(MajsoulGame):
+    MAX_FAILURES = 20  # 连续这么多次失败就退出 run()，由上层（supervisor.py）重启
+
+    def __init__(self, window=None, detector=None, recorder=None, cfg=None, inference=None):
+        """
+        Same components as MajsoulGame, the window is started by run()
+        Args:
+            inference: Shared scheduler with `async detect(game, box, image, index) -> FrameState`
+                       (supervisor.py), by default frames are detected in an own worker thread
+        """
+        cfg = cfg or config
+        if window is None:
+            window = AsyncMajsoulWindow(cfg.CAPTURE_BACKEND, None, storage_state_path(cfg.STORAGE_STATE_PATH, cfg.ACCOUNT),
+                                        cfg.LOAD_TIMEOUT, render_profile_from_config(cfg))
+        super().__init__(window, detector, recorder, cfg)
+        self.action_timeout = cfg.ACTION_TIMEOUT
+        self.inference = inference
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference') if inference is None else None
+        self.captured = None        # (captured_at, box, image, index) waiting for inference
+        self.frame = None           # (captured_at, FrameState) newest detected frame
+        self.frame_ready = None     # asyncio.Condition, created inside the running loop
+        self.capture_ready = None
+        self.running = False
+        self.failures = {}          # stage -> consecutive failures
+
+    async def govern(self):
+        """Wait as long as the frame rate of the current state asks, a click cuts it short"""
+        delay = self.governor.delay(self.state.state, self.click.last_click)
+        slept = 0.0
+        if delay > 0:
+            clicked = self.click.last_click
+            deadline = perf_counter() + delay
+            start = perf_counter()
+            while self.running and self.click.last_click == clicked and perf_counter() < deadline:
+                await asyncio.sleep(min(self.governor.step, deadline - perf_counter()))
+            slept = perf_counter() - start
+            metrics.observe('governor_sleep', slept)
+        self.governor.start(self.state.state, slept)
+
+    def fail(self, stage: str, error: Exception):
+        """
+        Log a failed capture / inference / action and carry on, unless the page is gone or the
+        stage failed MAX_FAILURES times in a row: then raise, so run() ends and the table restarts
+        """
+        metrics.count('errors')
+        if isinstance(error, BrokenExecutor):
+            raise error  # 识别子进程已经崩溃，重试也没用
+        log.warning("Error in %s: %s", stage, error)
+        self.failures[stage] = self.failures.get(stage, 0) + 1
+        if not self.window.alive():
+            raise ConnectionError(f'game page closed ({stage}: {error})') from error
+        if self.failures[stage] >= self.MAX_FAILURES:
+            raise RuntimeError(f'{self.failures[stage]} failures in a row in {stage}, last: {error}') from error
+
+    async def capture_loop(self):
+        """Keep one captured frame ready for the inference task"""
+        while self.running:
+            async with self.capture_ready:
+                await self.capture_ready.wait_for(lambda: self.captured is None or not self.running)
+            if not self.running:
+                break
+            # 别人的回合、排队、结算时降低截图识别的频率
+            await self.govern()
+            box = self.window()
+            if not box:
+                self.running = False
+                break
+            captured_at = perf_counter()
+            try:
+                clip = self.capture_clips.get(self.state.state)
+                with metrics.span('capture'):
+                    image = await (self.window.grab(clip) if clip else self.window.grab())
+            except Exception as e:
+                self.fail('capture', e)
+                continue
+            self.failures['capture'] = 0
+            metrics.count('frames')
+            index = self.recorder.frame(box, image) if self.recorder is not None else None
+            async with self.capture_ready:
+                self.captured = (captured_at, box, image, index)
+                self.capture_ready.notify_all()
+        async with self.capture_ready:
+            self.capture_ready.notify_all()
+        async with self.frame_ready:
+            self.frame_ready.notify_all()
+
+    async def inference_loop(self):
+        """Detect the captured frames in a worker thread, the event loop stays free meanwhile"""
+        loop = asyncio.get_running_loop()
+        while self.running:
+            async with self.capture_ready:
+                await self.capture_ready.wait_for(lambda: self.captured is not None or not self.running)
+                if not self.running:
+                    break
+                captured_at, box, image, index = self.captured
+                self.captured = None
+                self.capture_ready.notify_all()  # 推理这一帧时截下一帧
+            try:
+                with metrics.span('frame'):
+                    if self.inference is not None:
+                        frame = await self.inference.detect(self, box, image, index)
+                    else:
+                        frame = await loop.run_in_executor(self.executor, self.pipeline.detect, box, image, index)
+            except Exception as e:
+                self.fail('inference', e)
+                continue
+            self.failures['inference'] = 0
+            async with self.frame_ready:
+                self.frame = (captured_at, frame)
+                self.frame_ready.notify_all()
+        async with self.frame_ready:
+            self.frame_ready.notify_all()
+
+    async def next_frame(self, after: float, timeout: float = None):
+        """
+        The newest FrameState captured after `after` (perf_counter), None on timeout or shutdown
+        Returns: (captured_at, FrameState) or None
+        """
+        def fresh():
+            return not self.running or (self.frame is not None and self.frame[0] > after)
+
+        async with self.frame_ready:
+            try:
+                await asyncio.wait_for(self.frame_ready.wait_for(fresh), timeout)
+            except asyncio.TimeoutError:
+                return None
+            return self.frame if self.running else None
+
+    async def expect(self, predicate, after: float, timeout: float = None) -> bool:
+        """Wait for a frame captured after `after` for which predicate(frame) holds"""
+        deadline = perf_counter() + (timeout or self.action_timeout)
+        while True:
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                return False
+            result = await self.next_frame(after, remaining)
+            if result is None:
+                return False
+            after, frame = result
+            self.handled_at = after
+            if predicate(frame):
+                return True
+
+    async def act(self, box, predicate, retries: int = 1, timeout: float = None) -> bool:
+        """Click box until a later frame satisfies predicate, at most retries + 1 clicks"""
+        for attempt in range(retries + 1):
+            clicked_at = perf_counter()
+            await self.click.click(box)
+            if await self.expect(predicate, clicked_at, timeout):
+                metrics.observe('confirm', perf_counter() - clicked_at)
+                return True
+            log.debug("no change after click %d on %s", attempt + 1, box)
+        metrics.count('unconfirmed_clicks')
+        return False
+
+    async def act_button(self, buttons, xyxy_buttons, name: str) -> bool:
+        """Click a button if it is shown, confirmed by the button going away"""
+        if name not in buttons:
+            return False
+        await self.act(xyxy_buttons[buttons.index(name)], lambda frame: name not in frame.buttons)
+        return True
+
+    async def handle_matching(self, buttons, xyxy_buttons):
+        """处理匹配状态"""
+        log.info(Fore.GREEN + '匹配中' + Fore.WHITE)
+        if self.state.state == QUEUE:
+            return True
+
+        if '3p-east' in buttons:
+            # 排队时大厅按钮一直显示，不能用按钮消失来确认；只点一次，排队超时后回到大厅状态再点
+            await self.click.click(xyxy_buttons[buttons.index('3p-east')])
+            self.state.enter(QUEUE)
+            self.green_count = 0
+        elif await self.act_button(buttons, xyxy_buttons, 'match'):
+            pass
+        elif await self.act_button(buttons, xyxy_buttons, self.MATCH_RANK):
+            pass
+
+    async def handle_game_end(self, char_dict, box):
+        """处理终局界面"""
+        log.info(Fore.GREEN + '终局界面' + Fore.WHITE)
+        self.precompute.invalidate()
+        self.pending_calls = []
+        self.pipeline.resync()
+        if self.gate is not None:
+            log.info("frame gate: %s", self.gate.stats())
+        log.info("frame governor: %s", self.governor.stats())
+        log.info("stage latency:\n%s", metrics.summary())
+
+        if '2queren' in char_dict and 'queren' in char_dict:
+            target = char_dict['queren']
+        elif 'zailaiyichang' in char_dict and self.AUTO_CONTINUE == True:
+            target = char_dict['zailaiyichang']
+        elif 'queren' in char_dict:
+            target = char_dict['queren']
+        else:  # 活动奖励界面，点击屏幕中间
+            target = (0, 0, box[2] - box[0], box[3] - box[1])
+        keys = set(char_dict)
+        await self.act(target, lambda frame: set(frame.char_dict) != keys, retries=0)
+
+    async def handle_game_buttons(self, buttons, xyxy_buttons, tiles, xyxy_tiles, box):
+        """处理游戏中的按钮操作"""
+        # Simple buttons
+        for btn in ['zimo', 'he', 'babei']:
+            if await self.act_button(buttons, xyxy_buttons, btn):
+                return True
+
+        # Handle furo (副露)
+        if any(btn in buttons for btn in CALL_KINDS) and \
+           not any(btn in buttons for btn in ['lizhi', 'babei']):
+            calls = self.plan_call(buttons, tiles)
+            button = calls[0].kind if calls else PASS
+            if button in buttons:
+                self.pending_calls = calls
+                await self.act_button(buttons, xyxy_buttons, button)
+            else:
+                await self.act_button(buttons, xyxy_buttons, PASS)
+            return True
+
+        # Handle tile selection
+        if len(tiles) % 3 == 2:
+            tile, button = self.decide_discard(tiles)
+            metrics.count('decisions')
+            if self.recorder is not None:
+                self.recorder.decision(tiles, tile, button)
+            if button and button in buttons:
+                # 立直按钮消失后再切牌，代替固定等待0.3秒
+                await self.act_button(buttons, xyxy_buttons, button)
+            if tile and tile in tiles:
+                await self.act(xyxy_tiles[tiles.index(tile)],
+                               lambda frame: len(frame.tiles) != len(tiles) or frame.tiles != tiles)
+                # Move mouse to center
+                await self.click.click((0, 0, box[2] - box[0], box[3] - box[1]), click=False)
+            return True
+
+        return False
+
+    async def handle_side_buttons(self, char_dict, image):
+        """处理左侧按钮"""
+        if 'lhmqb' not in char_dict:
+            return
+
+        xyxy = char_dict['lhmqb']
+        height = (xyxy[3] - xyxy[1]) // 5
+
+        if self.green_count < 5:
+            for x in [0, 1, 2, 4]:  # 尝试点下五个按钮中的第x个
+                left = int(xyxy[0])
+                top = int(xyxy[1] + x * height)
+                right = int(xyxy[2])
+                bottom = int(xyxy[1] + (x + 1) * height)
+
+                cropped = image[top:bottom, left:right]
+                if not self.is_green(cropped):  # 不是按下状态
+                    log.debug("not pressed.%d", x)
+                    await self.click.click((left, top, right, bottom))
+                    self.green_count = 0
+                else:
+                    self.green_count += 1
+        log.debug("green count: %d", self.green_count)
+
+    async def unstick(self, frame):
+        """Click the center until the screen reacts, instead of a blind burst of seven clicks"""
+        box = frame.box
+        center = (0, 0, box[2] - box[0], box[3] - box[1])
+        before = (self.state.state, tuple(frame.buttons), tuple(frame.char_dict), len(frame.tiles))
+        await self.act(center, lambda f: (self.state.state, tuple(f.buttons), tuple(f.char_dict),
+                                          len(f.tiles)) != before, retries=6, timeout=0.3)
+
+    async def handle_session(self, state):
+        """MajsoulGame.handle_session"""
+        if self.session_expired(state):
+            log.info("saved login session expired, logging in")
+            await self.window.login(self.ACCOUNT, self.PASSWORD)
+        elif state != LOGIN and not self.session_saved:
+            self.session_saved = True
+            await self.window.save_session()
+
+    async def handle(self, frame):
+        box, image = frame.box, frame.image
+        if self.recorder is not None:
+            self.recorder.detections(frame)
+        self.click.set_top_left_corner(box)
+
+        xyxy_tiles, tiles = frame.xyxy_tiles, frame.tiles
+        xyxy_buttons, buttons = frame.xyxy_buttons, frame.buttons
+        char_dict = frame.char_dict
+        log.debug("characters: %s", list(char_dict))
+
+        state = self.state.update(buttons, char_dict, tiles)
+        await self.handle_session(state)
+        if self.state.stalled(buttons, self.MAX_WAIT_TIME):
+            log.info("wait long.")
+            await self.unstick(frame)
+
+        elif state == LOBBY or state == QUEUE:
+            await self.handle_matching(buttons, xyxy_buttons)
+
+        elif state == ROUND_END:
+            await self.handle_game_end(char_dict, box)
+            self.green_count = 0
+
+        elif state in (IN_GAME, OUR_TURN, CALL_PROMPT):
+            log.info(Fore.GREEN + '游戏中' + Fore.WHITE)
+            await self.handle_side_buttons(char_dict, image)
+            self.calibrate_layout(xyxy_tiles, tiles)
+
+            if await self.handle_game_buttons(buttons, xyxy_buttons, tiles, xyxy_tiles, box):
+                self.state.active()
+            else:
+                # 别人的回合，提前算好每一种摸牌后的切牌
+                self.precompute.update(tiles)
+                if self.state.idle() > self.MAX_WAIT_TIME:
+                    log.info("wait long.")
+                    self.state.active()
+                    await self.unstick(frame)
+
+    async def action_loop(self):
+        self.handled_at = 0.0
+        while self.running:
+            result = await self.next_frame(self.handled_at)
+            if result is None:
+                break
+            self.handled_at, frame = result
+            try:
+                await self.handle(frame)
+            except Exception as e:
+                self.fail('game loop', e)
+                continue
+            self.failures['game loop'] = 0
+
+    async def run(self):
+        """Main game loop"""
+        self.started_at = perf_counter()
+        self.frame_ready = asyncio.Condition()
+        self.capture_ready = asyncio.Condition()
+        tasks = []
+        try:
+            await self.window.start(self.ACCOUNT, self.PASSWORD)
+            self.click = AsyncClick(self.window.page, self.recorder, self.started_at, self.window.scale)
+            # 模型在登录的同时加载，加载失败直接退出而不是每一帧都报错
+            await asyncio.to_thread(self.pipeline.wait_ready)
+            self.running = True
+            tasks = [asyncio.create_task(coroutine) for coroutine in
+                     (self.capture_loop(), self.inference_loop(), self.action_loop())]
+            await asyncio.gather(*tasks)
+        finally:
+            self.running = False
+            for task in tasks:
+                task.cancel()
+            self.decision_cache.save()
+            self.precompute.shutdown()
+            self.pipeline.shutdown()
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+            if self.recorder is not None:
+                self.recorder.close()
+            await self.window.cleanup()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(AsyncMajsoulGame().run())
+    except Exception as e:
+        log.error("Fatal error: %s", e)
+    finally:
+        metrics.shutdown()
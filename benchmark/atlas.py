@@ -0,0 +1,99 @@
+"""
+Accuracy and latency of the sprite-atlas tile recognizer against the tile model on recorded frames.
+
+    python -m benchmark.atlas recordings/session1 --train 0.5
+    python -m benchmark.atlas recordings/session1 --yolo      # also time the tile model
+
+The atlas is built from the recorded detections of the first --train share of the frames that
+show a hand, and evaluated on the rest: hands read exactly like the recording, tiles correct,
+frames the atlas was unsure about (the tile model would run), and recognition latency.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+os.environ.setdefault('MAJSOUL_ACCOUNT', 'bench')  # config 需要账号，基准测试不登录
+os.environ.setdefault('MAJSOUL_PASSWORD', 'bench')
+
+from detector.atlas import TileAtlas
+from utils.session import SessionReader
+
+
+def hand_frames(paths):
+    """(image, xyxy_tiles, tiles) of every recorded frame that shows a hand"""
+    frames = []
+    for path in paths:
+        reader = SessionReader(path)
+        for index, detections in sorted(reader.detections.items()):
+            if index in reader.frames and detections.get('tiles'):
+                _, image = reader.frame(index)
+                frames.append((image, detections['xyxy_tiles'], detections['tiles']))
+        reader.close()
+    return frames
+
+
+def percentiles(latencies):
+    if not latencies:
+        return 'n/a'
+    ms = np.array(latencies) * 1000
+    return f"p50 = {np.percentile(ms, 50):.2f} ms, p95 = {np.percentile(ms, 95):.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sessions', nargs='+', help='Session directories written with RECORD_PATH')
+    parser.add_argument('--train', type=float, default=0.5, help='Share of the frames the atlas is built from')
+    parser.add_argument('--yolo', action='store_true', help='Also time the tile model on the test frames')
+    args = parser.parse_args()
+
+    frames = hand_frames(args.sessions)
+    split = int(len(frames) * args.train)
+    train, test = frames[:split], frames[split:]
+    if not train or not test:
+        print(f"{len(frames)} frames with a hand, not enough to split")
+        return
+
+    with tempfile.TemporaryDirectory() as atlas_dir:
+        atlas = TileAtlas(atlas_dir)
+        for image, xyxy, tiles in train:
+            atlas.learn(image, xyxy, tiles, save=False)
+        print(f"atlas: {len(atlas.labels)} templates of {len(set(atlas.labels))} tiles from {len(train)} frames")
+
+        exact = unsure = correct = total = 0
+        latencies = []
+        for image, _, tiles in test:
+            start = time.perf_counter()
+            result = atlas.recognize(image)
+            latencies.append(time.perf_counter() - start)
+            total += len(tiles)
+            if result is None:
+                unsure += 1
+                continue
+            _, recognized = result
+            exact += recognized == list(tiles)
+            correct += sum(a == b for a, b in zip(recognized, tiles))
+    print(f"{len(test)} test frames: {exact / len(test):.1%} hands exact, {correct / max(total, 1):.1%} tiles correct, "
+          f"{unsure / len(test):.1%} unsure (tile model would run)")
+    print(f"atlas latency: {percentiles(latencies)}")
+
+    if args.yolo:
+        from config import config
+        from detector.backends import profile_from_config
+        from detector.detector import Detector
+        detector = Detector(char_backend=config.CHAR_BACKEND, backend=config.DETECTOR_BACKEND,
+                            int8=config.DETECTOR_INT8, tile_profile=profile_from_config(config, 'TILE'),
+                            ui_profile=profile_from_config(config, 'UI'))
+        detector.warmup()
+        latencies = []
+        for image, _, _ in test:
+            start = time.perf_counter()
+            detector._model_tiles(image)
+            latencies.append(time.perf_counter() - start)
+        print(f"tile model latency ({config.DETECTOR_BACKEND}): {percentiles(latencies)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Capture FPS / latency benchmark of the screenshot and screencast backends.
+
+Runs against a local animated canvas page of the game's size, no login needed:
+
+    python -m benchmark.capture --frames 300 --headless
+    python -m benchmark.capture --headless --profile minimal --clip 0,0.55,1,1   # RENDER_PROFILE / CAPTURE_CLIP
+
+Also reports the CPU time the browser processes spent per second (rendering and encoding).
+"""
+import argparse
+import time
+
+import numpy as np
+from playwright.sync_api import sync_playwright
+
+from utils.render import RENDER_PROFILES, RenderProfile
+from utils.window import ScreenshotCapture, ScreencastCapture
+
+CANVAS_PAGE = """
+<html><body style="margin:0">
+<canvas id="layaCanvas" width="%(width)d" height="%(height)d"></canvas>
+<script>
+const ctx = document.getElementById('layaCanvas').getContext('2d');
+let n = 0;
+function draw() {
+    n += 1;
+    ctx.fillStyle = 'rgb(' + (n * 7 %% 255) + ',' + (n * 3 %% 255) + ',90)';
+    ctx.fillRect(0, 0, %(width)d, %(height)d);
+    for (let i = 0; i < 14; i++) {  // 模拟手牌
+        ctx.fillStyle = '#fff';
+        ctx.fillRect(150 + i * 80, %(height)d - 160, 74, 110);
+        ctx.fillStyle = '#000';
+        ctx.fillText(String((n + i) %% 9 + 1), 180 + i * 80, %(height)d - 100);
+    }
+    requestAnimationFrame(draw);
+}
+draw();
+</script></body></html>
+"""
+
+
+def browser_cpu_seconds() -> float:
+    """CPU time the browser (every child process) used so far, 0 without psutil"""
+    try:
+        import psutil
+    except ImportError:
+        return 0.0
+    total = 0.0
+    for child in psutil.Process().children(recursive=True):
+        try:
+            times = child.cpu_times()
+            total += times.user + times.system
+        except psutil.Error:
+            pass
+    return total
+
+
+def run(capture, frames: int, clip=None):
+    latencies = []
+    distinct = 0
+    last = None
+    cpu = browser_cpu_seconds()
+    start = time.perf_counter()
+    for _ in range(frames):
+        t = time.perf_counter()
+        image = capture.grab(clip)
+        latencies.append(time.perf_counter() - t)
+        if image is not last:
+            distinct += 1
+            last = image
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        'grabs/s': frames / elapsed,
+        'new frames/s': distinct / elapsed,
+        'p50 ms': float(np.percentile(latencies, 50)),
+        'p95 ms': float(np.percentile(latencies, 95)),
+        'max ms': float(latencies.max()),
+        'browser cpu %': (browser_cpu_seconds() - cpu) / elapsed * 100,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--width', type=int, default=1440)
+    parser.add_argument('--height', type=int, default=900)
+    parser.add_argument('--headless', action='store_true')
+    parser.add_argument('--profile', default=None, choices=list(RENDER_PROFILES),
+                        help='Render profile (scale, fps cap, software flags), as RENDER_PROFILE')
+    parser.add_argument('--clip', default='', help='left,top,right,bottom relative to the frame, as CAPTURE_CLIP')
+    args = parser.parse_args()
+    render = RenderProfile.named(args.profile, headless=args.headless or None, width=args.width,
+                                 height=args.height) if args.profile else None
+    clip = tuple(float(v) for v in args.clip.split(',')) if args.clip else None
+
+    with sync_playwright() as pw:
+        if render is None:
+            browser = pw.chromium.launch(headless=args.headless)
+            page = browser.new_page(viewport={'width': args.width, 'height': args.height})
+            scale = 1.0
+        else:
+            browser = pw.chromium.launch(headless=render.headless, args=render.launch_args())
+            context = browser.new_context(**render.context_options())
+            if render.init_script():
+                context.add_init_script(render.init_script())
+            page = context.new_page()
+            scale = render.scale
+        page.set_content(CANVAS_PAGE % {'width': args.width, 'height': args.height})
+        frame_width, frame_height = int(round(args.width * scale)), int(round(args.height * scale))
+        backends = {
+            'screenshot': lambda: ScreenshotCapture(page, scale),
+            'screencast': lambda: ScreencastCapture(page, frame_width, frame_height),
+        }
+        for name, make in backends.items():
+            capture = make()
+            capture.grab()  # 预热
+            result = run(capture, args.frames, clip)
+            capture.stop()
+            print(f"{name:>10}: " + ', '.join(f"{k} = {v:.1f}" for k, v in result.items()))
+        browser.close()
+
+
+if __name__ == '__main__':
+    main()
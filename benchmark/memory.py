@@ -0,0 +1,177 @@
+"""
+Memory of the capture -> detector path over a long replayed session (RECORD_PATH).
+
+    python -m benchmark.memory recordings/session1 --loops 20
+    python -m benchmark.memory recordings/session1 --loops 20 --legacy    # fresh arrays per frame, as before
+    python -m benchmark.memory recordings/session1 --detector live        # with the models
+
+The recorded frames are JPEG-encoded once up front and served by a stand-in page, so every frame
+takes the real ScreenshotCapture path (decoded into its frame pool, handed out read-only) and the
+DetectorPipeline. Without --detector live the detectors only do their frame work around the models
+(hand crop, masked OCR input). Reports the memory allocated per frame in steady state (tracemalloc
+peak while the frame is captured and detected, above what was in use before), the same in
+frame-sized buffers, the net growth over the run and the peak RSS of the process.
+"""
+import argparse
+import os
+import resource
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+os.environ.setdefault('MAJSOUL_ACCOUNT', 'replay')  # config 需要账号，回放时用不到
+os.environ.setdefault('MAJSOUL_PASSWORD', 'replay')
+
+from benchmark.replay import FakePage
+from detector.detector import OCR_MASK, hand_region
+from detector.pipeline import DetectorPipeline
+from utils.frames import MaskedScratch, pixel_rect
+from utils.session import SessionReader
+from utils.window import ScreenshotCapture
+
+
+class JpegPage(FakePage):
+    def __init__(self, jpegs: list, width: int, height: int, loops: int):
+        """Stands in for the game page, screenshot() returns the recorded frames as JPEG, loops times over"""
+        super().__init__(width, height)
+        self.jpegs = jpegs
+        self.remaining = len(jpegs) * loops
+        self.position = 0
+
+    def screenshot(self, type='jpeg', full_page=True, clip=None):
+        jpeg = self.jpegs[self.position % len(self.jpegs)]
+        self.position += 1
+        self.remaining -= 1
+        return jpeg
+
+
+class LegacyCapture:
+    def __init__(self, page):
+        """ScreenshotCapture before the frame pool: a fresh decoded and a fresh converted array per frame"""
+        self.page = page
+
+    def grab(self, clip=None):
+        screenshot = self.page.screenshot(type="jpeg", full_page=True)
+        image = cv2.imdecode(np.frombuffer(screenshot, np.uint8), cv2.IMREAD_COLOR)
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+
+class FrameDetector:
+    def __init__(self, legacy: bool = False):
+        """Detector without the models: the same crops and OCR input, read by cv2.mean, empty results"""
+        self.legacy = legacy
+        self.ocr_input = MaskedScratch(OCR_MASK)
+
+    def resync(self):
+        pass
+
+    def detect_tiles(self, image=None):
+        left, right, top, bottom = hand_region(image)
+        cv2.mean(image[top: bottom, left: right])
+        return [], []
+
+    def detect_frame(self, image=None):
+        cv2.mean(image)
+        return [], []
+
+    def detect_characters(self, image=None):
+        if self.legacy:
+            # 原来的做法：流水线拷贝一份，OCR前原地涂黑
+            image = image.copy()
+            left, top, right, bottom = pixel_rect(OCR_MASK, image.shape[1], image.shape[0])
+            image[top: bottom, left: right] = 0
+        else:
+            image = self.ocr_input(image)
+        cv2.mean(image)
+        return {}
+
+
+def encode_session(reader: SessionReader):
+    """Every recorded frame as the JPEG the browser would send (page channel order)"""
+    jpegs = []
+    for index in sorted(reader.frames):
+        _, image = reader.frame(index)
+        ok, jpeg = cv2.imencode('.jpg', np.ascontiguousarray(image[:, :, ::-1]), [cv2.IMWRITE_JPEG_QUALITY, 80])
+        if ok:
+            jpegs.append(jpeg.tobytes())
+    return jpegs
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux 上单位是KB
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('session', help='Session directory written with RECORD_PATH')
+    parser.add_argument('--loops', type=int, default=10, help='Replay the session this many times')
+    parser.add_argument('--warmup', type=int, default=20, help='Frames not counted (pools and caches filling up)')
+    parser.add_argument('--detector', choices=['frame', 'live'], default='frame')
+    parser.add_argument('--mode', choices=['off', 'thread'], default='thread', help='Pipeline mode')
+    parser.add_argument('--legacy', action='store_true', help='Capture and OCR input as before the frame pool')
+    args = parser.parse_args()
+
+    reader = SessionReader(args.session)
+    jpegs = encode_session(reader)
+    if not jpegs:
+        raise SystemExit(f'no frames in {args.session}')
+    box = tuple(reader.frames[min(reader.frames)]['box'])
+    reader.close()
+    page = JpegPage(jpegs, box[2] - box[0], box[3] - box[1], args.loops)
+    capture = LegacyCapture(page) if args.legacy else ScreenshotCapture(page)
+    if args.detector == 'live':
+        from config import config
+        from detector.backends import profile_from_config
+        from detector.loader import load_detector
+        detector = load_detector(char_backend=config.CHAR_BACKEND, backend=config.DETECTOR_BACKEND,
+                                 int8=config.DETECTOR_INT8, tile_profile=profile_from_config(config, 'TILE'),
+                                 ui_profile=profile_from_config(config, 'UI'), hand_tracker=config.HAND_TRACKER,
+                                 tile_backend=config.TILE_BACKEND)
+        if args.legacy:
+            print('--legacy only changes the capture with --detector live, Detector masks without writing the frame')
+    else:
+        detector = FrameDetector(args.legacy)
+
+    def grab():
+        return (box, capture.grab()) if page.remaining > 0 else None
+
+    pipeline = DetectorPipeline(grab, detector, mode=args.mode)
+    tracemalloc.start()
+    transient = []
+    baseline = last = None
+    frame_bytes = 0
+    start = time.perf_counter()
+    while True:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        frame = pipeline.next_frame()
+        if frame is None:
+            break
+        current, peak = tracemalloc.get_traced_memory()
+        if pipeline.pending is not None or pipeline.pools is None:
+            last = current  # 最后一帧时已经没有在截的下一帧，不算
+        frame_bytes = frame.image.nbytes
+        if len(transient) == args.warmup:
+            baseline = current
+        transient.append(peak - before)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    pipeline.shutdown()
+
+    steady = np.array(transient[args.warmup:] or transient, np.float64)
+    counted = max(len(transient) - args.warmup, 1)
+    print(f"{len(transient)} frames ({len(jpegs)} x {args.loops}) in {elapsed:.2f} s, "
+          f"{len(transient) / max(elapsed, 1e-9):.1f} fps, {'legacy' if args.legacy else 'frame pool'}")
+    print(f"allocated per frame: median {np.median(steady) / 2 ** 20:.2f} MB, "
+          f"max {steady.max() / 2 ** 20:.2f} MB, "
+          f"{np.median(steady) / max(frame_bytes, 1):.2f} frame buffers")
+    if baseline is not None:
+        print(f"net growth after warm-up: {(last - baseline) / 2 ** 10:.1f} KB "
+              f"({(last - baseline) / counted:.0f} B/frame)")
+    print(f"peak RSS: {peak_rss_mb():.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""
+Micro-benchmarks of the per-frame post-processing and the discard decision on synthetic inputs.
+
+    python -m benchmark.postprocess                          # all cases, all sizes
+    python -m benchmark.postprocess -k suppress --json now.json
+    python -m benchmark.postprocess --compare now.json       # fail if a case got 20% slower
+
+Every case is a function taking the input size and returning the callable to time, in the spirit
+of pytest-benchmark: min / mean / ops per second over --rounds rounds. The loop versions
+the NumPy post-processing replaced run as `legacy_*` cases, and are checked to agree with it.
+tests/test_postprocess.py runs the same cases under pytest-benchmark.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from detector.postprocess import box_iou, hand_tiles, suppress
+from strategy.cache import DecisionCache
+from strategy.shanten import CARD, SANMA_TILES
+from strategy.strategy import step
+
+SIZES = {
+    'box_iou': (8, 32, 128),
+    'suppress': (8, 32, 128),
+    'legacy_suppress': (8, 32, 128),
+    'hand_tiles': (14, 40, 160),
+    'legacy_hand_tiles': (14, 40, 160),
+    'step': (64,),
+    'step_cached': (64,),
+}
+
+
+def synthetic_buttons(n: int, seed: int = 0):
+    """n button boxes in clusters of overlapping detections"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform((100, 100), (1300, 800), (max(n // 3, 1), 2))[rng.integers(0, max(n // 3, 1), n)]
+    centers = centers + rng.normal(0, 8, (n, 2))
+    sizes = rng.uniform((80, 30), (160, 60), (n, 2))
+    xyxy = np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1)
+    return xyxy.astype(np.float32), rng.uniform(0.3, 1.0, n).astype(np.float32)
+
+
+def synthetic_hand(n: int, seed: int = 0):
+    """
+    Tile model output on the hand strip: 13 tiles plus a drawn one, duplicate boxes on some slots,
+    one missed middle tile of a triplet and n - 14 stray boxes of other sizes
+    """
+    rng = np.random.default_rng(seed)
+    names = ['1m', '1m', '1m', '9m', '1p', '2p', '3p', '5p', '5p', '1s', '2s', '3s', '7z', '7z']
+    xyxy, confidence, labels = [], [], []
+    for i, name in enumerate(names):
+        if i == 1:
+            continue  # 三张一样的牌中间那张没识别出来
+        left = 40 + i * 62 + (20 if i == 13 else 0) + rng.normal(0, 1)
+        xyxy.append([left, 20 + rng.normal(0, 1), left + 60, 110 + rng.normal(0, 1)])
+        confidence.append(rng.uniform(0.6, 0.95))
+        labels.append(name)
+    while len(xyxy) < n:
+        if rng.random() < 0.5:  # 同一牌位上的重复框
+            i = int(rng.integers(0, len(names)))
+            left = 40 + i * 62 + rng.normal(0, 3)
+            xyxy.append([left, 20, left + 60, 110])
+            labels.append(names[(i + 1) % len(names)])
+        else:  # 大小不像手牌的误检
+            left = rng.uniform(0, 900)
+            xyxy.append([left, 0, left + rng.uniform(10, 200), rng.uniform(20, 120)])
+            labels.append('1z')
+        confidence.append(rng.uniform(0.25, 0.9))
+    return np.array(xyxy[:n], np.float32), np.array(confidence[:n], np.float32), labels[:n]
+
+
+def synthetic_hands(n: int, seed: int = 0):
+    """n random sanma hands of 14 tiles without north (north is a babei, not a decision)"""
+    rng = random.Random(seed)
+    wall = [CARD[i] for i in SANMA_TILES if CARD[i] != '4z' for _ in range(4)]
+    return [rng.sample(wall, 14) for _ in range(n)]
+
+
+def legacy_suppress(xyxy, confidence):
+    """detect_frame before detector/postprocess.py: IoU matrix from nested loops, one row at a time"""
+    def area(box):
+        return 0 if box[2] < box[0] or box[3] < box[1] else (box[2] - box[0]) * (box[3] - box[1])
+
+    def iou_ratio(a, b):
+        u = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+        area_u = area(u)
+        return 0 if area_u == 0 else area_u / (area(a) + area(b) - area_u)
+
+    xyxy = np.array(xyxy.tolist())
+    n = len(xyxy)
+    ious = np.zeros((n, n))
+    for i in range(n):
+        for j in range(i + 1, n):
+            ious[i, j] = iou_ratio(xyxy[i], xyxy[j])
+            ious[j, i] = ious[i, j]
+    mask = np.ones(n, dtype=bool)
+    for i in range(n):
+        if any((ious[i] > 0.5) & (confidence > confidence[i])):
+            mask[i] = False
+    return mask
+
+
+def legacy_hand_tiles(xyxy_, confidence_, tiles_):
+    """_detect_tiles before detector/postprocess.py, list round trips and a 160-slot Python loop"""
+    xyxy_ = np.array(xyxy_.tolist())
+    feature_funcs = [
+        lambda a: a[:, 2] - a[:, 0],
+        lambda a: a[:, 3] - a[:, 1],
+        lambda a: a[:, 3] + a[:, 1],
+        lambda a: (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    ]
+    features = np.array([func(xyxy_) for func in feature_funcs])
+    medians = np.median(features, axis=1)
+    rel_diff = np.abs(features - medians[:, np.newaxis]) / np.maximum(features, medians[:, np.newaxis])
+    valid_mask = np.all(rel_diff < 0.2, axis=0)
+    xyxy_ = xyxy_[valid_mask].tolist()
+    confidence_ = confidence_[valid_mask].tolist()
+    tiles_ = [t for t, m in zip(tiles_, valid_mask) if m]
+    if not xyxy_:
+        return [], []
+    tile_width = np.median([x[2] - x[0] for x in xyxy_])
+    left_margin = min(x[0] for x in xyxy_)
+    n_tiles = 160
+    xyxy = [None] * n_tiles
+    tiles = [None] * n_tiles
+    confidence = np.full(n_tiles, -1.0)
+    positions = np.array([int(round(float(x[0] - left_margin) / tile_width)) for x in xyxy_])
+    for i, pos in enumerate(positions):
+        if pos < n_tiles and confidence_[i] > confidence[pos]:
+            confidence[pos] = confidence_[i]
+            xyxy[pos] = xyxy_[i]
+            tiles[pos] = tiles_[i]
+    for i in range(1, 12):
+        if tiles[i] is None and tiles[i - 1] == tiles[i + 1] and tiles[i - 1] is not None:
+            tiles[i] = tiles[i - 1]
+            xyxy[i] = [xyxy[i - 1][2], xyxy[i - 1][1], xyxy[i + 1][0], xyxy[i + 1][3]]
+    valid = [i for i, x in enumerate(xyxy) if x is not None]
+    return [xyxy[i] for i in valid], [tiles[i] for i in valid]
+
+
+def case_box_iou(n):
+    xyxy, _ = synthetic_buttons(n)
+    return lambda: box_iou(xyxy, xyxy)
+
+
+def case_suppress(n):
+    xyxy, confidence = synthetic_buttons(n)
+    return lambda: suppress(xyxy, confidence, 0.5)
+
+
+def case_legacy_suppress(n):
+    xyxy, confidence = synthetic_buttons(n)
+    return lambda: legacy_suppress(xyxy, confidence)
+
+
+def case_hand_tiles(n):
+    xyxy, confidence, names = synthetic_hand(n)
+    return lambda: hand_tiles(xyxy, confidence, names)
+
+
+def case_legacy_hand_tiles(n):
+    xyxy, confidence, names = synthetic_hand(n)
+    return lambda: legacy_hand_tiles(xyxy, confidence, names)
+
+
+def case_step(n):
+    hands = synthetic_hands(n)
+    return lambda: [step(hand) for hand in hands]
+
+
+def case_step_cached(n):
+    hands = synthetic_hands(n)
+    cache = DecisionCache(max_size=n)
+    for hand in hands:
+        step(hand, cache)
+    return lambda: [step(hand, cache) for hand in hands]
+
+
+CASES = {name: globals()[f'case_{name}'] for name in SIZES}
+
+
+def check():
+    """The vectorized functions give what the loops gave"""
+    for n in (8, 32, 128):
+        xyxy, confidence = synthetic_buttons(n, seed=n)
+        assert np.array_equal(suppress(xyxy, confidence, 0.5), legacy_suppress(xyxy, confidence)), f'suppress n={n}'
+    for n in (14, 40, 160):
+        xyxy, confidence, names = synthetic_hand(n, seed=n)
+        boxes, tiles = hand_tiles(xyxy, confidence, names)
+        legacy_boxes, legacy_tiles = legacy_hand_tiles(xyxy, confidence, names)
+        assert tiles == legacy_tiles and np.allclose(boxes, np.array(legacy_boxes).reshape(-1, 4)), f'hand n={n}'
+
+
+def measure(func, rounds: int, min_time: float = 0.01):
+    """Seconds per call: calls are batched so that one round lasts at least min_time"""
+    func()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        if time.perf_counter() - start >= min_time:
+            break
+        calls *= 2
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        times.append((time.perf_counter() - start) / calls)
+    return min(times), sum(times) / len(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', default='', help='Only cases whose name contains this')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--compare', help='Results file to compare with, exits 1 on a regression')
+    parser.add_argument('--threshold', type=float, default=1.2, help='Slowdown (min time ratio) counted as regression')
+    args = parser.parse_args()
+
+    check()
+    results = {}
+    print(f"{'case':<24}{'min':>12}{'mean':>12}{'ops/s':>12}")
+    for name, case in CASES.items():
+        if args.k not in name:
+            continue
+        for n in SIZES[name]:
+            best, mean = measure(case(n), args.rounds)
+            key = f'{name}[{n}]'
+            results[key] = {'min': best, 'mean': mean}
+            print(f"{key:<24}{best * 1e6:>10.1f}us{mean * 1e6:>10.1f}us{1 / best:>12.0f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = [(key, results[key]['min'] / baseline[key]['min']) for key in results
+                       if key in baseline and results[key]['min'] > baseline[key]['min'] * args.threshold]
+        for key, ratio in regressions:
+            print(f"REGRESSION {key}: {ratio:.2f}x slower than {args.compare}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
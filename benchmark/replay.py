@@ -0,0 +1,152 @@
+"""
+Run the real MajsoulGame loop against a recorded session (RECORD_PATH) at full speed.
+
+    python -m benchmark.replay recordings/session1                      # recorded detections
+    python -m benchmark.replay recordings/session1 --detector live      # re-run the detectors
+
+The browser window and page are replaced by stand-ins fed from the recorded frames; clicks
+only go to the stand-in mouse. Reports frames per second, per-decision latency (capture to
+decision) and how many recorded decisions were reproduced on the same frame.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault('MAJSOUL_ACCOUNT', 'replay')  # config 需要账号，回放时用不到
+os.environ.setdefault('MAJSOUL_PASSWORD', 'replay')
+
+from config import config
+from utils.session import SessionReader, SessionRecorder
+
+
+class FakeMouse:
+    def __init__(self):
+        self.clicks = []
+
+    def move(self, x, y):
+        pass
+
+    def click(self, x, y):
+        self.clicks.append((x, y))
+
+
+class FakePage:
+    def __init__(self, width: int, height: int):
+        self.mouse = FakeMouse()
+        self.viewport_size = {'width': width, 'height': height}
+
+    def wait_for_timeout(self, timeout):
+        pass
+
+
+class RecordedFrame(np.ndarray):
+    """A recorded frame that remembers its index, also through copies and slices"""
+    def __array_finalize__(self, obj):
+        self.index = getattr(obj, 'index', None)
+
+
+class ReplayWindow:
+    def __init__(self, reader: SessionReader):
+        """Stands in for MajsoulWindow, every grab() returns the next recorded frame"""
+        self.reader = reader
+        self.indices = sorted(reader.frames)
+        self.position = 0
+        box = reader.frames[self.indices[0]]['box'] if self.indices else (0, 0, 1440, 900)
+        self.page = FakePage(box[2] - box[0], box[3] - box[1])
+        self.ws_state = None
+        self.scale = 1.0
+        self.session_restored = False
+        self.logged_in = True
+
+    def __call__(self):
+        if self.position >= len(self.indices):
+            return None
+        return tuple(self.reader.frames[self.indices[self.position]]['box'])
+
+    def grab(self, clip=None):
+        if self.position >= len(self.indices):
+            return None
+        index = self.indices[self.position]
+        self.position += 1
+        _, image = self.reader.frame(index)
+        image = image.view(RecordedFrame)
+        image.index = index
+        return image
+
+    def save_session(self):
+        pass
+
+    def cleanup(self):
+        self.reader.close()
+
+
+class RecordedDetector:
+    def __init__(self, reader: SessionReader):
+        """Returns what the detectors returned on the recorded frame"""
+        self.reader = reader
+
+    def _recorded(self, image):
+        return self.reader.detections.get(getattr(image, 'index', None), {})
+
+    def resync(self):
+        pass
+
+    def detect_tiles(self, image=None):
+        recorded = self._recorded(image)
+        return recorded.get('xyxy_tiles', []), recorded.get('tiles', [])
+
+    def detect_frame(self, image=None):
+        recorded = self._recorded(image)
+        return recorded.get('xyxy_buttons', []), recorded.get('buttons', [])
+
+    def detect_characters(self, image=None):
+        return dict(self._recorded(image).get('char_dict', {}))
+
+
+def compare(recorded, replayed):
+    """(reproduced, recorded count): recorded decisions made again on the same frame"""
+    replayed = {(d['frame'], d['tile'], d['button']) for d in replayed}
+    reproduced = sum((d['frame'], d['tile'], d['button']) in replayed for d in recorded)
+    return reproduced, len(recorded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('session', help='Session directory written with RECORD_PATH')
+    parser.add_argument('--detector', choices=['recorded', 'live'], default='recorded')
+    parser.add_argument('--real-time', action='store_true', help='Keep the sleeps between clicks')
+    args = parser.parse_args()
+
+    import main as game_main
+    if not args.real_time:
+        game_main.sleep = lambda seconds: None
+    config.FRAME_GOVERNOR = False  # 回放以最快速度进行
+    if args.detector == 'recorded' and config.PIPELINE_MODE == 'process':
+        config.PIPELINE_MODE = 'thread'  # 子进程里没有回放的识别结果
+
+    reader = SessionReader(args.session)
+    window = ReplayWindow(reader)
+    detector = RecordedDetector(reader) if args.detector == 'recorded' else None
+    recorder = SessionRecorder()
+    game = game_main.MajsoulGame(window, detector, recorder)
+
+    start = time.perf_counter()
+    game.run()
+    elapsed = time.perf_counter() - start
+
+    print(f"{recorder.frame_count} frames in {elapsed:.2f} s, {recorder.frame_count / max(elapsed, 1e-9):.1f} fps")
+    latencies = [d['latency'] * 1000 for d in recorder.decisions if d['latency'] is not None]
+    if latencies:
+        print(f"{len(latencies)} decisions, latency p50 = {np.percentile(latencies, 50):.1f} ms, "
+              f"p95 = {np.percentile(latencies, 95):.1f} ms, max = {max(latencies):.1f} ms")
+    reproduced, total = compare(reader.decisions, recorder.decisions)
+    print(f"decisions reproduced: {reproduced} / {total}"
+          + (f" ({reproduced / total:.1%})" if total else '')
+          + f", replayed {len(recorder.decisions)}; clicks recorded {len(reader.clicks)}, "
+            f"replayed {len(window.page.mouse.clicks)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Throughput of the multi-table supervisor as the number of tables on one host grows.
+
+Every table is a browser context showing the local animated canvas page of benchmark.capture
+(no login), run by the real async game loop and the shared InferenceScheduler:
+
+    python -m benchmark.tables --tables 1 2 4 8 --seconds 30 --headless
+    python -m benchmark.tables --detector live          # the real models instead of a fixed delay
+
+Reports frames per second per table and in total, and the memory of this process plus the
+browser (needs psutil, otherwise only this process' peak RSS).
+"""
+import argparse
+import asyncio
+import os
+import resource
+import time
+
+os.environ.setdefault('MAJSOUL_ACCOUNT', 'bench')  # config 需要账号，基准测试不登录
+os.environ.setdefault('MAJSOUL_PASSWORD', 'bench')
+
+from benchmark.capture import CANVAS_PAGE
+from config import Config
+from supervisor import Supervisor, TableDetector
+from utils.async_window import AsyncMajsoulWindow, launch_browser
+
+
+class CanvasWindow(AsyncMajsoulWindow):
+    """A table showing the benchmark canvas instead of logging in"""
+    async def start(self, account: str, password: str):
+        self.context = await self.browser.new_context(viewport={'width': 1440, 'height': 900})
+        self.page = await self.context.new_page()
+        await self.page.set_content(CANVAS_PAGE % {'width': 1440, 'height': 900})
+        return self
+
+
+class SleepDetector:
+    def __init__(self, ms: float):
+        """Stands in for Detector, every model call takes `ms` and finds nothing"""
+        self.seconds = ms / 1000
+
+    def _detect_tiles(self, image=None):
+        time.sleep(self.seconds)
+        return [], []
+
+    def detect_frame(self, image=None):
+        time.sleep(self.seconds)
+        return [], []
+
+    def detect_characters(self, image=None):
+        time.sleep(self.seconds)
+        return {}
+
+
+class CountingDetector(TableDetector):
+    """TableDetector counting the frames detected for its table"""
+    def __init__(self, table_detector: TableDetector):
+        super().__init__(table_detector.detector)
+        self.hand_tracker = table_detector.hand_tracker
+        self.frames = 0
+
+    def detect_frame(self, image=None):
+        self.frames += 1
+        return super().detect_frame(image)
+
+
+def memory_mb() -> str:
+    try:
+        import psutil
+    except ImportError:
+        return f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB peak (python only)"
+    process = psutil.Process()
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return f"{rss / 2 ** 20:.0f} MB (python + browser)"
+
+
+async def run(n: int, detector, seconds: float, headless: bool, workers: int):
+    configs = [Config({**os.environ, 'MAJSOUL_ACCOUNT': f'table{i}', 'PIPELINE_MODE': 'off',
+                       'FRAME_GOVERNOR': 'false'}) for i in range(n)]
+    counters = []
+
+    def game_factory(cfg, window, table_detector, inference):
+        from async_main import AsyncMajsoulGame
+        counting = CountingDetector(table_detector)
+        counters.append(counting)
+        return AsyncMajsoulGame(CanvasWindow(cfg.CAPTURE_BACKEND, window.browser), counting,
+                                cfg=cfg, inference=inference)
+
+    supervisor = Supervisor(configs, detector, workers=workers, game_factory=game_factory,
+                            launch=lambda: launch_browser(headless))
+    task = asyncio.create_task(supervisor.run())
+    await asyncio.sleep(seconds)
+    memory = memory_mb()
+    frames = [counting.frames for counting in counters]
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    per_table = ' '.join(f'{f / seconds:.1f}' for f in frames)
+    print(f"{n:>2} tables: {sum(frames) / seconds:6.1f} fps total, per table [{per_table}], {memory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--detector', choices=['sleep', 'live'], default='sleep')
+    parser.add_argument('--sleep-ms', type=float, default=15, help='Time per model call of the sleep detector')
+    parser.add_argument('--workers', type=int, default=1, help='Inference threads shared by the tables')
+    parser.add_argument('--headless', action='store_true')
+    args = parser.parse_args()
+
+    if args.detector == 'sleep':
+        detector = SleepDetector(args.sleep_ms)
+    else:  # 只加载一次模型，所有桌数共用
+        from config import config
+        from detector.backends import profile_from_config
+        from detector.detector import Detector
+        detector = Detector(char_backend=config.CHAR_BACKEND, backend=config.DETECTOR_BACKEND,
+                            int8=config.DETECTOR_INT8, tile_profile=profile_from_config(config, 'TILE'),
+                            ui_profile=profile_from_config(config, 'UI'))
+    for n in args.tables:
+        asyncio.run(run(n, detector, args.seconds, args.headless, args.workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+Replay a WebSocket message log through a local stand-in server and compare the latency of
+the WebSocket fast path (message -> decoded hand -> discard decision) with the vision path
+(capture -> detectors -> decision).
+
+    python -m benchmark.websocket --headless                          # synthetic game log
+    python -m benchmark.websocket --log ws.jsonl --frames frames      # recorded with WS_RECORD_PATH
+
+The browser page connects to the stand-in exactly like the client connects to the game server,
+so the frames go through Playwright's page.on("websocket") like in a real game. Logged frames the
+client sent are echoed back by the page, which keeps request / response pairing intact.
+"""
+import argparse
+import base64
+import glob
+import hashlib
+import json
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+from playwright.sync_api import sync_playwright
+
+from strategy.shanten import CARD, SANMA_TILES
+from strategy.strategy import step
+from utils.liqi import DISCARD, decode_action
+from utils.window import ScreenshotCapture, WebSocketState
+
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+PAGE = """
+<html><body><script>
+const ws = new WebSocket('ws://127.0.0.1:%d/game-gateway');
+ws.binaryType = 'arraybuffer';
+ws.onmessage = e => {
+    if (typeof e.data === 'string') {  // 日志里客户端发出的帧，原样发回去
+        ws.send(Uint8Array.from(atob(e.data), c => c.charCodeAt(0)));
+    }
+};
+</script></body></html>
+"""
+
+
+class StandInServer:
+    def __init__(self):
+        """Single-connection WebSocket server pushing frames on demand"""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        self.conn = None
+
+    def accept(self, timeout: float = 10.0):
+        self.sock.settimeout(timeout)
+        self.conn, _ = self.sock.accept()
+        request = b''
+        while b'\r\n\r\n' not in request:
+            request += self.conn.recv(4096)
+        key = next(line.split(b':', 1)[1].strip() for line in request.split(b'\r\n')
+                   if line.lower().startswith(b'sec-websocket-key'))
+        accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest())
+        self.conn.sendall(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                          b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        threading.Thread(target=self._drain, daemon=True).start()
+
+    def _drain(self):
+        """Client frames are only needed on the browser side, discard them"""
+        try:
+            while self.conn.recv(65536):
+                pass
+        except OSError:
+            pass
+
+    def send(self, payload: bytes, text: bool = False):
+        header = bytes([0x81 if text else 0x82])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 1 << 16:
+            header += bytes([126]) + struct.pack('!H', len(payload))
+        else:
+            header += bytes([127]) + struct.pack('!Q', len(payload))
+        self.conn.sendall(header + payload)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+        self.sock.close()
+
+
+def varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte, n = n & 0x7f, n >> 7
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def message(*fields) -> bytes:
+    """(number, int / str / bytes) pairs -> protobuf, repeated fields are simply given again"""
+    out = b''
+    for number, value in fields:
+        if isinstance(value, int):
+            out += varint(number << 3) + varint(value)
+        else:
+            value = value.encode('utf-8') if isinstance(value, str) else value
+            out += varint(number << 3 | 2) + varint(len(value)) + value
+    return out
+
+
+def action(step_no: int, name: str, data: bytes) -> bytes:
+    action_message = message((1, step_no), (2, name), (3, decode_action(data)))  # 异或混淆是对称的
+    return bytes([1]) + message((1, '.lq.ActionPrototype'), (2, action_message))
+
+
+def synthetic_log(rounds: int, seed: int = 0):
+    """A 3-player game where we (seat 0) always follow strategy.step, as [(direction, frame)]"""
+    rng = random.Random(seed)
+    account_id = 1001
+    discard_op = message((1, 0), (2, message((1, DISCARD))))
+    log = [('send', bytes([2, 1, 0]) + message((1, '.lq.FastTest.authGame'), (2, message((1, account_id))))),
+           ('recv', bytes([3, 1, 0]) + message((1, ''), (2, message((2, account_id), (2, 1002), (2, 1003)))))]
+    for ju in range(rounds):
+        wall = [CARD[i] for i in SANMA_TILES if CARD[i] != '4z'] * 4
+        rng.shuffle(wall)
+        hand = [wall.pop() for _ in range(13)]
+        n = 0
+        log.append(('recv', action(n, 'ActionNewRound', message((1, 0), (2, ju % 3 + 1), (3, 0), (13, len(wall)),
+                                                                *[(4, t) for t in hand]))))
+        while len(wall) > 20:
+            for seat in (1, 2):
+                n += 1
+                log.append(('recv', action(n, 'ActionDealTile', message((1, seat), (3, len(wall))))))
+                n += 1
+                log.append(('recv', action(n, 'ActionDiscardTile', message((1, seat), (2, wall.pop())))))
+            tile = wall.pop()
+            hand.append(tile)
+            n += 1
+            log.append(('recv', action(n, 'ActionDealTile', message((1, 0), (2, tile), (3, len(wall)),
+                                                                    (4, discard_op)))))
+            discard, _ = step(hand)
+            hand.remove(discard)
+            n += 1
+            log.append(('recv', action(n, 'ActionDiscardTile', message((1, 0), (2, discard)))))
+        log.append(('recv', action(n + 1, 'ActionNoTile', b'')))
+    return log
+
+
+def load_log(path: str):
+    log = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                log.append((item['dir'], base64.b64decode(item['data'])))
+    return log
+
+
+def replay(page, server, ws_state, log, timeout: float = 2.0):
+    """Push every frame and time it until the model changed, and until a discard was decided"""
+    update, decision = [], []
+    for direction, frame in log:
+        count = ws_state.frame_count
+        start = time.perf_counter()
+        if direction == 'send':
+            server.send(base64.b64encode(frame), text=True)
+        else:
+            server.send(frame)
+        deadline = start + timeout
+        while ws_state.frame_count == count and time.perf_counter() < deadline:
+            page.wait_for_timeout(1)
+        if ws_state.frame_count == count or direction == 'send':
+            continue
+        update.append(time.perf_counter() - start)
+        model = ws_state.model
+        if model.discard_prompt() and len(model.hand) == 14:
+            step(model.hand)
+            decision.append(time.perf_counter() - start)
+    return update, decision
+
+
+def vision_latency(page, frames_dir: str, limit: int):
+    """Capture latency on the page, and detector + decision latency on recorded frames if available"""
+    capture = ScreenshotCapture(page)
+    capture.grab()
+    grabs = []
+    for _ in range(20):
+        start = time.perf_counter()
+        capture.grab()
+        grabs.append(time.perf_counter() - start)
+    detects = []
+    paths = sorted(glob.glob(os.path.join(frames_dir, '*.jpg')) + glob.glob(os.path.join(frames_dir, '*.png'))) \
+        if frames_dir else []
+    if paths:
+        try:
+            from detector.detector import Detector
+            detector = Detector()
+            detector.warmup()  # 第一次推理的初始化开销不算进识别延迟
+        except (ImportError, FileNotFoundError) as e:
+            print(f"vision detectors skipped: {e}")
+            return grabs, detects
+        for path in paths[:limit]:
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            start = time.perf_counter()
+            _, tiles = detector.detect_tiles(image)
+            detector.detect_frame(image)
+            detector.detect_characters(image)
+            if len(tiles) == 14:
+                step(tiles)
+            detects.append(time.perf_counter() - start)
+    return grabs, detects
+
+
+def summary(name: str, latencies):
+    if not latencies:
+        print(f"{name:>28}: no samples")
+        return
+    ms = np.array(latencies) * 1000
+    print(f"{name:>28}: n = {len(ms)}, p50 = {np.percentile(ms, 50):.2f} ms, p95 = {np.percentile(ms, 95):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--log', default='', help='WebSocket log written with WS_RECORD_PATH, synthetic if empty')
+    parser.add_argument('--rounds', type=int, default=5, help='Rounds of the synthetic log')
+    parser.add_argument('--frames', default='', help='Directory of recorded frames for the vision detectors')
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--headless', action='store_true')
+    args = parser.parse_args()
+
+    log = load_log(args.log) if args.log else synthetic_log(args.rounds)
+    server = StandInServer()
+    with sync_playwright() as pw:
+        browser = pw.chromium.launch(headless=args.headless)
+        page = browser.new_page(viewport={'width': 1440, 'height': 900})
+        ws_state = WebSocketState(page, '127.0.0.1')
+        threading.Thread(target=server.accept, daemon=True).start()
+        page.set_content(PAGE % server.port)
+        while server.conn is None:
+            page.wait_for_timeout(10)
+
+        update, decision = replay(page, server, ws_state, log)
+        print(f"{len(log)} frames replayed, model version {ws_state.model.version}")
+        summary('websocket decode', ws_state.latencies)
+        summary('websocket message -> model', update)
+        summary('websocket message -> discard', decision)
+
+        grabs, detects = vision_latency(page, args.frames, args.limit)
+        summary('vision capture', grabs)
+        summary('vision detect + discard', detects)
+        if grabs and detects:
+            summary('vision total (approx.)', [np.median(grabs) + d for d in detects])
+        ws_state.stop()
+        browser.close()
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -11,28 +11,146 @@ load_dotenv()
 class Config:
     """Configuration class to manage environment variables."""
     
-    def __init__(self):
+    def __init__(self, env=None):
+        """
+        Args:
+            env: Mapping the settings are read from, os.environ by default
+                 (e.g. one account's overrides merged over it, see supervisor.py)
+        """
+        env = os.environ if env is None else env
         # Game timing settings
-        self.MAX_QUEUE_TIME: int = int(os.getenv('MAX_QUEUE_TIME', '30'))
-        self.MAX_WAIT_TIME: int = int(os.getenv('MAX_WAIT_TIME', '15'))
+        self.MAX_QUEUE_TIME: int = int(env.get('MAX_QUEUE_TIME', '30'))
+        self.MAX_WAIT_TIME: int = int(env.get('MAX_WAIT_TIME', '15'))
         
         # Account settings
-        self.ACCOUNT: str = os.getenv('MAJSOUL_ACCOUNT', '')
+        self.ACCOUNT: str = env.get('MAJSOUL_ACCOUNT', '')
         if not self.ACCOUNT:
             raise ValueError('MAJSOUL_ACCOUNT must be set in environment variables')
             
-        self.PASSWORD: str = os.getenv('MAJSOUL_PASSWORD', '')
+        self.PASSWORD: str = env.get('MAJSOUL_PASSWORD', '')
         if not self.PASSWORD:
             raise ValueError('MAJSOUL_PASSWORD must be set in environment variables')
         
         # Game settings
-        self.MATCH_RANK: str = os.getenv('MATCH_RANK', 'bronze').lower()
-        self.AUTO_CONTINUE: bool = os.getenv('AUTO_CONTINUE', 'true').lower() == 'true'
+        self.MATCH_RANK: str = env.get('MATCH_RANK', 'bronze').lower()
+        self.AUTO_CONTINUE: bool = env.get('AUTO_CONTINUE', 'true').lower() == 'true'
         
         # Validate match rank
         valid_ranks = ['bronze', 'silver', 'gold']
         if self.MATCH_RANK not in valid_ranks:
             raise ValueError(f'MATCH_RANK must be one of: {", ".join(valid_ranks)}')
 
+        # Strategy settings
+        self.STRATEGY_BACKEND: str = env.get('STRATEGY_BACKEND', 'native').lower()
+        valid_backends = ['native', 'helper']
+        if self.STRATEGY_BACKEND not in valid_backends:
+            raise ValueError(f'STRATEGY_BACKEND must be one of: {", ".join(valid_backends)}')
+        self.DECISION_CACHE_SIZE: int = int(env.get('DECISION_CACHE_SIZE', '4096'))
+        self.DECISION_CACHE_PATH: str = env.get('DECISION_CACHE_PATH', '')
+        self.PRECOMPUTE_WORKERS: int = int(env.get('PRECOMPUTE_WORKERS', '2'))
+        self.CALL_STRATEGY: str = env.get('CALL_STRATEGY', 'evaluate').lower()
+        valid_call_strategies = ['evaluate', 'skip']
+        if self.CALL_STRATEGY not in valid_call_strategies:
+            raise ValueError(f'CALL_STRATEGY must be one of: {", ".join(valid_call_strategies)}')
+        self.CALL_BUDGET_MS: float = float(env.get('CALL_BUDGET_MS', '5'))
+
+        # Capture settings
+        self.CAPTURE_BACKEND: str = env.get('CAPTURE_BACKEND', 'screenshot').lower()
+        valid_captures = ['screenshot', 'screencast']
+        if self.CAPTURE_BACKEND not in valid_captures:
+            raise ValueError(f'CAPTURE_BACKEND must be one of: {", ".join(valid_captures)}')
+        # Per-state capture clips, e.g. 'in_game=0,0.55,1,1' (left,top,right,bottom relative to the frame)
+        self.CAPTURE_CLIP: str = env.get('CAPTURE_CLIP', '')
+
+        # Rendering profile of the game's Chromium; the RENDER_* overrides are unset (profile default) when empty
+        self.RENDER_PROFILE: str = env.get('RENDER_PROFILE', 'default').lower()
+        valid_render_profiles = ['default', 'headless', 'low', 'minimal']
+        if self.RENDER_PROFILE not in valid_render_profiles:
+            raise ValueError(f'RENDER_PROFILE must be one of: {", ".join(valid_render_profiles)}')
+        headless = env.get('RENDER_HEADLESS', '').lower()
+        self.RENDER_HEADLESS: bool = headless == 'true' if headless else None
+        self.RENDER_SCALE: float = float(env['RENDER_SCALE']) if env.get('RENDER_SCALE') else None
+        if self.RENDER_SCALE is not None and not 0 < self.RENDER_SCALE <= 1:
+            raise ValueError('RENDER_SCALE must be in (0, 1]')
+        self.RENDER_FPS: float = float(env['RENDER_FPS']) if env.get('RENDER_FPS') else None
+
+        # Startup: readiness wait and the saved login session ({account} is replaced, empty to log in every time)
+        self.LOAD_TIMEOUT: float = float(env.get('LOAD_TIMEOUT', '60'))
+        self.LOGIN_WAIT: float = float(env.get('LOGIN_WAIT', '10'))
+        self.STORAGE_STATE_PATH: str = env.get('STORAGE_STATE_PATH', 'sessions/{account}.json')
+
+        # Runtime
+        self.RUNTIME: str = env.get('RUNTIME', 'sync').lower()
+        valid_runtimes = ['sync', 'async']
+        if self.RUNTIME not in valid_runtimes:
+            raise ValueError(f'RUNTIME must be one of: {", ".join(valid_runtimes)}')
+        self.ACTION_TIMEOUT: float = float(env.get('ACTION_TIMEOUT', '1.5'))
+
+        # Multi-table supervisor
+        self.ACCOUNTS_FILE: str = env.get('ACCOUNTS_FILE', 'accounts.json')
+        self.INFERENCE_WORKERS: int = int(env.get('INFERENCE_WORKERS', '1'))
+
+        # Inference server (detector/server.py), 'host:port' or empty to load the models in-process
+        self.INFERENCE_SERVER: str = env.get('INFERENCE_SERVER', '')
+        self.INFERENCE_AUTHKEY: str = env.get('INFERENCE_AUTHKEY', 'majsoulbot')
+
+        # Game state source
+        self.STATE_SOURCE: str = env.get('STATE_SOURCE', 'vision').lower()
+        valid_sources = ['vision', 'websocket']
+        if self.STATE_SOURCE not in valid_sources:
+            raise ValueError(f'STATE_SOURCE must be one of: {", ".join(valid_sources)}')
+        self.WS_RECORD_PATH: str = env.get('WS_RECORD_PATH', '')
+
+        # Logging and metrics
+        self.LOG_LEVEL: str = env.get('LOG_LEVEL', 'INFO').upper()
+        self.LOG_RATE: float = float(env.get('LOG_RATE', '2'))
+        self.METRICS_PORT: int = int(env.get('METRICS_PORT', '0'))
+        self.PROFILE_SAMPLING: bool = env.get('PROFILE_SAMPLING', 'false').lower() == 'true'
+
+        # Session recording (frames, detections, decisions, clicks) for offline replay
+        self.RECORD_PATH: str = env.get('RECORD_PATH', '')
+
+        # Detector settings
+        self.CHAR_BACKEND: str = env.get('CHAR_BACKEND', 'ocr').lower()
+        valid_char_backends = ['ocr', 'template']
+        if self.CHAR_BACKEND not in valid_char_backends:
+            raise ValueError(f'CHAR_BACKEND must be one of: {", ".join(valid_char_backends)}')
+
+        self.DETECTOR_BACKEND: str = env.get('DETECTOR_BACKEND', 'pytorch').lower()
+        valid_detector_backends = ['pytorch', 'onnx', 'openvino']
+        if self.DETECTOR_BACKEND not in valid_detector_backends:
+            raise ValueError(f'DETECTOR_BACKEND must be one of: {", ".join(valid_detector_backends)}')
+        self.DETECTOR_INT8: bool = env.get('DETECTOR_INT8', 'false').lower() == 'true'
+
+        self.TILE_BACKEND: str = env.get('TILE_BACKEND', 'yolo').lower()
+        valid_tile_backends = ['yolo', 'atlas']
+        if self.TILE_BACKEND not in valid_tile_backends:
+            raise ValueError(f'TILE_BACKEND must be one of: {", ".join(valid_tile_backends)}')
+        self.MODEL_WARMUP: bool = env.get('MODEL_WARMUP', 'true').lower() == 'true'
+
+        self.HAND_TRACKER: bool = env.get('HAND_TRACKER', 'false').lower() == 'true'
+
+        # Inference profiles of the tile model and the UI model
+        self.TILE_IMGSZ: str = env.get('TILE_IMGSZ', '224,1024')
+        self.TILE_AUGMENT: bool = env.get('TILE_AUGMENT', 'true').lower() == 'true'
+        self.TILE_THREADS: int = int(env.get('TILE_THREADS', '0'))
+        self.UI_IMGSZ: str = env.get('UI_IMGSZ', '')
+        self.UI_AUGMENT: bool = env.get('UI_AUGMENT', 'true').lower() == 'true'
+        self.UI_THREADS: int = int(env.get('UI_THREADS', '0'))
+
+        # Frame-rate governor: frames per second by game state, e.g. 'in_game=4,queue=1' (0 = unlimited)
+        self.FRAME_GOVERNOR: bool = env.get('FRAME_GOVERNOR', 'true').lower() == 'true'
+        self.FRAME_RATES: str = env.get('FRAME_RATES', '')
+
+        # Frame-change gating
+        self.FRAME_GATE: bool = env.get('FRAME_GATE', 'true').lower() == 'true'
+        self.GATE_MAX_SKIP: int = int(env.get('GATE_MAX_SKIP', '30'))
+
+        # Detector pipeline settings
+        self.PIPELINE_MODE: str = env.get('PIPELINE_MODE', 'off').lower()
+        valid_modes = ['off', 'thread', 'process']
+        if self.PIPELINE_MODE not in valid_modes:
+            raise ValueError(f'PIPELINE_MODE must be one of: {", ".join(valid_modes)}')
+
 # Create a global config instance
 config = Config()
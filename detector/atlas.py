@@ -0,0 +1,272 @@
+"""
+Classical-CV hand recognizer: the client draws the hand from a fixed sprite set at a fixed size,
+so hand slots can be classified by normalized cross-correlation against an atlas of tile crops.
+
+The atlas (slot geometry plus a few grayscale templates per tile) is learned from the tile
+model's detections while the bot plays, or built offline from recorded sessions:
+
+    python -m detector.atlas recordings/session1 recordings/session2
+"""
+import argparse
+import atexit
+import json
+import os
+import weakref
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+_atlases = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_atlases():
+    for atlas in list(_atlases):
+        atlas.flush()
+
+
+def _median_slots(xyxy):
+    """
+    Slot geometry of a detected hand: tile width from the median box like Detector._tiles_from,
+    the pitch from the median distance of neighbouring tiles
+    Returns: dict, or None if the hand is too short to tell
+    """
+    if len(xyxy) < 3:
+        return None
+    boxes = np.array(xyxy, dtype=np.float32)
+    widths = boxes[:, 2] - boxes[:, 0]
+    tile_width = float(np.median(widths))
+    steps = np.diff(boxes[:, 0])
+    pitch = float(np.median(steps[steps < 1.5 * tile_width])) if np.any(steps < 1.5 * tile_width) else tile_width
+    geometry = {'left': float(boxes[0, 0]), 'top': float(np.median(boxes[:, 1])),
+                'bottom': float(np.median(boxes[:, 3])), 'width': tile_width, 'pitch': pitch, 'gap': None}
+    if len(xyxy) % 3 == 2 and steps[-1] > pitch + 0.2 * tile_width:
+        geometry['gap'] = float(steps[-1] - pitch)  # 摸到的牌与手牌之间多出来的间隔
+    return geometry
+
+
+class TileAtlas:
+    def __init__(self, atlas_dir=None, size=(24, 32), high=0.9, low=0.6, max_templates=3,
+                 shifts=((0, 0), (-2, 0), (2, 0), (0, -2), (0, 2)), save_interval: float = 60):
+        """
+        Args:
+            atlas_dir: Where the atlas is stored (detector/atlas by default)
+            size: (width, height) crops and templates are downscaled to
+            high: Correlation above which a slot is taken as that tile
+            low: Correlation below which a slot counts as empty, in between falls back to the model
+            max_templates: Templates kept per tile
+            shifts: (dx, dy) pixel offsets every slot is also tried at
+            save_interval: Seconds between two saves of what learn() changed, the rest is saved by
+                           flush() (at exit)
+        """
+        self.atlas_dir = atlas_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'atlas')
+        self.size = size
+        self.high, self.low = high, low
+        self.max_templates = max_templates
+        self.shifts = shifts
+        self.geometry = None
+        self.labels = []                          # label of every template row
+        self.templates = np.zeros((0, size[0] * size[1]), np.float32)
+        self.crops = []                           # 原始灰度小图，保存用
+        self.atlas_count = 0
+        self.fallback_count = 0
+        self.save_interval = save_interval
+        self.dirty = False                        # 有学到的内容还没写盘
+        self.saved_at = perf_counter()
+        self.load()
+        _atlases.add(self)
+
+    def ready(self) -> bool:
+        return self.geometry is not None and len(set(self.labels)) >= 2
+
+    def load(self):
+        index_path = os.path.join(self.atlas_dir, 'index.json')
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.geometry = index.get('geometry')
+        for item in index.get('templates', []):
+            crop = cv2.imread(os.path.join(self.atlas_dir, item['file']), cv2.IMREAD_GRAYSCALE)
+            if crop is not None:
+                self._add(item['label'], crop)
+
+    def save(self):
+        os.makedirs(self.atlas_dir, exist_ok=True)
+        index = {'geometry': self.geometry, 'templates': []}
+        for i, (label, crop) in enumerate(zip(self.labels, self.crops)):
+            file = f'{i:03d}_{label}.png'
+            cv2.imwrite(os.path.join(self.atlas_dir, file), crop)
+            index['templates'].append({'label': label, 'file': file})
+        with open(os.path.join(self.atlas_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
+        self.dirty = False
+        self.saved_at = perf_counter()
+
+    def flush(self):
+        """Save what learn() changed since the last save"""
+        if self.dirty:
+            self.save()
+
+    def _normalize(self, crops):
+        """(n, height, width) downscaled crops -> (n, width * height) zero-mean unit-norm rows"""
+        vectors = crops.reshape(len(crops), -1).astype(np.float32)
+        vectors -= vectors.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-6)
+
+    def _crop(self, gray, box):
+        left, top, right, bottom = (int(round(v)) for v in box)
+        height, width = gray.shape
+        if left < 0 or top < 0 or right > width or bottom > height or right <= left or bottom <= top:
+            return None
+        return cv2.resize(gray[top:bottom, left:right], self.size, interpolation=cv2.INTER_AREA)
+
+    def _add(self, label, crop):
+        """Add the downscaled crop as a template of label, dropping the oldest one beyond max_templates"""
+        rows = [i for i, other in enumerate(self.labels) if other == label]
+        if len(rows) >= self.max_templates:
+            drop = rows[0]
+            del self.labels[drop], self.crops[drop]
+            self.templates = np.delete(self.templates, drop, axis=0)
+        self.labels.append(label)
+        self.crops.append(crop)
+        self.templates = np.concatenate([self.templates, self._normalize(crop[np.newaxis])])
+
+    def slot_box(self, index: int, drawn: bool = False):
+        """xyxy of hand slot index, or of the drawn tile right of a hand of index tiles"""
+        g = self.geometry
+        left = g['left'] + index * g['pitch'] + ((g['gap'] or 0) if drawn else 0)
+        return [left, g['top'], left + g['width'], g['bottom']]
+
+    def classify(self, gray, boxes):
+        """
+        Best matching tile of every box, trying every shift, in one matrix product
+        Returns: (labels, scores)
+        """
+        crops, owners = [], []
+        for i, box in enumerate(boxes):
+            for dx, dy in self.shifts:
+                crop = self._crop(gray, (box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy))
+                if crop is not None:
+                    crops.append(crop)
+                    owners.append(i)
+        labels, scores = [None] * len(boxes), np.full(len(boxes), -1.0)
+        if not crops:
+            return labels, scores
+        correlation = self._normalize(np.stack(crops)) @ self.templates.T     # (crops, templates)
+        best = correlation.argmax(axis=1)
+        best_score = correlation[np.arange(len(crops)), best]
+        for owner, template, score in zip(owners, best, best_score):
+            if score > scores[owner]:
+                scores[owner] = score
+                labels[owner] = self.labels[template]
+        return labels, scores
+
+    def recognize(self, image):
+        """
+        Read the hand slot by slot from the left until an empty slot, then the drawn tile
+        Returns: (xyxy, tiles), or None when some slot is uncertain
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        boxes = [self.slot_box(i) for i in range(14)]
+        labels, scores = self.classify(gray, boxes)
+        n = 0
+        while n < len(boxes) and scores[n] >= self.high:
+            n += 1
+        drawn_next = self.geometry['gap'] and n % 3 == 1
+        # 摸到的牌离手牌不远时会盖住一部分下一个牌位，那个牌位拿不准是正常的
+        if n < len(boxes) and scores[n] > self.low and not drawn_next:
+            return None
+        xyxy, tiles = boxes[:n], labels[:n]
+        if drawn_next:
+            drawn_box = self.slot_box(n, drawn=True)
+            (drawn,), (score,) = self.classify(gray, [drawn_box])
+            if score >= self.high:
+                xyxy, tiles = xyxy + [drawn_box], tiles + [drawn]
+            elif score > self.low:
+                return None
+        if tiles and len(tiles) % 3 == 0:  # 手牌数不可能是3的倍数，交给模型
+            return None
+        return [list(box) for box in xyxy], tiles
+
+    def detect(self, image, detect):
+        """
+        Args:
+            image: Full game frame
+            detect: Fallback, image -> (xyxy, tiles) from the tile model
+        Returns: (xyxy, tiles) in the format of Detector.detect_tiles
+        """
+        if self.ready():
+            result = self.recognize(image)
+            if result is not None:
+                self.atlas_count += 1
+                return result
+        self.fallback_count += 1
+        xyxy, tiles = detect(image)
+        self.learn(image, xyxy, tiles)
+        return xyxy, tiles
+
+    def _update_geometry(self, geometry) -> bool:
+        """Take a newly measured geometry if it moved by more than a pixel"""
+        if self.geometry is not None:
+            if geometry['gap'] is None:
+                geometry['gap'] = self.geometry['gap']
+            if all(abs((geometry[k] or 0) - (self.geometry[k] or 0)) <= 1 for k in geometry):
+                return False
+        self.geometry = geometry
+        return True
+
+    def learn(self, image, xyxy, tiles, save: bool = True):
+        """
+        Take the slot geometry and templates of tiles not matched well yet from a model detection
+        Args:
+            save: Save the changes, at most every save_interval seconds (this runs on the detection
+                  path, hover effects change templates often); False leaves them to save() / flush()
+        """
+        if not tiles:
+            return
+        changed = False
+        geometry = _median_slots(xyxy)
+        if geometry is not None and len(tiles) % 3 != 0:
+            changed = self._update_geometry(geometry)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        labels, scores = self.classify(gray, xyxy) if len(self.labels) else ([None] * len(tiles), [-1.0] * len(tiles))
+        for box, tile, label, score in zip(xyxy, tiles, labels, scores):
+            if label == tile and score >= self.high:
+                continue
+            crop = self._crop(gray, box)
+            if crop is not None:
+                self._add(tile, crop)
+                changed = True
+        if changed:
+            self.dirty = True
+        if save and self.dirty and perf_counter() - self.saved_at >= self.save_interval:
+            self.save()
+
+    def stats(self) -> dict:
+        return {'atlas': self.atlas_count, 'model': self.fallback_count, 'tiles': len(set(self.labels))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sessions', nargs='+', help='Session directories written with RECORD_PATH')
+    parser.add_argument('--atlas', default=None, help='Atlas directory (detector/atlas by default)')
+    args = parser.parse_args()
+
+    from utils.session import SessionReader
+    atlas = TileAtlas(args.atlas)
+    for path in args.sessions:
+        reader = SessionReader(path)
+        for index, detections in sorted(reader.detections.items()):
+            if index in reader.frames and detections.get('tiles'):
+                _, image = reader.frame(index)
+                atlas.learn(image, detections['xyxy_tiles'], detections['tiles'], save=False)
+        reader.close()
+    atlas.save()
+    print(f"{len(atlas.labels)} templates of {len(set(atlas.labels))} tiles, geometry {atlas.geometry}")
+
+
+if __name__ == '__main__':
+    main()
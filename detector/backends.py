@@ -0,0 +1,204 @@
+import ast
+import os
+import cv2
+import numpy as np
+
+WEIGHT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = ['pytorch', 'onnx', 'openvino']
+
+
+class InferenceProfile:
+    def __init__(self, imgsz=None, augment: bool = True, threads: int = 0, conf: float = 0.25, iou: float = 0.7):
+        """
+        How one model is run
+        Args:
+            imgsz: Network input size, int or (height, width); None keeps the model default (640)
+            augment: Test-time augmentation (PyTorch backend only)
+            threads: CPU threads used by the backend, 0 leaves the backend default
+            conf, iou: Score threshold and NMS IoU threshold (ultralytics defaults)
+        """
+        self.imgsz = imgsz
+        self.augment = augment
+        self.threads = threads
+        self.conf = conf
+        self.iou = iou
+
+    @staticmethod
+    def parse_imgsz(text: str):
+        """'224,1024' -> (224, 1024), '640' -> 640, '' -> None"""
+        sizes = [int(x) for x in text.replace('x', ',').split(',') if x.strip()]
+        if not sizes:
+            return None
+        return sizes[0] if len(sizes) == 1 else tuple(sizes)
+
+    def input_shape(self):
+        """(height, width) fed to exported models"""
+        imgsz = self.imgsz or 640
+        return (imgsz, imgsz) if isinstance(imgsz, int) else tuple(imgsz)
+
+
+def profile_from_config(config, prefix: str) -> InferenceProfile:
+    """InferenceProfile from the {prefix}_IMGSZ / _AUGMENT / _THREADS settings ('TILE' or 'UI')"""
+    return InferenceProfile(
+        imgsz=InferenceProfile.parse_imgsz(getattr(config, f'{prefix}_IMGSZ')),
+        augment=getattr(config, f'{prefix}_AUGMENT'),
+        threads=getattr(config, f'{prefix}_THREADS'),
+    )
+
+
+def weight_path(name: str, backend: str = 'pytorch', int8: bool = False) -> str:
+    """Where the weights of model `name` ('mahjong' / 'majsoul_UI') live for a backend"""
+    suffix = '_int8' if int8 else ''
+    if backend == 'onnx':
+        return os.path.join(WEIGHT_DIR, f'{name}{suffix}.onnx')
+    if backend == 'openvino':
+        return os.path.join(WEIGHT_DIR, f'{name}{suffix}_openvino_model', f'{name}.xml')
+    return os.path.join(WEIGHT_DIR, f'{name}.pt')
+
+
+def letterbox(image, shape):
+    """
+    Resize and pad like ultralytics, BGR uint8 HWC -> RGB float32 NCHW
+    Returns: (blob, gain, (pad_w, pad_h))
+    """
+    height, width = image.shape[:2]
+    gain = min(shape[0] / height, shape[1] / width)
+    new_w, new_h = int(round(width * gain)), int(round(height * gain))
+    pad_w, pad_h = (shape[1] - new_w) / 2, (shape[0] - new_h) / 2
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (width, height) \
+        else image
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    blob = padded[:, :, ::-1].transpose(2, 0, 1)[np.newaxis].astype(np.float32) / 255.0
+    return np.ascontiguousarray(blob), gain, (left, top)
+
+
+def postprocess(output, gain, pad, image_shape, names, conf=0.25, iou=0.7):
+    """
+    Decode a raw YOLOv8 head output (1, 4 + classes, anchors) into boxes on the original image
+    Returns: (xyxy, confidence, class_names) like the PyTorch backend
+    """
+    pred = output[0].T
+    scores = pred[:, 4:]
+    classes = scores.argmax(axis=1)
+    confidence = scores[np.arange(len(pred)), classes]
+    keep = confidence > conf
+    pred, classes, confidence = pred[keep], classes[keep], confidence[keep]
+    if not len(pred):
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), []
+
+    xywh = pred[:, :4]
+    xyxy = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+    boxes = np.concatenate([xyxy[:, :2], xywh[:, 2:]], axis=1)  # NMSBoxes 需要左上角+宽高
+    indices = cv2.dnn.NMSBoxesBatched(boxes.tolist(), confidence.tolist(), classes.tolist(), conf, iou)
+    indices = np.array(indices, dtype=int).reshape(-1)
+    indices = indices[np.argsort(-confidence[indices])]
+
+    xyxy = (xyxy[indices] - np.array([pad[0], pad[1], pad[0], pad[1]])) / gain
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, image_shape[1])
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, image_shape[0])
+    return xyxy.astype(np.float32), confidence[indices], [names[c] for c in classes[indices]]
+
+
+class TorchBackend:
+    def __init__(self, path: str, profile: InferenceProfile):
+        import torch
+        from ultralytics import YOLO
+        self.profile = profile
+        self.model = YOLO(path, verbose=False)
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.model = self.model.to(self.device)
+        if profile.threads:
+            torch.set_num_threads(profile.threads)  # torch只有进程级的线程数设置
+
+    def predict(self, image):
+        """Returns: (xyxy, confidence, class_names)"""
+        import supervision as sv
+        kwargs = {'augment': self.profile.augment, 'conf': self.profile.conf, 'iou': self.profile.iou}
+        if self.profile.imgsz:
+            kwargs['imgsz'] = self.profile.imgsz
+        results = self.model.predict(source=image, **kwargs)
+        detections = sv.Detections.from_ultralytics(results[0])
+        return detections.xyxy, detections.confidence, detections.data['class_name'].tolist()
+
+    def predict_batch(self, images):
+        """predict() of several images in one forward pass"""
+        import supervision as sv
+        kwargs = {'augment': self.profile.augment, 'conf': self.profile.conf, 'iou': self.profile.iou}
+        if self.profile.imgsz:
+            kwargs['imgsz'] = self.profile.imgsz
+        results = self.model.predict(source=list(images), **kwargs)
+        detections = [sv.Detections.from_ultralytics(result) for result in results]
+        return [(d.xyxy, d.confidence, d.data['class_name'].tolist()) for d in detections]
+
+
+class OnnxBackend:
+    def __init__(self, path: str, profile: InferenceProfile):
+        import onnxruntime as ort
+        self.profile = profile
+        options = ort.SessionOptions()
+        if profile.threads:
+            options.intra_op_num_threads = profile.threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.shape = tuple(self.session.get_inputs()[0].shape[2:])
+        self.names = ast.literal_eval(self.session.get_modelmeta().custom_metadata_map['names'])
+        self.device = 'cpu'
+        # detector.export 导出的是固定batch=1的模型，动态batch的模型才能一次推理多张
+        self.dynamic_batch = not isinstance(self.session.get_inputs()[0].shape[0], int)
+
+    def predict(self, image):
+        blob, gain, pad = letterbox(image, self.shape)
+        output = self.session.run(None, {self.input_name: blob})[0]
+        return postprocess(output, gain, pad, image.shape, self.names, self.profile.conf, self.profile.iou)
+
+    def predict_batch(self, images):
+        if not self.dynamic_batch:
+            return [self.predict(image) for image in images]
+        letterboxed = [letterbox(image, self.shape) for image in images]
+        output = self.session.run(None, {self.input_name: np.concatenate([blob for blob, _, _ in letterboxed])})[0]
+        return [postprocess(output[i:i + 1], gain, pad, image.shape, self.names, self.profile.conf, self.profile.iou)
+                for i, (image, (_, gain, pad)) in enumerate(zip(images, letterboxed))]
+
+
+class OpenVinoBackend:
+    def __init__(self, path: str, profile: InferenceProfile):
+        import openvino as ov
+        import yaml
+        self.profile = profile
+        core = ov.Core()
+        model = core.read_model(path)
+        config = {'INFERENCE_NUM_THREADS': profile.threads} if profile.threads else {}
+        self.model = core.compile_model(model, 'CPU', config)
+        self.shape = tuple(model.inputs[0].get_partial_shape().get_min_shape()[2:])
+        with open(os.path.join(os.path.dirname(path), 'metadata.yaml'), 'r', encoding='utf-8') as f:
+            self.names = yaml.safe_load(f)['names']
+        self.device = 'cpu'
+
+    def predict(self, image):
+        blob, gain, pad = letterbox(image, self.shape)
+        output = self.model(blob)[0]
+        return postprocess(output, gain, pad, image.shape, self.names, self.profile.conf, self.profile.iou)
+
+    def predict_batch(self, images):
+        # 编译后的模型输入形状固定为batch=1
+        return [self.predict(image) for image in images]
+
+
+def load_backend(name: str, backend: str = 'pytorch', profile: InferenceProfile = None, int8: bool = False):
+    """
+    Load model `name` ('mahjong' / 'majsoul_UI') with the given backend.
+    ONNX / OpenVINO weights are produced by `python -m detector.export`.
+    """
+    profile = profile or InferenceProfile()
+    if backend not in BACKENDS:
+        raise ValueError(f'backend must be one of: {", ".join(BACKENDS)}')
+    path = weight_path(name, backend, int8)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'{path} not found, run `python -m detector.export --backend {backend}` first')
+    if backend == 'onnx':
+        return OnnxBackend(path, profile)
+    if backend == 'openvino':
+        return OpenVinoBackend(path, profile)
+    return TorchBackend(path, profile)
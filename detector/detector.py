@@ -1,160 +1,162 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from ultralytics import YOLO
-from paddleocr import PaddleOCR
-import supervision as sv
-import cv2
-import os
-import torch
-
-def area(xyxy):
-    return 0 if xyxy[2] < xyxy[0] or xyxy[3] < xyxy[1] else (xyxy[2] - xyxy[0]) * (xyxy[3] - xyxy[1])
-
-def iou_ratio(xyxy_1, xyxy_2):
-    xyxy_u = (
-        max(xyxy_1[0], xyxy_2[0]), max(xyxy_1[1], xyxy_2[1]), min(xyxy_1[2], xyxy_2[2]), min(xyxy_1[3], xyxy_2[3]))
-    area_u = area(xyxy_u)
-    return 0 if area_u == 0 else area_u / (area(xyxy_1) + area(xyxy_2) - area_u)
 
-class Detector:
-    def __init__(self):
-        weight_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mahjong.pt')
-        self.mahjong_model = YOLO(weight_path, verbose=False)
-        weight_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'majsoul_UI.pt')
-        self.majsoul_model = YOLO(weight_path, verbose=False)
-        self.ocr_model = PaddleOCR(lang='ch')
-        logging.getLogger("ppocr").setLevel(logging.WARNING)  # verbose=False 以及这行都是用来不显示调试信息的
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        print(f'device: {device}')
-        self.mahjong_model = self.mahjong_model.to(device)
-        self.majsoul_model = self.majsoul_model.to(device)
+from detector.atlas import TileAtlas
+from detector.backends import InferenceProfile, load_backend
+from detector.keywords import KeywordMatcher, KEYWORD_MAP
+from detector.postprocess import hand_tiles, suppress
+from detector.tracker import HandTracker
+from utils.frames import MaskedScratch
+from utils.log import get_logger
+from utils.metrics import metrics
+
+log = get_logger(__name__)
+
+OCR_MASK = (0.1, 0.2, 1.0, 0.6)  # 全图OCR时涂黑的牌桌中间（left, top, right, bottom）
+
+def load_ocr():
+    from paddleocr import PaddleOCR  # 导入paddle要好几秒，用到时才导入
+    ocr = PaddleOCR(lang='ch')
+    logging.getLogger("ppocr").setLevel(logging.WARNING)  # verbose=False 以及这行都是用来不显示调试信息的
+    return ocr
 
+def hand_region(image):
+    """(left, right, top, bottom) of the hand strip fed to the tile model"""
+    height, width = len(image), len(image[0])
+    return width//10, width//10*9, height//4*3, height
+
+class Detector:
+    def __init__(self, char_backend: str = 'ocr', backend: str = 'pytorch', int8: bool = False,
+                 tile_profile: InferenceProfile = None, ui_profile: InferenceProfile = None,
+                 hand_tracker: bool = False, tile_backend: str = 'yolo'):
+        """
+        Args:
+            char_backend: 'ocr' runs PaddleOCR on every frame, 'template' matches learned keyword
+                          templates and only falls back to PaddleOCR when unsure
+            backend: Inference backend of both YOLO models, 'pytorch', 'onnx' or 'openvino'
+            int8: Use the INT8-quantized export (onnx / openvino)
+            tile_profile, ui_profile: InferenceProfile of the tile model and the UI model
+            hand_tracker: Track the hand across frames and only re-classify slots that changed
+            tile_backend: 'yolo' runs the tile model, 'atlas' classifies the hand slots against a sprite
+                          atlas (detector/atlas.py) and only runs the tile model when unsure
+        """
+        tile_profile = tile_profile or InferenceProfile(imgsz=(224, 1024), augment=True)
+        ui_profile = ui_profile or InferenceProfile(augment=True)
+        # 三个模型互不依赖，并行加载
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix='model-load') as pool:
+            mahjong = pool.submit(load_backend, 'mahjong', backend, tile_profile, int8)
+            majsoul = pool.submit(load_backend, 'majsoul_UI', backend, ui_profile, int8)
+            ocr = pool.submit(load_ocr)
+            self.mahjong_model, self.majsoul_model, self.ocr_model = mahjong.result(), majsoul.result(), ocr.result()
+        log.info('device: %s, backend: %s%s', self.mahjong_model.device, backend, " int8" if int8 else "")
+        self.keyword_matcher = KeywordMatcher() if char_backend == 'template' else None
+        self.ocr_input = MaskedScratch(OCR_MASK)
+        self.hand_tracker = HandTracker() if hand_tracker else None
+        self.tile_atlas = TileAtlas() if tile_backend == 'atlas' else None
+
+    def warmup(self, width: int = 1440, height: int = 900):
+        """Run every model once on a blank frame, the first predict pays the lazy initialization"""
+        frame = np.zeros((height, width, 3), np.uint8)
+        left, right, top, bottom = hand_region(frame)
+        self.mahjong_model.predict(frame[top: bottom, left: right])
+        self.majsoul_model.predict(frame)
+        self.ocr_model.ocr(frame, cls=False)
+
+    def resync(self):
+        """Forget tracked state, e.g. when a new round starts"""
+        if self.hand_tracker is not None:
+            self.hand_tracker.resync()
+
+    @metrics.timed('detect_tiles')
     def detect_tiles(self, image=None):
-        height, width = len(image), len(image[0])
-        left, right, top, bottom = width//10, width//10*9, height//4*3, height
+        if self.hand_tracker is not None:
+            return self.hand_tracker.track(image, self._detect_tiles)
+        return self._detect_tiles(image)
+
+    def _detect_tiles(self, image):
+        if self.tile_atlas is not None:
+            return self.tile_atlas.detect(image, self._model_tiles)
+        return self._model_tiles(image)
+
+    def _model_tiles(self, image):
+        left, right, top, bottom = hand_region(image)
         # left, right, top, bottom = 0, width, 0, height
         image = image[top: bottom, left: right]  # hand region
-        results = self.mahjong_model.predict(source=image, imgsz=(224, 1024), augment=True)
-
-        detections = sv.Detections.from_ultralytics(results[0])
-        xyxy_ = np.array(detections.xyxy.tolist())
-        confidence_ = detections.confidence
-        tiles_ = detections.data['class_name'].tolist()
-
-        if len(tiles_):
-            # what is a tile looks like?
-            feature_funcs = [
-                lambda a: a[:, 2] - a[:, 0],  # width
-                lambda a: a[:, 3] - a[:, 1],  # height
-                lambda a: a[:, 3] + a[:, 1],  # sum_y
-                lambda a: (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])  # area
-            ]
-            features = np.array([func(xyxy_) for func in feature_funcs])
-            medians = np.median(features, axis=1)
-            
-            # Calculate relative differences for all features at once
-            rel_diff = np.abs(features - medians[:, np.newaxis]) / np.maximum(features, medians[:, np.newaxis])
-            valid_mask = np.all(rel_diff < 0.2, axis=0)
-            
-            xyxy_ = xyxy_[valid_mask].tolist()
-            confidence_ = confidence_[valid_mask].tolist()
-            tiles_ = [t for t, m in zip(tiles_, valid_mask) if m]
-
-            if len(xyxy_):
-                tile_width = np.median([x[2] - x[0] for x in xyxy_])
-                left_margin = min(x[0] for x in xyxy_)
-                
-                n_tiles = 160
-                xyxy = [None] * n_tiles
-                tiles = [None] * n_tiles
-                confidence = np.full(n_tiles, -1.0)
-                
-                positions = np.array([int(round(float(x[0] - left_margin) / tile_width)) for x in xyxy_])
-                for i, pos in enumerate(positions):
-                    if pos < n_tiles and confidence_[i] > confidence[pos]:
-                        confidence[pos] = confidence_[i]
-                        xyxy[pos] = xyxy_[i]
-                        tiles[pos] = tiles_[i]
-
-                for i in range(1, 12):
-                    if (tiles[i] is None and tiles[i-1] == tiles[i+1] and 
-                        tiles[i-1] is not None):
-                        tiles[i] = tiles[i-1]
-                        xyxy[i] = [xyxy[i-1][2], xyxy[i-1][1], 
-                                 xyxy[i+1][0], xyxy[i+1][3]]
-
-                valid_indices = [i for i, x in enumerate(xyxy) if x is not None]
-                xyxy = [xyxy[i] for i in valid_indices]
-                tiles = [tiles[i] for i in valid_indices]
-
-                for box in xyxy:
-                    box[0] += left
-                    box[1] += top
-                    box[2] += left
-                    box[3] += top
-            else:
-                xyxy = []
-                tiles = []
-        else:
-            xyxy = []
-            tiles = []
-
-        return xyxy, tiles
-
+        with metrics.span('tile_model'):
+            prediction = self.mahjong_model.predict(image)
+        return self._tiles_from(prediction, left, top)
+
+    def _tiles_from(self, prediction, left, top):
+        """Hand tiles from the tile model's prediction on the hand strip at (left, top)"""
+        xyxy, confidence, tiles = prediction
+        if not len(tiles):
+            return [], []
+        xyxy, tiles = hand_tiles(xyxy, confidence, tiles, (left, top))
+        return xyxy.tolist(), tiles
+
+    @metrics.timed('detect_frame')
     def detect_frame(self, image=None):
-        height, width = len(image), len(image[0])
-        results = self.majsoul_model.predict(source=image, augment=True)
-
-        detections = sv.Detections.from_ultralytics(results[0])
-        xyxy = np.array(detections.xyxy.tolist())
-        confidence = detections.confidence
-        buttons = detections.data['class_name'].tolist()
-
-        if len(buttons):
-            # Calculate IoU matrix
-            n = len(xyxy)
-            ious = np.zeros((n, n))
-            for i in range(n):
-                for j in range(i+1, n):
-                    ious[i,j] = iou_ratio(xyxy[i], xyxy[j])
-                    ious[j,i] = ious[i,j]
-            
-            # Create mask for high confidence predictions
-            mask = np.ones(n, dtype=bool)
-            for i in range(n):
-                overlaps = ious[i] > 0.5
-                if any(overlaps & (confidence > confidence[i])):
-                    mask[i] = False
-            
-            xyxy = xyxy[mask].tolist()
-            buttons = [b for b, m in zip(buttons, mask) if m]
-        else:
-            xyxy = []
-            buttons = []
-
-        return xyxy, buttons
-
+        with metrics.span('ui_model'):
+            prediction = self.majsoul_model.predict(image)
+        return self._buttons_from(prediction)
+
+    def _buttons_from(self, prediction):
+        """Buttons from the UI model's prediction, dropping boxes covered by a more confident one"""
+        xyxy, confidence, buttons = prediction
+        if not len(buttons):
+            return [], []
+        keep = suppress(xyxy, confidence, 0.5)
+        return np.asarray(xyxy, dtype=np.float64)[keep].tolist(), [b for b, k in zip(buttons, keep) if k]
+
+    def detect_batch(self, method: str, images):
+        """
+        Run one detector ('_detect_tiles', 'detect_frame' or 'detect_characters') on several frames,
+        the YOLO models see them as one batch (detector/server.py)
+        Returns: One result per image, as the single-frame method returns it
+        """
+        if method == '_detect_tiles' and self.tile_atlas is not None:
+            return [self._detect_tiles(image) for image in images]  # 图集识别很快，拿不准的再单独跑模型
+        if method == '_detect_tiles':
+            regions = [hand_region(image) for image in images]
+            strips = [image[top: bottom, left: right] for image, (left, right, top, bottom) in zip(images, regions)]
+            with metrics.span('tile_model'):
+                predictions = self.mahjong_model.predict_batch(strips)
+            return [self._tiles_from(prediction, left, top)
+                    for prediction, (left, _, top, _) in zip(predictions, regions)]
+        if method == 'detect_frame':
+            with metrics.span('ui_model'):
+                predictions = self.majsoul_model.predict_batch(images)
+            return [self._buttons_from(prediction) for prediction in predictions]
+        if method == 'detect_characters':
+            return [self.detect_characters(image) for image in images]  # OCR没有批量接口
+        raise ValueError(f'unknown detector method: {method}')
+
+    @metrics.timed('detect_characters')
     def detect_characters(self, image=None):
-        height, width = len(image), len(image[0])
-        image[int(height * 0.2): int(height * 0.6), 
-              int(width * 0.1):] = 0
+        if self.keyword_matcher is not None:
+            return self.keyword_matcher.detect(image, self._ocr_characters)
+        return self._ocr_characters(image)[0]
+
+    def _ocr_characters(self, image):
+        """
+        Full-frame PaddleOCR with the middle (OCR_MASK) blanked, image itself is not written
+        Returns: (char_dict, [(name, xyxy), ...] of every keyword hit)
+        """
+        height = len(image)
         
-        result = self.ocr_model.ocr(image, cls=False)
+        with metrics.span('ocr'):
+            result = self.ocr_model.ocr(self.ocr_input(image), cls=False)
         return_dict = {}
+        hits = []
         
-        keyword_map = {
-            '终局': 'zhongju',
-            '确认': 'queren',
-            '再来一场': 'zailaiyichang',
-            '理和鸣切拔': 'lhmqb'
-        }
-        
-        for res in result:
-            for line in res:
+        for res in result or []:
+            for line in res or []:
                 xyxy = (line[0][0][0], line[0][0][1], line[0][2][0], line[0][2][1])
                 text = line[1][0]
                 
-                if text in keyword_map:
+                if text in KEYWORD_MAP:
+                    hits.append((KEYWORD_MAP[text], xyxy))
                     if text == '确认':
                         if 'queren' in return_dict:
                             return_dict['2queren'] = True
@@ -163,8 +165,8 @@ class Detector:
                         else:
                             return_dict['queren'] = xyxy
                     elif text == '再来一场' and xyxy[1] > height // 2:
-                        return_dict[keyword_map[text]] = xyxy
+                        return_dict[KEYWORD_MAP[text]] = xyxy
                     else:
-                        return_dict[keyword_map[text]] = xyxy
+                        return_dict[KEYWORD_MAP[text]] = xyxy
         
-        return return_dict
+        return return_dict, hits
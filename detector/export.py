@@ -0,0 +1,179 @@
+"""
+Export the YOLO models for CPU backends, optionally INT8-quantized with recorded frames,
+and compare every backend side by side.
+
+    python -m detector.export --backend onnx --int8 --frames recordings/frames
+    python -m detector.export --backend openvino --int8 --frames recordings/frames --report
+
+--frames is a directory of full game screenshots (jpg / png) as captured by the bot.
+"""
+import argparse
+import glob
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+os.environ.setdefault('MAJSOUL_ACCOUNT', 'export')  # config 需要账号，导出模型用不到
+os.environ.setdefault('MAJSOUL_PASSWORD', 'export')
+
+from config import config
+from detector.backends import InferenceProfile, letterbox, load_backend, profile_from_config, weight_path
+from detector.detector import hand_region
+
+
+def model_profiles():
+    return {
+        'mahjong': profile_from_config(config, 'TILE'),
+        'majsoul_UI': profile_from_config(config, 'UI'),
+    }
+
+
+def load_frames(directory: str, limit: int):
+    paths = sorted(glob.glob(os.path.join(directory, '*.jpg')) + glob.glob(os.path.join(directory, '*.png')))
+    frames = [cv2.imread(path) for path in paths[:limit]]
+    return [frame for frame in frames if frame is not None]
+
+
+def model_input(name: str, frame):
+    """The image a model sees for a frame (the tile model only sees the hand strip)"""
+    if name == 'mahjong':
+        left, right, top, bottom = hand_region(frame)
+        return frame[top: bottom, left: right]
+    return frame
+
+
+def export(name: str, backend: str, profile: InferenceProfile) -> str:
+    from ultralytics import YOLO
+    model = YOLO(weight_path(name), verbose=False)
+    imgsz = list(profile.input_shape())
+    exported = model.export(format=backend, imgsz=imgsz, dynamic=False, simplify=True)
+    target = weight_path(name, backend)
+    if backend == 'openvino':
+        target = os.path.dirname(target)
+    if os.path.abspath(exported) != os.path.abspath(target):
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        shutil.move(exported, target)
+    print(f'{name}: exported {target}')
+    return target
+
+
+def calibration_blobs(name: str, frames, profile: InferenceProfile):
+    return [letterbox(model_input(name, frame), profile.input_shape())[0] for frame in frames]
+
+
+def quantize_onnx(name: str, blobs):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class Reader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.data = iter([{input_name: blob} for blob in blobs])
+
+        def get_next(self):
+            return next(self.data, None)
+
+    source, target = weight_path(name, 'onnx'), weight_path(name, 'onnx', int8=True)
+    input_name = onnx.load(source, load_external_data=False).graph.input[0].name
+    quantize_static(source, target, Reader(input_name), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    # 量化后的模型丢了ultralytics写入的类别名等元数据，拷回去
+    original, quantized = onnx.load(source), onnx.load(target)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(original.metadata_props)
+    onnx.save(quantized, target)
+    print(f'{name}: quantized {target}')
+
+
+def quantize_openvino(name: str, blobs):
+    import nncf
+    import openvino as ov
+    source, target = weight_path(name, 'openvino'), weight_path(name, 'openvino', int8=True)
+    model = ov.Core().read_model(source)
+    quantized = nncf.quantize(model, nncf.Dataset(blobs), preset=nncf.QuantizationPreset.MIXED)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    ov.save_model(quantized, target)
+    shutil.copy(os.path.join(os.path.dirname(source), 'metadata.yaml'), os.path.dirname(target))
+    print(f'{name}: quantized {target}')
+
+
+def match(reference, result, iou_threshold=0.5):
+    """(matched, reference count, result count) with same-class boxes of IoU >= iou_threshold"""
+    ref_xyxy, _, ref_names = reference
+    xyxy, _, names = result
+    used = set()
+    matched = 0
+    for box, name in zip(xyxy, names):
+        for i, (ref_box, ref_name) in enumerate(zip(ref_xyxy, ref_names)):
+            if i in used or ref_name != name:
+                continue
+            inter = np.clip(np.minimum(box[2:], ref_box[2:]) - np.maximum(box[:2], ref_box[:2]), 0, None).prod()
+            union = (box[2:] - box[:2]).prod() + (ref_box[2:] - ref_box[:2]).prod() - inter
+            if union > 0 and inter / union >= iou_threshold:
+                used.add(i)
+                matched += 1
+                break
+    return matched, len(ref_names), len(names)
+
+
+def report(frames, backends, int8: bool):
+    """Latency of every backend, and precision / recall against the PyTorch model with TTA (production default)"""
+    for name, profile in model_profiles().items():
+        inputs = [model_input(name, frame) for frame in frames]
+        reference_profile = InferenceProfile(imgsz=profile.imgsz, augment=True)
+        reference_model = load_backend(name, 'pytorch', reference_profile)
+        references = [reference_model.predict(image) for image in inputs]
+        variants = [('pytorch', False)] + [(b, q) for b in backends if b != 'pytorch' for q in ([False, True] if int8 else [False])]
+        print(f'\n{name} ({len(inputs)} frames)')
+        print(f'{"backend":>16} {"mean ms":>8} {"p95 ms":>8} {"precision":>10} {"recall":>8}')
+        for backend, quantized in variants:
+            try:
+                model = load_backend(name, backend, profile, quantized)
+            except (FileNotFoundError, ImportError) as e:
+                print(f'{backend + (" int8" if quantized else ""):>16} skipped: {e}')
+                continue
+            model.predict(inputs[0])  # 预热
+            latencies, matched, n_ref, n_res = [], 0, 0, 0
+            for image, reference in zip(inputs, references):
+                start = time.perf_counter()
+                result = model.predict(image)
+                latencies.append((time.perf_counter() - start) * 1000)
+                m, r, n = match(reference, result)
+                matched, n_ref, n_res = matched + m, n_ref + r, n_res + n
+            print(f'{backend + (" int8" if quantized else ""):>16} {np.mean(latencies):8.1f} '
+                  f'{np.percentile(latencies, 95):8.1f} {matched / max(n_res, 1):10.3f} {matched / max(n_ref, 1):8.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['onnx', 'openvino'], action='append',
+                        help='Backend(s) to export for, may be given twice')
+    parser.add_argument('--int8', action='store_true', help='Also write INT8 post-training quantized weights')
+    parser.add_argument('--frames', default='', help='Directory of recorded frames for calibration and the report')
+    parser.add_argument('--limit', type=int, default=300, help='Maximum number of frames used')
+    parser.add_argument('--report', action='store_true', help='Print the latency / accuracy comparison')
+    parser.add_argument('--skip-export', action='store_true', help='Only quantize / report existing exports')
+    args = parser.parse_args()
+    backends = args.backend or ['onnx']
+
+    frames = load_frames(args.frames, args.limit) if args.frames else []
+    if (args.int8 or args.report) and not frames:
+        parser.error('--int8 and --report need recorded frames (--frames)')
+
+    for backend in backends:
+        for name, profile in model_profiles().items():
+            if not args.skip_export:
+                export(name, backend, profile)
+            if args.int8:
+                blobs = calibration_blobs(name, frames, profile)
+                (quantize_onnx if backend == 'onnx' else quantize_openvino)(name, blobs)
+
+    if args.report:
+        report(frames, backends, args.int8)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+
+# 区域（相对坐标 left, top, right, bottom）和哈希网格（宽, 高）
+REGIONS = {
+    'hand': ((0.1, 0.75, 0.9, 1.0), (64, 8)),     # 手牌
+    'buttons': ((0.1, 0.6, 1.0, 0.75), (32, 8)),  # 吃碰杠立直等操作按钮
+    'side': ((0.0, 0.0, 0.1, 1.0), (8, 32)),      # 左侧理和鸣切拔按钮
+    'centre': ((0.1, 0.2, 0.9, 0.6), (32, 16)),   # 牌河、中央弹窗
+    'top': ((0.1, 0.0, 1.0, 0.2), (32, 8)),
+}
+
+# 各识别器依赖哪些区域
+DEPENDENCIES = {
+    'detect_tiles': ('hand',),
+    'detect_frame': ('hand', 'buttons', 'side', 'centre', 'top'),
+    'detect_characters': ('hand', 'buttons', 'side', 'top'),  # OCR本来就把中间涂黑了
+}
+
+
+def dhash(gray, size):
+    """Difference hash of an image downscaled to size (width, height), as a bool array"""
+    small = cv2.resize(gray, (size[0] + 1, size[1]), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return small[:, 1:] > small[:, :-1]
+
+
+class FrameGate:
+    def __init__(self, threshold: float = 0.01, max_skip: int = 30):
+        """
+        Decide which detectors need to run on a frame from per-region perceptual hashes
+        Args:
+            threshold: Fraction of hash bits that must flip for a region to count as changed
+            max_skip: A detector is re-run after this many skipped frames anyway
+        """
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.last = {}   # detector -> {region: hash} when it last ran
+        self.skipped = {name: 0 for name in DEPENDENCIES}
+        self.processed_count = {name: 0 for name in DEPENDENCIES}
+        self.skipped_count = {name: 0 for name in DEPENDENCIES}
+        self.frames = 0
+        self.idle_frames = 0
+
+    def hashes(self, image) -> dict:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        result = {}
+        for name, ((left, top, right, bottom), size) in REGIONS.items():
+            roi = gray[int(height * top):int(height * bottom), int(width * left):int(width * right)]
+            result[name] = dhash(roi, size)
+        return result
+
+    def _changed(self, old, new) -> bool:
+        return old is None or old.shape != new.shape or np.count_nonzero(old != new) > self.threshold * new.size
+
+    def check(self, image, wanted=None, force=()) -> set:
+        """
+        Args:
+            image: Current frame
+            wanted: Detectors allowed to run on this frame (all by default)
+            force: Detectors that run regardless of the hashes (e.g. no previous result)
+        Returns: names of the wanted detectors that should run, i.e. whose regions changed since they last ran
+        """
+        hashes = self.hashes(image)
+        self.frames += 1
+        to_run = set()
+        for detector, regions in DEPENDENCIES.items():
+            if wanted is not None and detector not in wanted:
+                continue
+            last = self.last.get(detector)
+            if detector in force or last is None or self.skipped[detector] >= self.max_skip or \
+                    any(self._changed(last[r], hashes[r]) for r in regions):
+                to_run.add(detector)
+                self.last[detector] = {r: hashes[r] for r in regions}
+                self.skipped[detector] = 0
+                self.processed_count[detector] += 1
+            else:
+                self.skipped[detector] += 1
+                self.skipped_count[detector] += 1
+        if not to_run:
+            self.idle_frames += 1
+        return to_run
+
+    def reset(self):
+        """Make every detector run on the next frame"""
+        self.last = {}
+
+    def stats(self) -> dict:
+        return {
+            'frames': self.frames,
+            'skipped_frames': self.idle_frames,
+            'processed': dict(self.processed_count),
+            'skipped': dict(self.skipped_count),
+        }
@@ -0,0 +1,137 @@
+import json
+import os
+import cv2
+import numpy as np
+
+KEYWORD_MAP = {
+    '终局': 'zhongju',
+    '确认': 'queren',
+    '再来一场': 'zailaiyichang',
+    '理和鸣切拔': 'lhmqb'
+}
+
+
+class KeywordMatcher:
+    def __init__(self, template_dir=None, scales=(0.9, 1.0, 1.1), high=0.85, low=0.6,
+                 margin=40, max_templates=4, ocr_interval=30):
+        """
+        Find the fixed UI strings by template matching around where they were seen before.
+        Templates are learned from PaddleOCR hits, so OCR runs on every frame while a keyword has no
+        template yet, when a match is uncertain, and every ocr_interval frames to find keywords at
+        positions no template covers.
+        Args:
+            template_dir: Where learned templates are stored (detector/templates by default)
+            scales: Template scales tried at every location
+            high: Match score above which a keyword counts as present
+            low: Match score below which a keyword counts as absent, in between is uncertain
+            margin: Pixels searched around every learned position
+            max_templates: Templates kept per keyword
+            ocr_interval: Frames between OCR refreshes once every keyword has a template
+        """
+        self.template_dir = template_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+        self.scales = scales
+        self.high, self.low = high, low
+        self.margin = margin
+        self.max_templates = max_templates
+        self.ocr_interval = ocr_interval
+        self.frame_count = 0
+        self.ocr_count = 0
+        self.templates = {name: [] for name in KEYWORD_MAP.values()}  # name -> [(box, [scaled gray templates])]
+        self.load()
+
+    def load(self):
+        index_path = os.path.join(self.template_dir, 'index.json')
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        for item in index:
+            template = cv2.imread(os.path.join(self.template_dir, item['file']), cv2.IMREAD_GRAYSCALE)
+            if template is not None and item['name'] in self.templates:
+                self._add(item['name'], tuple(item['box']), template)
+
+    def save(self):
+        os.makedirs(self.template_dir, exist_ok=True)
+        index = []
+        for name, items in self.templates.items():
+            for i, (box, scaled) in enumerate(items):
+                file = f'{name}_{i}.png'
+                cv2.imwrite(os.path.join(self.template_dir, file), scaled[self.scales.index(1.0)]
+                            if 1.0 in self.scales else scaled[0])
+                index.append({'name': name, 'file': file, 'box': list(box)})
+        with open(os.path.join(self.template_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
+
+    def _add(self, name, box, template):
+        scaled = [template if s == 1.0 else cv2.resize(template, None, fx=s, fy=s) for s in self.scales]
+        self.templates[name].append((box, scaled))
+        del self.templates[name][:-self.max_templates]
+
+    def _match(self, gray, box, scaled):
+        """Best (score, xyxy) of a template around a learned position"""
+        height, width = gray.shape
+        left, top = max(0, int(box[0]) - self.margin), max(0, int(box[1]) - self.margin)
+        right, bottom = min(width, int(box[2]) + self.margin), min(height, int(box[3]) + self.margin)
+        roi = gray[top:bottom, left:right]
+        best = (-1.0, None)
+        for template in scaled:
+            h, w = template.shape
+            if h > roi.shape[0] or w > roi.shape[1]:
+                continue
+            result = cv2.matchTemplate(roi, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (x, y) = cv2.minMaxLoc(result)
+            if score > best[0]:
+                best = (score, (left + x, top + y, left + x + w, top + y + h))
+        return best
+
+    def detect(self, image, ocr):
+        """
+        Args:
+            image: Game frame (BGR), not modified
+            ocr: Fallback, image -> (char_dict, [(name, xyxy), ...]) from PaddleOCR
+        Returns: char_dict in the same format as Detector.detect_characters
+        """
+        self.frame_count += 1
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        found = {}  # name -> [xyxy]
+        uncertain = False
+        for name, items in self.templates.items():
+            for box, scaled in items:
+                score, xyxy = self._match(gray, box, scaled)
+                if score >= self.high:
+                    if all(abs(xyxy[0] - other[0]) > xyxy[2] - xyxy[0] for other in found.get(name, [])):
+                        found.setdefault(name, []).append(xyxy)
+                elif score > self.low:
+                    uncertain = True
+
+        missing = any(not items for items in self.templates.values())
+        # 模板只在学过的位置附近搜索，定期全图OCR一次，新位置上的关键词由learn补上模板
+        if uncertain or missing or self.frame_count % self.ocr_interval == 0:
+            self.ocr_count += 1
+            char_dict, hits = ocr(image)
+            self.learn(gray, hits, found)
+            return char_dict
+
+        char_dict = {}
+        for name, boxes in found.items():
+            boxes = sorted(boxes)
+            if name == 'queren' and len(boxes) > 1:
+                char_dict['2queren'] = True
+            char_dict[name] = boxes[0]
+        return char_dict
+
+    def learn(self, gray, hits, found):
+        """Keep a template for every OCR hit the matcher did not already find at that place"""
+        changed = False
+        for name, xyxy in hits:
+            xyxy = tuple(int(round(v)) for v in xyxy)
+            if any(abs(xyxy[0] - b[0]) < self.margin and abs(xyxy[1] - b[1]) < self.margin
+                   for b in found.get(name, [])):
+                continue
+            template = gray[xyxy[1]:xyxy[3], xyxy[0]:xyxy[2]]
+            if template.size == 0:
+                continue
+            self._add(name, xyxy, np.ascontiguousarray(template))
+            changed = True
+        if changed:
+            self.save()
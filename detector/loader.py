@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from utils.log import get_logger
+from utils.metrics import metrics
+
+log = get_logger(__name__)
+
+
+def load_detector(warmup: bool = True, **detector_kwargs):
+    """Build a Detector and optionally run the warm-up inferences, logging how long it took"""
+    start = perf_counter()
+    from detector.detector import Detector  # torch / ultralytics / paddleocr 在这里才导入
+    detector = Detector(**detector_kwargs)
+    loaded = perf_counter()
+    if warmup:
+        detector.warmup()
+    metrics.observe('model_load', perf_counter() - start)
+    log.info("models loaded in %.1f s%s", loaded - start,
+             f", warmed up in {perf_counter() - loaded:.1f} s" if warmup else '')
+    return detector
+
+
+class DetectorLoader:
+    def __init__(self, warmup: bool = True, **detector_kwargs):
+        """
+        Load the Detector in a background thread, e.g. while the browser starts and logs in.
+        Stands in for the Detector: the first call to any of its methods waits for the models.
+        Args:
+            warmup: Run every model once on a blank frame before the first real one
+            detector_kwargs: Arguments of Detector
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='detector-loader')
+        self.future = executor.submit(load_detector, warmup, **detector_kwargs)
+        executor.shutdown(wait=False)
+
+    def result(self, timeout: float = None):
+        """The loaded Detector, raises what loading raised"""
+        return self.future.result(timeout)
+
+    def wait_ready(self, timeout: float = None) -> None:
+        """Block until the models are loaded, raises what loading raised"""
+        self.future.result(timeout)
+
+    def failed(self) -> bool:
+        """Loading finished with an error, every call would raise it again"""
+        return self.future.done() and self.future.exception() is not None
+
+    def __getattr__(self, name):
+        if name == 'future':  # 构造失败时避免无限递归
+            raise AttributeError(name)
+        return getattr(self.result(), name)
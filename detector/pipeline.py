@@ -0,0 +1,221 @@
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from time import time
+
+
+class FrameState:
+    def __init__(self, box, image, tiles_result, frame_result, char_dict, index: int = None):
+        """
+        Everything detected on one captured frame, so handlers see a consistent snapshot
+        Args:
+            box: (left, top, right, bottom) of the game window when captured
+            image: The captured frame (BGR)
+            tiles_result: (xyxy_tiles, tiles) from Detector.detect_tiles
+            frame_result: (xyxy_buttons, buttons) from Detector.detect_frame
+            char_dict: Result of Detector.detect_characters
+            index: Index the SessionRecorder gave the frame, if it is recorded
+        """
+        self.index = index
+        self.box = box
+        self.image = image
+        self.xyxy_tiles, self.tiles = tiles_result
+        self.xyxy_buttons, self.buttons = frame_result
+        self.char_dict = char_dict
+        self.timestamp = time()
+
+
+EMPTY_RESULTS = {
+    'detect_tiles': ([], []),
+    'detect_frame': ([], []),
+    'detect_characters': {},
+}
+
+_worker_detector = None  # 进程池模式下，每个子进程各自加载一份模型
+
+
+def _init_worker(detector_kwargs):
+    global _worker_detector
+    from detector.loader import load_detector
+    _worker_detector = load_detector(**detector_kwargs)
+
+
+def _ready():
+    return True
+
+
+def _run_in_worker(method, image):
+    return getattr(_worker_detector, method)(image)
+
+
+def _resync_worker():
+    _worker_detector.resync()
+
+
+class DetectorPipeline:
+    DETECTORS = ('detect_tiles', 'detect_frame', 'detect_characters')
+
+    def __init__(self, capture, detector=None, mode: str = 'off', detector_kwargs=None,
+                 gate=None, scheduler=None):
+        """
+        Run the three detectors of a frame concurrently and capture the next frame meanwhile.
+        Every detector has its own single-worker executor, so one detector never runs on two
+        frames at once (the models are not thread safe, KeywordMatcher and HandTracker keep state)
+        and in 'process' mode the same process always sees the frames of a detector
+        Args:
+            capture: Callable returning (box, image) or (box, image, index) of a new frame, or None when
+                     the window is gone; index is passed on as FrameState.index.
+                     Always called from the caller's thread (Playwright's sync API is not thread safe)
+            detector: Detector shared by the 'off' and 'thread' modes, unused in 'process' mode
+            mode: 'off' (sequential), 'thread' (shared detector) or 'process' (one detector per process)
+            detector_kwargs: Arguments of load_detector in every worker process ('process' mode)
+            gate: Optional FrameGate; detectors whose screen regions did not change reuse their last result
+            scheduler: Optional callable, () -> {detector: 'run' / 'cached' / 'off'} for the next frame
+        """
+        self.capture = capture
+        self.detector = detector
+        self.mode = mode
+        self.loading = []  # 'process' 模式下各子进程加载模型的 future
+        if mode == 'thread':
+            self.pools = {method: ThreadPoolExecutor(max_workers=1, thread_name_prefix=method)
+                          for method in self.DETECTORS}
+        elif mode == 'process':
+            self.pools = {method: ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                                      initargs=(detector_kwargs or {},))
+                          for method in self.DETECTORS}
+            # 现在就启动子进程加载模型，而不是等到第一帧
+            self.loading = [pool.submit(_ready) for pool in self.pools.values()]
+        else:
+            self.pools = None
+        self.gate = gate
+        self.scheduler = scheduler
+        self.pending = None
+        self.last = {}  # detector -> last result ('off') or future
+
+    def wait_ready(self, timeout: float = None) -> None:
+        """
+        Block until the models are loaded (DetectorLoader or the worker processes), raises what
+        loading raised (BrokenProcessPool when a worker process died), so the caller fails fast
+        """
+        for future in self.loading:
+            future.result(timeout)
+        wait_ready = getattr(self.detector, 'wait_ready', None) if self.detector is not None else None
+        if wait_ready is not None:
+            wait_ready(timeout)
+
+    def _stale(self, method) -> bool:
+        """No usable previous result for method"""
+        last = self.last.get(method)
+        return last is None or (self.pools is not None and (last.cancelled() or
+                                                           last.done() and last.exception() is not None))
+
+    def _plan(self, image):
+        """
+        Returns: (detectors to run, detectors switched off) for this frame
+        """
+        plan = self.scheduler() if self.scheduler is not None else {}
+        off = {method for method in self.DETECTORS if plan.get(method) == 'off'}
+        due = {method for method in self.DETECTORS if plan.get(method, 'run') == 'run'}
+        stale = {method for method in self.DETECTORS if method not in off and self._stale(method)}
+        if self.gate is None:
+            return due | stale, off
+        return self.gate.check(image, due | stale, force=stale), off
+
+    def _run(self, method, image):
+        # 所有识别器共用同一帧（只读），需要改动图像的自己做拷贝
+        if self.mode == 'process':
+            return self.pools[method].submit(_run_in_worker, method, image)
+        if self.pools is not None:
+            return self.pools[method].submit(getattr(self.detector, method), image)
+        return getattr(self.detector, method)(image)
+
+    def _submit(self, image):
+        """Results ('off') or futures of every detector, reusing the previous ones that were not run"""
+        to_run, off = self._plan(image)
+        results = []
+        for method in self.DETECTORS:
+            if method in off:
+                # 当前状态不需要的识别器直接给空结果，之后重新需要时一定重新运行
+                self.last.pop(method, None)
+                results.append(self._empty(method))
+                continue
+            if method in to_run:
+                try:
+                    self.last[method] = self._run(method, image)
+                except Exception:
+                    # 出错时不能再沿用上一次的结果
+                    self.last.pop(method, None)
+                    if self.gate is not None:
+                        self.gate.reset()
+                    raise
+            results.append(self.last[method])
+        return results
+
+    def _empty(self, method):
+        result = EMPTY_RESULTS[method]
+        if self.pools is None:
+            return result
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def _start(self):
+        captured = self.capture()
+        if captured is None:
+            return None
+        box, image, *index = captured
+        return box, image, self._submit(image), index
+
+    def next_frame(self):
+        """
+        :return: FrameState of the oldest frame in flight, or None when capture stopped
+        """
+        if self.pools is None:
+            captured = self.capture()
+            if captured is None:
+                return None
+            box, image, *index = captured
+            return FrameState(box, image, *self._submit(image), *index)
+
+        current, self.pending = self.pending, None
+        if current is None:
+            current = self._start()
+            if current is None:
+                return None
+        # 第N帧推理的同时截下第N+1帧
+        self.pending = self._start()
+        box, image, futures, index = current
+        return FrameState(box, image, *[future.result() for future in futures], *index)
+
+    def detect(self, box, image, index: int = None) -> FrameState:
+        """
+        Run the detectors on a frame captured by the caller and wait for them (blocking),
+        for runtimes with their own capture loop such as async_main.py
+        """
+        results = self._submit(image)
+        if self.pools is not None:
+            results = [future.result() for future in results]
+        return FrameState(box, image, *results, index)
+
+    def flush(self) -> None:
+        """Drop the frame in flight, e.g. after a click made it stale"""
+        if self.pending is not None:
+            for future in self.pending[2]:
+                future.cancel()
+            self.pending = None
+            self.last = {method: future for method, future in self.last.items() if not future.cancelled()}
+
+    def resync(self) -> None:
+        """Forget tracked state (Detector.resync) in whichever process owns the detectors"""
+        if self.mode == 'process':
+            # 排在已提交的帧之后执行，不会和识别同时修改跟踪状态
+            for pool in self.pools.values():
+                pool.submit(_resync_worker)
+        elif self.pools is not None:
+            self.pools['detect_tiles'].submit(self.detector.resync)
+        else:
+            self.detector.resync()
+
+    def shutdown(self) -> None:
+        self.flush()
+        if self.pools is not None:
+            for pool in self.pools.values():
+                pool.shutdown(wait=False)
@@ -0,0 +1,127 @@
+"""
+Array-only post-processing of the YOLO detections: pairwise IoU, suppression of overlapping
+boxes, and the hand's tile filtering and slot assignment. No Python loops over boxes.
+"""
+import numpy as np
+
+
+def box_iou(a, b):
+    """
+    Pairwise IoU of two sets of xyxy boxes
+    Args:
+        a: (n, 4) array, b: (m, 4) array
+    Returns: (n, m) array, 0 where boxes do not overlap
+    """
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    width = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    height = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=intersection > 0)
+
+
+def suppress(xyxy, confidence, iou: float = 0.5, classes=None):
+    """
+    Drop every box that overlaps a more confident box by more than iou
+    Args:
+        classes: Optional class id of every box, then only boxes of the same class suppress each other
+    Returns: Boolean mask of the boxes kept
+    """
+    confidence = np.asarray(confidence)
+    overlaps = box_iou(xyxy, xyxy) > iou
+    np.fill_diagonal(overlaps, False)
+    dominated = overlaps & (confidence[None, :] > confidence[:, None])
+    if classes is not None:
+        classes = np.asarray(classes)
+        dominated &= classes[:, None] == classes[None, :]
+    return ~dominated.any(axis=1)
+
+
+def _median(values):
+    """Median along the last axis; np.median's overhead dominates on a hand's dozen boxes"""
+    ordered = np.sort(values, axis=-1)
+    n = ordered.shape[-1]
+    return (ordered[..., (n - 1) // 2] + ordered[..., n // 2]) / 2
+
+
+def filter_tiles(xyxy, tolerance: float = 0.2):
+    """
+    Keep the boxes that look like a hand tile: width, height, vertical center and area all within
+    tolerance (relative) of the median box
+    Returns: Boolean mask
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+    width = xyxy[:, 2] - xyxy[:, 0]
+    height = xyxy[:, 3] - xyxy[:, 1]
+    features = np.stack([width, height, xyxy[:, 3] + xyxy[:, 1], width * height])
+    medians = _median(features)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.abs(features - medians) / np.maximum(features, medians)
+    return np.all(relative < tolerance, axis=0)
+
+
+def assign_slots(xyxy, confidence, n_slots: int = 160):
+    """
+    Put every box into the hand slot its left edge falls in, one tile width per slot counted from
+    the leftmost box; of several boxes in one slot the most confident (then the first) wins
+    Returns: (box indices, their slots), ordered by slot
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+    if not len(xyxy):
+        return np.zeros(0, int), np.zeros(0, int)
+    tile_width = _median(xyxy[:, 2] - xyxy[:, 0])
+    positions = np.rint((xyxy[:, 0] - xyxy[:, 0].min()) / tile_width).astype(int)
+    # 按 (牌位, -置信度, 序号) 排序，每个牌位的第一个即胜出者
+    order = np.lexsort((np.arange(len(xyxy)), -np.asarray(confidence), positions))
+    slots = positions[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = slots[1:] != slots[:-1]
+    winners, slots = order[first], slots[first]
+    inside = slots < n_slots
+    return winners[inside], slots[inside]
+
+
+def fill_gaps(slots, slot_xyxy, slot_labels, last: int = 12):
+    """
+    A single empty slot between two slots of the same tile (slots 1..last-1) is taken to be that
+    tile too, the model tends to miss the middle one of three identical tiles
+    Args:
+        slots: Occupied slots in increasing order, slot_xyxy: (n, 4) boxes and slot_labels: (n,) int
+               labels of those slots
+    Returns: (slot_xyxy, slot_labels) with a box and label inserted for every gap, new arrays
+    """
+    left = np.flatnonzero((np.diff(slots) == 2) & (slot_labels[:-1] == slot_labels[1:]) & (slots[:-1] < last - 1))
+    if not len(left):
+        return slot_xyxy, slot_labels
+    boxes = np.stack([slot_xyxy[left, 2], slot_xyxy[left, 1], slot_xyxy[left + 1, 0], slot_xyxy[left + 1, 3]], axis=1)
+    return np.insert(slot_xyxy, left + 1, boxes, axis=0), np.insert(slot_labels, left + 1, slot_labels[left])
+
+
+def hand_tiles(xyxy, confidence, names, offset=(0, 0), n_slots: int = 160):
+    """
+    Tile model output on the hand strip -> the hand from left to right
+    Args:
+        xyxy, confidence, names: Boxes, scores and class names of the tile model
+        offset: (left, top) of the hand strip in the frame
+    Returns: (xyxy array (n, 4) in frame coordinates, list of tile names)
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+    if not len(xyxy):
+        return xyxy, []
+    confidence = np.asarray(confidence)
+    # 类名换成整数编号，字典查表比 np.unique 处理字符串快得多
+    classes = {}
+    codes = np.array([classes.setdefault(str(name), len(classes)) for name in names])
+    classes = list(classes)
+    keep = filter_tiles(xyxy)
+    xyxy, confidence, codes = xyxy[keep], confidence[keep], codes[keep]
+    if not len(xyxy):
+        return xyxy, []
+
+    boxes, slots = assign_slots(xyxy, confidence, n_slots)
+    hand, labels = fill_gaps(slots, xyxy[boxes], codes[boxes])
+    hand = hand + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float64)
+    return hand, [classes[label] for label in labels.tolist()]
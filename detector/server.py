@@ -0,0 +1,336 @@
+"""
+Inference server: one process owns the models and serves every bot on the host.
+
+    python -m detector.server --port 6100
+    # .env of each bot: INFERENCE_SERVER=127.0.0.1:6100
+
+Frames are not pickled. Every client writes its frames into its own shared-memory ring of frame
+slots and only sends (request id, method, slot, shape, dtype) over the connection. The server
+collects the requests of all clients for at most --max-wait-ms (or until --max-batch requests),
+runs each model once on the whole batch and answers every client on its own connection.
+"""
+import argparse
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+
+import numpy as np
+
+from detector.tracker import HandTracker
+from utils.log import get_logger
+from utils.metrics import metrics
+
+log = get_logger(__name__)
+
+DEFAULT_AUTHKEY = 'majsoulbot'
+METHODS = ('_detect_tiles', 'detect_frame', 'detect_characters')
+
+_created = set()  # 本进程的 InferenceClient 创建的帧环
+
+
+def parse_address(text: str):
+    """'127.0.0.1:6100' -> ('127.0.0.1', 6100), '6100' -> ('127.0.0.1', 6100)"""
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def attach(name: str) -> SharedMemory:
+    """
+    Attach to a client's frame ring without registering it with this process' resource tracker,
+    which would unlink the client's segment (or warn about a leak) when the server exits
+    """
+    try:
+        return SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = SharedMemory(name=name)
+    # 客户端在同一进程里（测试、基准）时，这是客户端自己的登记，不能注销
+    if os.name == 'posix' and name not in _created:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class _Connection:
+    def __init__(self, conn, shm: SharedMemory, slot_bytes: int):
+        """Server side of one client: its connection and its attached frame ring"""
+        self.conn = conn
+        self.shm = shm
+        self.slot_bytes = slot_bytes
+        self.lock = threading.Lock()  # 客户端线程和批处理线程都会回复
+
+    def image(self, slot: int, shape, dtype):
+        """View of a frame slot, raises ValueError / TypeError when the request does not fit the ring"""
+        dtype = np.dtype(dtype)
+        if dtype.hasobject:
+            raise ValueError(f'unsupported dtype {dtype}')
+        shape = tuple(int(v) for v in shape)
+        if any(v < 0 for v in shape):
+            raise ValueError(f'bad shape {shape}')
+        slots = self.shm.size // self.slot_bytes
+        if not 0 <= int(slot) < slots:
+            raise ValueError(f'slot {slot} outside the ring of {slots}')
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        if nbytes > self.slot_bytes:
+            raise ValueError(f'frame of {nbytes} bytes does not fit a {self.slot_bytes} byte slot')
+        return np.ndarray(shape, dtype, self.shm.buf, int(slot) * self.slot_bytes)
+
+    def reply(self, request_id: int, result=None, error: str = None):
+        try:
+            with self.lock:
+                self.conn.send((request_id, error, result))
+        except (OSError, EOFError):
+            pass  # 客户端已经断开
+
+    def close(self):
+        self.conn.close()
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # 批处理线程还拿着这块内存的视图，等它们被回收后再释放
+
+
+class InferenceServer:
+    def __init__(self, detector, address=('127.0.0.1', 6100), authkey: str = DEFAULT_AUTHKEY,
+                 max_batch: int = 8, max_wait: float = 0.005):
+        """
+        Args:
+            detector: Detector owning the models (without a hand tracker, clients track themselves)
+            address: (host, port) to listen on
+            max_batch: Most requests run as one batch
+            max_wait: Longest time in seconds the first request of a batch waits for others
+        """
+        self.detector = detector
+        self.address = address
+        self.authkey = authkey.encode()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()   # (connection, request id, method, image)
+
+    def _serve_client(self, conn):
+        try:
+            hello = conn.recv()
+            if int(hello['slot_bytes']) <= 0:
+                raise ValueError(f"bad slot size {hello['slot_bytes']}")
+            connection = _Connection(conn, attach(hello['shm']), int(hello['slot_bytes']))
+        except Exception as e:
+            log.warning("Rejected client: %s", e)
+            conn.close()
+            return
+        log.info("client connected, ring %s", hello['shm'])
+        try:
+            while True:
+                message = conn.recv()
+                try:
+                    request_id, method, slot, shape, dtype = message
+                except (TypeError, ValueError):
+                    log.warning("Malformed request from ring %s: %r", hello['shm'], message)
+                    continue
+                if method not in METHODS:
+                    connection.reply(request_id, error=f'unknown detector method: {method}')
+                    continue
+                try:
+                    image = connection.image(slot, shape, dtype)
+                except (TypeError, ValueError) as e:
+                    # 请求有误时回复错误，不能让这个客户端的线程退出
+                    connection.reply(request_id, error=f'bad request: {e}')
+                    continue
+                self.requests.put((connection, request_id, method, image))
+        except (EOFError, OSError):
+            log.info("client disconnected, ring %s", hello['shm'])
+        finally:
+            connection.close()
+
+    def _next_batch(self):
+        """Block for one request, then collect more until max_batch or max_wait after the first"""
+        batch = [self.requests.get()]
+        deadline = perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch):
+        """Run every model once on its requests of the batch and answer the clients"""
+        metrics.count('batches')
+        metrics.count('batched_requests', len(batch))
+        by_method = {}
+        for request in batch:
+            by_method.setdefault(request[2], []).append(request)
+        for method, requests in by_method.items():
+            try:
+                with metrics.span('batch_' + method.lstrip('_')):
+                    results = self.detector.detect_batch(method, [image for _, _, _, image in requests])
+            except Exception as e:
+                metrics.count('errors')
+                log.warning("Error in batch of %d %s: %s", len(requests), method, e)
+                for connection, request_id, _, _ in requests:
+                    connection.reply(request_id, error=str(e))
+                continue
+            for (connection, request_id, _, _), result in zip(requests, results):
+                connection.reply(request_id, result)
+
+    def _run_batches(self):
+        while True:
+            # 视图只活在_run_batch里，返回后客户端断开时共享内存就能释放
+            self._run_batch(self._next_batch())
+
+    def serve_forever(self):
+        listener = Listener(self.address, authkey=self.authkey)
+        log.info("inference server listening on %s:%d", *self.address)
+        threading.Thread(target=self._run_batches, name='batcher', daemon=True).start()
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_client, args=(conn,), name='client', daemon=True).start()
+        finally:
+            listener.close()
+
+
+class InferenceClient:
+    def __init__(self, address, authkey: str = DEFAULT_AUTHKEY, slots: int = 4, slot_bytes: int = 1440 * 900 * 3,
+                 hand_tracker: bool = False, timeout: float = 30):
+        """
+        Drop-in for Detector backed by an InferenceServer, safe to call from several threads
+        Args:
+            address: (host, port) of the server
+            slots: Frames that can be in flight at once
+            slot_bytes: Size of one frame slot, the largest frame the client can send
+            hand_tracker: Track the hand locally, only changed slots go to the server
+            timeout: Seconds to wait for one result
+        """
+        self.conn = Client(address, authkey=authkey.encode())
+        self.slot_bytes = slot_bytes
+        self.timeout = timeout
+        self.shm = SharedMemory(create=True, size=slots * slot_bytes)
+        _created.add(self.shm.name)
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.ids = itertools.count()
+        self.futures = {}   # request id -> (future, slot)，槽位在收到回复后才放回
+        self.lock = threading.Lock()
+        self.hand_tracker = HandTracker() if hand_tracker else None
+        self.conn.send({'shm': self.shm.name, 'slot_bytes': slot_bytes})
+        threading.Thread(target=self._read, name='inference-client', daemon=True).start()
+        log.info("connected to inference server %s:%d", *address)
+
+    def _read(self):
+        try:
+            while True:
+                request_id, error, result = self.conn.recv()
+                with self.lock:
+                    future, slot = self.futures.pop(request_id, (None, None))
+                if future is None:
+                    continue
+                # 超时放弃的请求也要等到回复才放回槽位，服务端读完之前不能被下一帧覆盖
+                self.free.put(slot)
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(RuntimeError(f'inference server: {error}'))
+                else:
+                    future.set_result(result)
+        except (EOFError, OSError):
+            with self.lock:
+                futures, self.futures = self.futures, {}
+            for future, _ in futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('inference server closed the connection'))
+
+    def _call(self, method: str, image):
+        image = np.ascontiguousarray(image)
+        if image.nbytes > self.slot_bytes:
+            raise ValueError(f'frame of {image.nbytes} bytes does not fit a {self.slot_bytes} byte slot')
+        try:
+            slot = self.free.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError('every frame slot is still in flight on the inference server') from None
+        request_id = None
+        try:
+            view = np.ndarray(image.shape, image.dtype, self.shm.buf, slot * self.slot_bytes)
+            view[...] = image
+            del view
+            future = Future()
+            with self.lock:
+                request_id = next(self.ids)
+                self.futures[request_id] = (future, slot)
+                self.conn.send((request_id, method, slot, image.shape, image.dtype.str))
+        except BaseException:
+            # 请求没有发出去，服务端不会读这个槽位
+            with self.lock:
+                self.futures.pop(request_id, None)
+            self.free.put(slot)
+            raise
+        return future.result(self.timeout)
+
+    def resync(self):
+        if self.hand_tracker is not None:
+            self.hand_tracker.resync()
+
+    @metrics.timed('detect_tiles')
+    def detect_tiles(self, image=None):
+        if self.hand_tracker is not None:
+            return self.hand_tracker.track(image, self._detect_tiles)
+        return self._detect_tiles(image)
+
+    def _detect_tiles(self, image):
+        return self._call('_detect_tiles', image)
+
+    @metrics.timed('detect_frame')
+    def detect_frame(self, image=None):
+        return self._call('detect_frame', image)
+
+    @metrics.timed('detect_characters')
+    def detect_characters(self, image=None):
+        return self._call('detect_characters', image)
+
+    def close(self):
+        self.conn.close()
+        _created.discard(self.shm.name)
+        self.shm.close()
+        self.shm.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6100)
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault('MAJSOUL_ACCOUNT', 'server')  # config 需要账号，服务进程不登录
+    os.environ.setdefault('MAJSOUL_PASSWORD', 'server')
+    from config import config
+    from detector.backends import profile_from_config
+    from detector.loader import load_detector
+    from utils.log import setup as setup_logging
+
+    setup_logging(config.LOG_LEVEL, config.LOG_RATE)
+    if config.METRICS_PORT:
+        metrics.serve(config.METRICS_PORT)
+    detector = load_detector(config.MODEL_WARMUP, char_backend=config.CHAR_BACKEND, backend=config.DETECTOR_BACKEND,
+                             int8=config.DETECTOR_INT8, tile_profile=profile_from_config(config, 'TILE'),
+                             ui_profile=profile_from_config(config, 'UI'), tile_backend=config.TILE_BACKEND)
+    server = InferenceServer(detector, (args.host, args.port), config.INFERENCE_AUTHKEY,
+                             args.max_batch, args.max_wait_ms / 1000)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        metrics.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import cv2
+import numpy as np
+
+
+class HandTracker:
+    def __init__(self, resync_interval: int = 50, same=0.04, known=0.08, margin=0.02, size=(16, 24)):
+        """
+        Follow the hand across frames instead of re-running the tile model on every frame.
+        Every slot keeps a small grayscale signature of its crop; slots whose crop did not
+        change keep their label, changed slots are re-classified by the nearest signature
+        of a tile seen before, and anything unclear falls back to a full detection.
+        Only a closed 13-tile hand (plus the drawn tile) is tracked.
+        Args:
+            resync_interval: Frames after which a full detection is forced
+            same: Mean absolute difference (0-1) under which a crop counts as unchanged
+            known: Distance under which a crop is classified as a known tile
+            margin: Required gap between the best and the second best known tile
+            size: (width, height) the crops are downscaled to
+        """
+        self.resync_interval = resync_interval
+        self.same, self.known, self.margin = same, known, margin
+        self.size = size
+        self.library = {}        # label -> signature
+        self.empty = None        # 摸牌位置没有牌时的签名
+        self.draw_gap = None     # 摸到的牌与手牌之间的间隔（像素）
+        self.full_count = 0
+        self.tracked_count = 0
+        self.resync()
+
+    def resync(self):
+        """Force a full detection on the next frame, e.g. when a new round starts"""
+        self.slots = None        # [(xyxy, label, signature)]
+        self.frames_since_full = 0
+
+    def _signature(self, image, xyxy):
+        left, top, right, bottom = (int(round(v)) for v in xyxy)
+        crop = image[max(top, 0):bottom, max(left, 0):right]
+        if crop.size == 0:
+            return None
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        return cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+
+    @staticmethod
+    def _distance(a, b):
+        return float(np.abs(a - b).mean())
+
+    def _classify(self, signature):
+        """Label of the nearest known tile, None if unsure"""
+        if signature is None or len(self.library) < 2:
+            return None
+        labels = list(self.library)
+        distances = np.abs(np.stack([self.library[label] for label in labels]) - signature).mean(axis=(1, 2))
+        order = np.argsort(distances)
+        if distances[order[0]] < self.known and distances[order[1]] - distances[order[0]] > self.margin:
+            return labels[order[0]]
+        return None
+
+    def _draw_slot(self, slots):
+        """Where a drawn tile appears right of the 13-tile hand"""
+        if self.draw_gap is None or not slots or len(slots) != 13:
+            return None
+        left, top, right, bottom = slots[-1][0]
+        width = right - left
+        return [right + self.draw_gap, top, right + self.draw_gap + width, bottom]
+
+    def _learn(self, image, xyxy, tiles):
+        if not xyxy:  # 不在对局中，没有可跟踪的手牌
+            self.slots = None
+            return
+        self.slots = []
+        for box, label in zip(xyxy, tiles):
+            signature = self._signature(image, box)
+            if signature is None:
+                continue
+            self.slots.append((box, label, signature))
+            old = self.library.get(label)
+            self.library[label] = signature if old is None else 0.8 * old + 0.2 * signature
+        if len(xyxy) == 14:
+            width = xyxy[12][2] - xyxy[12][0]
+            gap = xyxy[13][0] - xyxy[12][2]
+            if gap > 0.2 * width:
+                self.draw_gap = gap
+                self.slots = self.slots[:13]  # 摸到的牌单独作为摸牌位跟踪
+        elif len(xyxy) == 13:
+            draw_slot = self._draw_slot(self.slots)
+            if draw_slot is not None:
+                self.empty = self._signature(image, draw_slot)
+
+    def track(self, image, detect):
+        """
+        Args:
+            image: Full game frame
+            detect: Full detection, image -> (xyxy, tiles) as returned by Detector.detect_tiles
+        Returns: (xyxy, tiles) in the same format
+        """
+        draw_slot = self._draw_slot(self.slots)
+        # 还不知道摸牌位在哪/空着是什么样时，没法发现新摸的牌，只能整体检测
+        if draw_slot is None or self.empty is None or self.frames_since_full >= self.resync_interval:
+            return self._full(image, detect)
+
+        xyxy, tiles, slots = [], [], []
+        for box, label, signature in self.slots:
+            current = self._signature(image, box)
+            if current is None:
+                return self._full(image, detect)
+            if self._distance(current, signature) >= self.same:
+                label = self._classify(current)  # 只对变化了的位置重新分类
+                if label is None:
+                    return self._full(image, detect)
+            xyxy.append(list(box))
+            tiles.append(label)
+            slots.append((box, label, current))
+
+        current = self._signature(image, draw_slot)
+        if current is None:
+            return self._full(image, detect)
+        if self._distance(current, self.empty) >= self.same:
+            label = self._classify(current)
+            if label is None:
+                return self._full(image, detect)
+            xyxy.append(list(draw_slot))
+            tiles.append(label)
+
+        self.slots = slots
+        self.frames_since_full += 1
+        self.tracked_count += 1
+        return xyxy, tiles
+
+    def _full(self, image, detect):
+        xyxy, tiles = detect(image)
+        self._learn(image, xyxy, tiles)
+        self.frames_since_full = 0
+        self.full_count += 1
+        return [list(box) for box in xyxy], list(tiles)
+
+    def stats(self) -> dict:
+        return {'full': self.full_count, 'tracked': self.tracked_count}
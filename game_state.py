@@ -0,0 +1,211 @@
+from collections import Counter
+from time import perf_counter, process_time, sleep, time
+
+from colorama import Fore
+
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+LOGIN = 'login'
+LOBBY = 'lobby'
+QUEUE = 'queue'
+IN_GAME = 'in_game'
+OUR_TURN = 'our_turn'
+CALL_PROMPT = 'call_prompt'
+ROUND_END = 'round_end'
+
+# 每个状态下各识别器每隔几帧运行一次（从进入该状态起计数，进入后的第一帧全部运行），0表示不运行
+SCHEDULE = {
+    LOGIN: {'detect_tiles': 10, 'detect_frame': 1, 'detect_characters': 10},
+    LOBBY: {'detect_tiles': 0, 'detect_frame': 1, 'detect_characters': 10},      # 大厅里没有手牌
+    QUEUE: {'detect_tiles': 2, 'detect_frame': 5, 'detect_characters': 10},      # 等手牌出现
+    IN_GAME: {'detect_tiles': 1, 'detect_frame': 1, 'detect_characters': 5},
+    OUR_TURN: {'detect_tiles': 1, 'detect_frame': 1, 'detect_characters': 5},
+    CALL_PROMPT: {'detect_tiles': 1, 'detect_frame': 1, 'detect_characters': 10},
+    ROUND_END: {'detect_tiles': 0, 'detect_frame': 2, 'detect_characters': 1},   # 只看确认/终局等文字
+}
+
+# 每个状态下最多每秒截图识别几帧，0表示不限速（FRAME_RATES 可覆盖）
+FRAME_RATES = {
+    LOGIN: 2,
+    LOBBY: 2,
+    QUEUE: 1,          # 排队动辄几十秒
+    IN_GAME: 4,        # 别人的回合，等鸣牌按钮或摸牌
+    OUR_TURN: 0,
+    CALL_PROMPT: 0,
+    ROUND_END: 1,      # 结算动画、确认按钮
+}
+
+LOBBY_BUTTONS = ('3p-east', 'match', 'silver')
+CALL_BUTTONS = ('chi', 'peng', 'gang')
+
+
+class GameStateMachine:
+    def __init__(self, queue_timeout: float = 30, state: str = LOGIN):
+        """
+        Where the bot is in the game, decided from the detections of every frame
+        Args:
+            queue_timeout: Seconds in the queue after which the lobby buttons are clicked again
+            state: Initial state
+        """
+        self.queue_timeout = queue_timeout
+        self.state = None
+        self.enter(state)
+
+    def enter(self, state: str):
+        """Switch to state, staying in the current state keeps its timers"""
+        if state == self.state:
+            return
+        log.info(Fore.CYAN + '%s -> %s' + Fore.WHITE, self.state, state)
+        self.state = state
+        self.since = time()
+        self.frame_count = 0
+        self.idle_since = None
+
+    def elapsed(self) -> float:
+        """Seconds since the current state was entered"""
+        return time() - self.since
+
+    def idle(self) -> float:
+        """Seconds since the bot last did something in this state, the timer starts on the first call"""
+        if self.idle_since is None:
+            self.idle_since = time()
+        return time() - self.idle_since
+
+    def active(self):
+        """The bot just acted, restart the idle timer"""
+        self.idle_since = None
+
+    def stalled(self, buttons, max_wait: float) -> bool:
+        """
+        Nothing to click in LOGIN / LOBBY / QUEUE for max_wait seconds, e.g. a post-login or event
+        popup hides the lobby buttons; the caller clicks the center to dismiss it
+        Returns: True at most once per max_wait seconds, False in the other states
+        """
+        if self.state not in (LOGIN, LOBBY, QUEUE):
+            return False
+        if any(button in buttons for button in LOBBY_BUTTONS):
+            self.active()  # 大厅按钮可见：要么会被点击，要么正在排队
+            return False
+        if self.idle() <= max_wait:
+            return False
+        self.active()
+        return True
+
+    def detectors(self) -> dict:
+        """
+        Which detectors the next frame needs, passed to DetectorPipeline as its scheduler
+        Returns: {detector: 'run' / 'cached' / 'off'}
+        """
+        plan = {}
+        for method, period in SCHEDULE[self.state].items():
+            if period == 0:
+                plan[method] = 'off'
+            else:
+                plan[method] = 'run' if self.frame_count % period == 0 else 'cached'
+        self.frame_count += 1
+        return plan
+
+    def update(self, buttons, char_dict, tiles) -> str:
+        """
+        Transition on the detections of a frame
+        Returns: the new state
+        """
+        if any(button in buttons for button in LOBBY_BUTTONS):
+            # 排队时大厅按钮还在，超时后才回到大厅重新点
+            if self.state != QUEUE or self.elapsed() >= self.queue_timeout:
+                self.enter(LOBBY)
+        elif 'zhongju' in char_dict or 'queren' in char_dict:
+            self.enter(ROUND_END)
+        elif any(button in buttons for button in CALL_BUTTONS) and \
+                not any(button in buttons for button in ['lizhi', 'babei']):
+            self.enter(CALL_PROMPT)
+        elif len(tiles) % 3 == 2:
+            self.enter(OUR_TURN)
+        elif tiles:
+            self.enter(IN_GAME)
+        elif self.state not in (LOGIN, LOBBY, QUEUE):
+            # 什么都没识别到（动画、结算后的活动界面等），当作还在对局中
+            self.enter(IN_GAME)
+        return self.state
+
+
+def parse_rates(text: str) -> dict:
+    """'in_game=4,queue=0.5' -> {IN_GAME: 4.0, QUEUE: 0.5}"""
+    rates = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        state, _, rate = item.partition('=')
+        state = state.strip().lower()
+        if state not in FRAME_RATES:
+            raise ValueError(f'FRAME_RATES: unknown state {state!r}, one of: {", ".join(FRAME_RATES)}')
+        rates[state] = float(rate)
+    return rates
+
+
+class FrameGovernor:
+    def __init__(self, rates: dict = None, enabled: bool = True, settle: float = 1.0, step: float = 0.05):
+        """
+        Limit how often frames are captured and detected, per game state
+        Args:
+            rates: Frames per second by state, overriding FRAME_RATES
+            enabled: False runs every state at full speed (still measures)
+            settle: Seconds after the bot acted during which frames are not throttled,
+                    the screen is expected to change
+            step: Sleep granularity when the sleep can be cut short
+        """
+        self.rates = {**FRAME_RATES, **(rates or {})} if enabled else {}
+        self.settle = settle
+        self.step = step
+        self.frame_start = None     # (perf_counter, process_time) of the current frame
+        self.busy_wall = 0.0        # 不限速时每秒墙钟时间消耗的CPU时间，用来估算省下的CPU
+        self.busy_cpu = 0.0
+        self.slept = 0.0
+        self.cpu_saved = 0.0
+        self.frames = Counter()
+
+    def delay(self, state: str, last_action: float = 0.0) -> float:
+        """Seconds to wait before the next frame in state, last_action is a perf_counter() timestamp"""
+        now = perf_counter()
+        if self.frame_start is None:
+            return 0.0
+        self.busy_wall += now - self.frame_start[0]
+        self.busy_cpu += process_time() - self.frame_start[1]
+        rate = self.rates.get(state, 0)
+        if rate <= 0 or now - last_action < self.settle:
+            return 0.0
+        return max(0.0, self.frame_start[0] + 1 / rate - now)
+
+    def wait(self, seconds: float, sleep=sleep, wake=None) -> float:
+        """
+        Sleep up to seconds, in steps so that wake() can cut it short
+        Args:
+            sleep: Sleep function, e.g. one that lets Playwright dispatch events meanwhile
+            wake: Optional callable, True when something happened that needs a frame now
+        Returns: Seconds actually slept
+        """
+        start = perf_counter()
+        deadline = start + seconds
+        while True:
+            remaining = deadline - perf_counter()
+            if remaining <= 0 or (wake is not None and wake()):
+                break
+            sleep(min(self.step, remaining) if wake is not None else remaining)
+        return perf_counter() - start
+
+    def start(self, state: str, slept: float = 0.0):
+        """A frame of state starts now, after sleeping slept seconds"""
+        if slept > 0:
+            self.slept += slept
+            if self.busy_wall > 0:
+                self.cpu_saved += slept * self.busy_cpu / self.busy_wall
+        self.frames[state] += 1
+        self.frame_start = (perf_counter(), process_time())
+
+    def stats(self) -> dict:
+        """Sleep time, CPU time used by the loop and the CPU time the sleeps saved (estimated from
+        the CPU the process burns per second while not throttled), in seconds"""
+        return {'frames': dict(self.frames), 'slept': round(self.slept, 1), 'cpu_used': round(self.busy_cpu, 1),
+                'cpu_saved': round(self.cpu_saved, 1)}
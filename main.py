@@ -1,54 +1,152 @@
+import atexit
+import functools
+import weakref
+from concurrent.futures import BrokenExecutor
 import cv2
-import numpy as np
-from time import time, sleep
+from time import sleep, perf_counter
 import colorama
 from colorama import Fore
-import datetime
 
-from utils.click import MyClick
-from utils.window import MajsoulWindow
-from detector.detector import Detector
-from strategy.strategy import step
-from strategy.strategy import step
+from utils.click import MyClick, HandLayout
+from utils.session import SessionRecorder
+from utils.metrics import metrics
+from utils.log import get_logger, setup as setup_logging
+from utils.liqi import DISCARD, LIQI, ANGANG, JIAGANG
+from utils.window import MajsoulWindow, storage_state_path
+from utils.render import parse_clips, render_profile_from_config
+from detector.loader import DetectorLoader
+from detector.pipeline import DetectorPipeline
+from detector.backends import profile_from_config
+from detector.gate import FrameGate
+from strategy.strategy import step, helper_step
+from strategy.cache import DecisionCache
+from strategy.precompute import DrawPrecomputer
+from strategy.calls import CALL_KINDS, PASS, decide_call, decide_unseen, parse_options, yaku_tiles
+from game_state import FRAME_RATES, FrameGovernor, GameStateMachine, parse_rates, LOGIN, LOBBY, QUEUE, IN_GAME, OUR_TURN, CALL_PROMPT, ROUND_END
 from config import config
 
+log = get_logger(__name__)
+
+# 所有游戏的决策缓存，进程退出时统一保存；supervisor 重启一桌会新建游戏，不能每次都注册 atexit
+_decision_caches = weakref.WeakSet()
+
+
+@atexit.register
+def _save_decision_caches():
+    for cache in list(_decision_caches):
+        cache.save()
+
+
 class MajsoulGame:
-    def __init__(self):
+    def __init__(self, window=None, detector=None, recorder=None, cfg=None):
+        """
+        Args:
+            window, detector: Stand-ins for the browser window and the Detector (offline replay,
+                              shared Detector of the supervisor), created from the config when None
+            recorder: SessionRecorder, by default one writing to RECORD_PATH if set
+            cfg: Config of this account, the global config by default
+        """
+        self.started_at = perf_counter()
+        cfg = cfg or config
+        self.config = cfg
         # Initialize configuration from config
-        self.MAX_QUEUE_TIME = config.MAX_QUEUE_TIME
-        self.MAX_WAIT_TIME = config.MAX_WAIT_TIME
-        self.ACCOUNT = config.ACCOUNT
-        self.PASSWORD = config.PASSWORD
-        self.MATCH_RANK = config.MATCH_RANK
-        self.AUTO_CONTINUE = config.AUTO_CONTINUE
+        self.MAX_QUEUE_TIME = cfg.MAX_QUEUE_TIME
+        self.MAX_WAIT_TIME = cfg.MAX_WAIT_TIME
+        self.ACCOUNT = cfg.ACCOUNT
+        self.PASSWORD = cfg.PASSWORD
+        self.MATCH_RANK = cfg.MATCH_RANK
+        self.AUTO_CONTINUE = cfg.AUTO_CONTINUE
+        self.LOGIN_WAIT = cfg.LOGIN_WAIT
         
         colorama.init()
         print(Fore.WHITE)
+        setup_logging(cfg.LOG_LEVEL, cfg.LOG_RATE)
+        if cfg.METRICS_PORT:
+            metrics.serve(cfg.METRICS_PORT)
+        if cfg.PROFILE_SAMPLING:
+            metrics.profiler.start()
+
+        # Start loading the models first, they load while the browser starts and logs in
+        detector_kwargs = {
+            'char_backend': cfg.CHAR_BACKEND,
+            'backend': cfg.DETECTOR_BACKEND,
+            'int8': cfg.DETECTOR_INT8,
+            'tile_profile': profile_from_config(cfg, 'TILE'),
+            'ui_profile': profile_from_config(cfg, 'UI'),
+            'hand_tracker': cfg.HAND_TRACKER,
+            'tile_backend': cfg.TILE_BACKEND,
+        }
+        pipeline_mode = cfg.PIPELINE_MODE
+        if detector is None and cfg.INFERENCE_SERVER:
+            from detector.server import InferenceClient, parse_address
+            detector = InferenceClient(parse_address(cfg.INFERENCE_SERVER), cfg.INFERENCE_AUTHKEY,
+                                       hand_tracker=cfg.HAND_TRACKER)
+            atexit.register(detector.close)
+            if pipeline_mode == 'process':
+                pipeline_mode = 'thread'  # 模型都在推理服务里，不需要子进程各自加载
+        if detector is None and pipeline_mode != 'process':
+            detector = DetectorLoader(cfg.MODEL_WARMUP, **detector_kwargs)
+        self.detector = detector  # 'process' 模式下模型只在子进程里加载
 
         # Initialize Majsoul window
         try:
-            self.window = MajsoulWindow(self.ACCOUNT, self.PASSWORD)
+            self.window = window if window is not None else MajsoulWindow(
+                self.ACCOUNT, self.PASSWORD, cfg.CAPTURE_BACKEND, cfg.STATE_SOURCE, cfg.WS_RECORD_PATH,
+                storage_state_path(cfg.STORAGE_STATE_PATH, self.ACCOUNT), cfg.LOAD_TIMEOUT,
+                render_profile_from_config(cfg))
         except Exception as e:
-            print(f"Failed to start: {e}")
+            log.error("Failed to start: %s", e)
             raise
         
         # Initialize other components
-        self.click = MyClick(self.window.page)
-        self.detector = Detector()
-        self.step = step
+        if recorder is None and cfg.RECORD_PATH:
+            recorder = SessionRecorder(cfg.RECORD_PATH)
+        self.recorder = recorder
+        self.click = MyClick(self.window.page, recorder, self.started_at, self.window.scale)
+        self.layout = HandLayout()
+        self.ws_version = None
+        self.gate = FrameGate(max_skip=cfg.GATE_MAX_SKIP) if cfg.FRAME_GATE else None
+        self.state = GameStateMachine(self.MAX_QUEUE_TIME)
+        self.governor = FrameGovernor(parse_rates(cfg.FRAME_RATES), cfg.FRAME_GOVERNOR)
+        self.capture_clips = parse_clips(cfg.CAPTURE_CLIP, FRAME_RATES)
+        self.pipeline = DetectorPipeline(self.capture, self.detector, pipeline_mode,
+                                         {**detector_kwargs, 'warmup': cfg.MODEL_WARMUP}, self.gate,
+                                         self.state.detectors)
+        self.decision_cache = DecisionCache(cfg.DECISION_CACHE_SIZE, cfg.DECISION_CACHE_PATH, cfg.STRATEGY_BACKEND)
+        _decision_caches.add(self.decision_cache)
+        base_step = helper_step if cfg.STRATEGY_BACKEND == 'helper' else step
+        self.step = functools.partial(base_step, cache=self.decision_cache)
+        self.precompute = DrawPrecomputer(base_step, cfg.PRECOMPUTE_WORKERS)
+        self.CALL_STRATEGY = cfg.CALL_STRATEGY
+        self.call_budget = cfg.CALL_BUDGET_MS / 1000
+        self.pending_calls = []   # 点了鸣牌按钮后，每种可能被鸣的牌对应的 Call
 
         # Game state
-        self.waiting = False
-        self.queuing = False
-        self.wait_time = None
-        self.queue_time = None
         self.green_count = 0
+        self.session_saved = False
+
+    def capture(self):
+        """
+        Grab one frame of the game window, returns (box, image, index) or None when the window is gone
+        (index: of the frame in the recorded session, None when not recording)
+        """
+        with metrics.span('capture'):
+            box = self.window()
+            if not box:
+                return None
+            clip = self.capture_clips.get(self.state.state)
+            image = self.window.grab(clip) if clip else self.window.grab()
+        if image is None:
+            return None
+        metrics.count('frames')
+        index = self.recorder.frame(box, image) if self.recorder is not None else None
+        return box, image, index
 
     def is_green(self, image):
         # 获取图像的平均颜色值（BGR格式）
         mean_color = cv2.mean(image)[:3]
         b, g, r = mean_color
-        print(f"RGB: {r}, {g}, {b}")  # 调试信息：输出RGB值
+        log.debug("RGB: %.1f, %.1f, %.1f", r, g, b)  # 调试信息：输出RGB值
         
         # 计算各通道占比
         total = r + g + b
@@ -75,8 +173,8 @@ class MajsoulGame:
         is_g_bright_enough = g > 40  # 原阈值50过高
         
         # 输出更详细的调试信息，便于问题诊断
-        print(f"绿色主导: {is_g_dominant}, 绿-红差值: {g-r:.2f}, 绿-蓝差值: {g-b:.2f}")
-        print(f"绿色占比: {g_prop:.2f}, 绿色亮度: {g:.2f}")
+        log.debug("绿色主导: %s, 绿-红差值: %.2f, 绿-蓝差值: %.2f", is_g_dominant, g - r, g - b)
+        log.debug("绿色占比: %.2f, 绿色亮度: %.2f", g_prop, g)
         
         # 综合判断条件（所有条件必须同时满足）
         return (is_g_dominant and 
@@ -93,14 +191,12 @@ class MajsoulGame:
 
     def handle_matching(self, buttons, xyxy_buttons):
         """处理匹配状态"""
-        print(Fore.GREEN + f'[{datetime.datetime.now()}]: 匹配中' + Fore.WHITE)
-        self.waiting = False
-        if self.queuing and time() - self.queue_time < self.MAX_QUEUE_TIME:
+        log.info(Fore.GREEN + '匹配中' + Fore.WHITE)
+        if self.state.state == QUEUE:
             return True
 
         if self.click_if_exists(buttons, '3p-east', xyxy_buttons):
-            self.queuing = True
-            self.queue_time = time()
+            self.state.enter(QUEUE)
             self.green_count = 0
         elif self.click_if_exists(buttons, 'match', xyxy_buttons):
             pass
@@ -109,8 +205,14 @@ class MajsoulGame:
 
     def handle_game_end(self, char_dict, box):
         """处理终局界面"""
-        print(Fore.GREEN + f'[{datetime.datetime.now()}]: 终局界面' + Fore.WHITE)
-        self.waiting = self.queuing = False
+        log.info(Fore.GREEN + '终局界面' + Fore.WHITE)
+        self.precompute.invalidate()
+        self.pending_calls = []
+        self.pipeline.resync()
+        if self.gate is not None:
+            log.info("frame gate: %s", self.gate.stats())
+        log.info("frame governor: %s", self.governor.stats())
+        log.info("stage latency:\n%s", metrics.summary())
         
         if ('2queren' in char_dict and 'queren' in char_dict):
             self.click.click(char_dict['queren'])
@@ -124,23 +226,30 @@ class MajsoulGame:
 
     def handle_game_buttons(self, buttons, xyxy_buttons, tiles, xyxy_tiles, box):
         """处理游戏中的按钮操作"""
-        self.waiting = False
-        
         # Simple buttons
         for btn in ['zimo', 'he', 'babei']:
             if self.click_if_exists(buttons, btn, xyxy_buttons):
                 return True
 
         # Handle furo (副露)
-        if any(btn in buttons for btn in ['chi', 'peng', 'gang']) and \
+        if any(btn in buttons for btn in CALL_KINDS) and \
            not any(btn in buttons for btn in ['lizhi', 'babei']):
-            if 'tiaoguo' in buttons:
-                self.click.click(xyxy_buttons[buttons.index('tiaoguo')])
+            calls = self.plan_call(buttons, tiles)
+            button = calls[0].kind if calls else PASS
+            if button in buttons:
+                self.pending_calls = calls
+                self.click.click(xyxy_buttons[buttons.index(button)])
+            elif PASS in buttons:
+                self.click.click(xyxy_buttons[buttons.index(PASS)])
             return True
 
         # Handle tile selection
-        if len(tiles) == 14:
-            tile, button = self.step(tiles)
+        if len(tiles) % 3 == 2:
+            tile, button = self.decide_discard(tiles)
+            metrics.count('decisions')
+            if self.recorder is not None:
+                self.recorder.decision(tiles, tile, button)
+            log.debug("precompute: %s", self.precompute.stats())
             if button and button in buttons:
                 self.click.click(xyxy_buttons[buttons.index(button)])
                 sleep(0.3)
@@ -154,6 +263,91 @@ class MajsoulGame:
 
         return False
 
+    def plan_call(self, buttons, tiles) -> list:
+        """
+        Decide a call prompt within CALL_BUDGET_MS. The called tile and the melds on offer come from
+        the WebSocket when it is decoded, otherwise every tile the detected hand could call is tried
+        Returns: list of Call, one per tile that may have been offered (all of one kind), empty to pass
+        """
+        if self.CALL_STRATEGY == 'skip':
+            return []
+        kinds = [kind for kind in CALL_KINDS if kind in buttons]
+        ws_state = self.window.ws_state
+        model = ws_state.model if ws_state is not None else None
+        with metrics.span('call'):
+            if model is not None and model.call_prompt():
+                call = decide_call(model.closed(), model.last_discard, kinds, parse_options(model.operations),
+                                   self.call_budget, yaku_tiles(*model.winds()))
+                calls = [] if call.kind == PASS else [call]
+                complete, elapsed = call.complete, call.elapsed
+            else:
+                calls = decide_unseen(tiles, kinds, self.call_budget, yaku_tiles())
+                complete, elapsed = True, calls[0].elapsed if calls else 0.0
+        metrics.count('call_prompts')
+        if not complete:
+            metrics.count('call_budget_exceeded')
+            log.warning("call decision over budget (%.1f ms), not every option was compared", elapsed * 1000)
+        log.info("call %s: %s (%.2f ms)", kinds, calls or PASS, elapsed * 1000)
+        return calls
+
+    def decide_discard(self, hand):
+        """
+        (tile, button) for a hand of 3n+2 tiles: the discard planned with the call that left this
+        hand, else the precomputed or freshly computed decision
+        """
+        call = next((call for call in self.pending_calls if call.matches(hand)), None)
+        self.pending_calls = []
+        if call is not None and call.discard is not None:
+            metrics.count('call_discards')
+            return call.discard, None
+        decision = self.precompute.lookup(hand)
+        if decision:
+            return decision
+        with metrics.span('step'):
+            return self.step(hand)
+
+    def handle_websocket(self):
+        """
+        Discard straight from the hand decoded from the game's WebSocket, without a frame.
+        Returns False whenever vision has to handle the situation (buttons, calls, unknown state).
+        """
+        ws_state = self.window.ws_state
+        if ws_state is None or not self.layout.ready():
+            return False
+        model = ws_state.poll()
+        if model.version == self.ws_version or not model.discard_prompt() or len(model.hand) % 3 != 2 or \
+                not set(model.operations) <= {DISCARD, LIQI, ANGANG, JIAGANG}:
+            return False
+        hand = list(model.hand)
+        tile, button = self.decide_discard(hand)
+        if self.recorder is not None:
+            self.recorder.decision(hand, tile, button)
+        if button or tile not in hand:  # 立直、拔北要点按钮，交给视觉
+            return False
+
+        self.ws_version = model.version
+        closed = model.closed()
+        index = len(closed) if tile == model.drawn else closed.index(tile)
+        box = self.window()
+        self.click.set_top_left_corner(box)
+        for _ in range(2):  # Double click for reliability
+            self.click.click(self.layout.box(index, len(closed)))
+            sleep(0.1)
+        self.click.click((0, 0, box[2] - box[0], box[3] - box[1]), click=False)
+        metrics.observe('websocket_discard', perf_counter() - model.updated)
+        metrics.count('websocket_discards')
+        log.info("websocket discard %s: %.1f ms after the message", tile, (perf_counter() - model.updated) * 1000)
+        return True
+
+    def calibrate_layout(self, xyxy_tiles, tiles):
+        """Learn the hand layout from a vision detection that agrees with the WebSocket hand"""
+        ws_state = self.window.ws_state
+        if ws_state is None or not ws_state.model.valid or not tiles:
+            return
+        model = ws_state.model
+        if len(tiles) == len(model.hand):
+            self.layout.calibrate(xyxy_tiles, model.drawn is not None)
+
     def handle_side_buttons(self, char_dict, image):
         """处理左侧按钮"""
         if 'lhmqb' not in char_dict:
@@ -171,82 +365,148 @@ class MajsoulGame:
                 
                 cropped = image[top:bottom, left:right]
                 if not self.is_green(cropped):  # 不是按下状态
-                    print(f"not pressed.{x}")
+                    log.debug("not pressed.%d", x)
                     self.click.click((left, top, right, bottom))
                     self.green_count = 0
                 else:
                     self.green_count += 1
-        print(f"green count: {self.green_count}")
+        log.debug("green count: %d", self.green_count)
+
+    def unstick(self, frame):
+        """Click the center a few times to dismiss whatever popup is in the way"""
+        box = frame.box
+        center = (0, 0, box[2] - box[0], box[3] - box[1])
+        for _ in range(7):
+            self.click.click(center)
+            sleep(0.05)
+        self.pipeline.flush()
+
+    def session_expired(self, state) -> bool:
+        """Still on the login screen LOGIN_WAIT seconds after loading with a restored session"""
+        return state == LOGIN and self.window.session_restored and not self.window.logged_in and \
+            perf_counter() - self.window.ready_at > self.LOGIN_WAIT
+
+    def handle_session(self, state):
+        """Log in if the restored session expired, save the session once past the login screen"""
+        if self.session_expired(state):
+            log.info("saved login session expired, logging in")
+            self.window.login(self.ACCOUNT, self.PASSWORD)
+        elif state != LOGIN and not self.session_saved:
+            self.session_saved = True
+            self.window.save_session()
+
+    def govern(self):
+        """Wait as long as the frame rate of the current state asks, a WebSocket message cuts it short"""
+        delay = self.governor.delay(self.state.state, self.click.last_click)
+        slept = 0.0
+        if delay > 0:
+            ws_state = self.window.ws_state
+            since = perf_counter()
+            wake = (lambda: ws_state.received > since) if ws_state is not None else None
+            # 用Playwright的等待代替sleep，等待期间WebSocket事件照常分发
+            slept = self.governor.wait(delay, lambda seconds: self.window.page.wait_for_timeout(seconds * 1000), wake)
+            metrics.observe('governor_sleep', slept)
+        self.governor.start(self.state.state, slept)
 
     def run(self):
         """Main game loop"""
+        try:
+            # 模型在浏览器启动、登录的同时加载，加载失败直接退出而不是每一帧都报错
+            self.pipeline.wait_ready()
+            self.loop()
+        finally:
+            self.precompute.shutdown()
+            self.pipeline.shutdown()
+            if self.recorder is not None:
+                self.recorder.close()
+            del self.window
+
+    def loop(self):
+        """Handle frames until the window is gone"""
         while True:
             try:
-                # Get game window
-                box = self.window()
-                if not box:
+                # 别人的回合、排队、结算时降低截图识别的频率
+                self.govern()
+
+                # 能从WebSocket直接知道手牌时不用等截图识别
+                if self.handle_websocket():
+                    self.state.active()
+                    self.pipeline.flush()
+                    continue
+
+                # Get game screen and detect game state
+                with metrics.span('frame'):
+                    frame = self.pipeline.next_frame()
+                if frame is None:
                     break
+                box, image = frame.box, frame.image
+                if self.recorder is not None:
+                    self.recorder.detections(frame)
                 self.click.set_top_left_corner(box)
 
-                # Get game screen
-                screenshot = self.window.page.screenshot(type="jpeg", full_page=True)
-                image = cv2.imdecode(np.frombuffer(screenshot, np.uint8), cv2.IMREAD_COLOR)
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+                xyxy_tiles, tiles = frame.xyxy_tiles, frame.tiles
+                xyxy_buttons, buttons = frame.xyxy_buttons, frame.buttons
+                char_dict = frame.char_dict
 
-                # Detect game state
-                xyxy_tiles, tiles = self.detector.detect_tiles(image)
-                xyxy_buttons, buttons = self.detector.detect_frame(image)
-                char_dict = self.detector.detect_characters(image)
-
-                print(char_dict.keys())
+                log.debug("characters: %s", list(char_dict))
 
                 # Handle different game states
-                if '3p-east' in buttons or 'match' in buttons or 'silver' in buttons:
+                state = self.state.update(buttons, char_dict, tiles)
+                self.handle_session(state)
+                if self.state.stalled(buttons, self.MAX_WAIT_TIME):
+                    log.info("wait long.")
+                    self.unstick(frame)
+
+                elif state == LOBBY or state == QUEUE:
                     if self.handle_matching(buttons, xyxy_buttons):
                         continue
-                        
-                elif 'zhongju' in char_dict or 'queren' in char_dict:
+                    self.pipeline.flush()
+
+                elif state == ROUND_END:
                     self.handle_game_end(char_dict, box)
                     self.green_count = 0
-                    
-                else:  # Game in progress
-                    print(Fore.GREEN + f'[{datetime.datetime.now()}]: 游戏中' + Fore.WHITE)
-                    
+                    self.pipeline.flush()
+
+                elif state in (IN_GAME, OUR_TURN, CALL_PROMPT):
+                    log.info(Fore.GREEN + '游戏中' + Fore.WHITE)
+
                     # Handle buttons
                     self.handle_side_buttons(char_dict, image)
-                    
-                    # Save waiting state
-                    prev_waiting = self.waiting
-                    if not self.handle_game_buttons(buttons, xyxy_buttons, tiles, xyxy_tiles, box):
-                        # Restore waiting state if no button was handled
-                        self.waiting = prev_waiting
-                        
-                        if not self.waiting:
-                            print('begin wait.', self.wait_time)
-                            self.waiting = True
-                            self.wait_time = time()
-                        elif time() - self.wait_time > self.MAX_WAIT_TIME:
-                            print('wait long.', time())
-                            self.waiting = False
-                            # Click center multiple times
-                            center = (0, 0, box[2] - box[0], box[3] - box[1])
-                            for _ in range(7):
-                                self.click.click(center)
-                                sleep(0.05)
+                    self.calibrate_layout(xyxy_tiles, tiles)
+
+                    if self.handle_game_buttons(buttons, xyxy_buttons, tiles, xyxy_tiles, box):
+                        self.state.active()
+                        # 已经点击过，预先截下的那一帧作废
+                        self.pipeline.flush()
+                    else:
+                        # 别人的回合，提前算好每一种摸牌后的切牌
+                        self.precompute.update(tiles)
+
+                        if self.state.idle() > self.MAX_WAIT_TIME:
+                            log.info("wait long.")
+                            self.state.active()
+                            self.unstick(frame)
 
                 # Keep mouse in center
                 self.click.click((0, 0, box[2] - box[0], box[3] - box[1]), click=False)
 
+            except BrokenExecutor:
+                raise  # 识别子进程已经崩溃，重试也没用
             except Exception as e:
-                print(f"Error in game loop: {e}")
+                metrics.count('errors')
+                log.warning("Error in game loop: %s", e)
                 continue
 
-        # Cleanup
-        del self.window
-
 if __name__ == '__main__':
     try:
-        game = MajsoulGame()
-        game.run()
+        if config.RUNTIME == 'async':
+            import asyncio
+            from async_main import AsyncMajsoulGame
+            asyncio.run(AsyncMajsoulGame().run())
+        else:
+            game = MajsoulGame()
+            game.run()
     except Exception as e:
-        print(f"Fatal error: {e}")
+        log.error("Fatal error: %s", e)
+    finally:
+        metrics.shutdown()
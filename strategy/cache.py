@@ -0,0 +1,83 @@
+import json
+import os
+from collections import OrderedDict
+
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+
+class DecisionCache:
+    def __init__(self, max_size: int = 4096, path: str = '', backend: str = 'native'):
+        """
+        Bounded LRU cache of strategy decisions keyed by canonical hand
+        Args:
+            max_size: Maximum number of hands kept, least recently used ones are evicted first
+            path: Optional JSON snapshot file, loaded now and written by save()
+            backend: STRATEGY_BACKEND that made the decisions, stored in the snapshot; a snapshot
+                     of another backend is not loaded
+        """
+        self.max_size = max_size
+        self.path = path
+        self.backend = backend
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self.load()
+
+    @staticmethod
+    def key(counts: list) -> bytes:
+        """Canonical key of a hand: its 34-slot count vector, so any tile order maps to the same key"""
+        return bytes(counts)
+
+    def get(self, key: bytes):
+        """Return the cached decision or None, refreshing its LRU position"""
+        decision = self.entries.get(key)
+        if decision is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return decision
+
+    def put(self, key: bytes, decision) -> None:
+        self.entries[key] = decision
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def load(self) -> None:
+        """Warm the cache from the snapshot file, ignoring a missing or broken file or one of another backend"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(snapshot, dict) or snapshot.get('backend') != self.backend:
+            # 不同策略的决策不能混用（旧格式的快照没有记录策略，也不读）
+            log.info("Decision cache %s is not from the %s backend, not loaded", self.path, self.backend)
+            return
+        for key, decision in snapshot['entries'][-self.max_size:]:
+            self.entries[bytes.fromhex(key)] = tuple(decision)
+
+    def save(self) -> None:
+        """Write the cache (oldest first) to the snapshot file"""
+        if not self.path:
+            return
+        snapshot = {'backend': self.backend,
+                    'entries': [[key.hex(), list(decision)] for key, decision in self.entries.items()]}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+        log.info("Decision cache saved: %s", self.stats())
@@ -0,0 +1,259 @@
+"""
+Call (chi / peng / gang) decisions within a latency budget.
+
+A call is taken when it lowers the shanten of the hand and the open hand keeps a way to a yaku;
+the follow-up discard is chosen at the same time (choose_discard on the hand after the call, without
+the tiles swap calling forbids), so the discard can be clicked right after the meld without another
+decision.
+"""
+from time import perf_counter
+
+from strategy.shanten import CARD, IS_YAOCHU, choose_discard, shanten, tile_index, to_counts, ukeire
+
+CHI, PENG, GANG, PASS = 'chi', 'peng', 'gang', 'tiaoguo'
+CALL_KINDS = (CHI, PENG, GANG)
+DRAGONS = (31, 32, 33)  # 白发中
+WINDS = (27, 28, 29)    # 三麻只有东南西
+
+
+class Call:
+    def __init__(self, kind: str = PASS, tile: str = None, option=(), discard: str = None,
+                 shanten: int = None, ukeire: int = None, rest: bytes = None):
+        """
+        What to do on a call prompt
+        Args:
+            kind: Button to press, 'chi', 'peng', 'gang' or 'tiaoguo' to pass
+            tile: The tile called
+            option: Tiles of the hand that go into the meld
+            discard: Tile to discard right after the call, None after a gang (a replacement is drawn)
+            shanten, ukeire: Of the hand after the call (and the discard)
+            rest: Count key of the hand after the call, before the discard
+        """
+        self.kind = kind
+        self.tile = tile
+        self.option = tuple(option)
+        self.discard = discard
+        self.shanten = shanten
+        self.ukeire = ukeire
+        self.rest = rest
+        self.elapsed = 0.0      # 决策用了多少秒
+        self.complete = True    # False：预算用完，没有比较所有选项
+
+    def __repr__(self):
+        if self.kind == PASS:
+            return f'Call({PASS})'
+        return (f'Call({self.kind} {self.tile} with {"".join(self.option)}, discard {self.discard}, '
+                f'shanten {self.shanten}, ukeire {self.ukeire})')
+
+    def matches(self, hand: list) -> bool:
+        """Whether hand is the hand this call leaves, i.e. the call happened and discard applies to it"""
+        return self.rest is not None and bytes(to_counts(hand)) == self.rest
+
+
+def yaku_tiles(round_wind: int = None, seat_wind: int = None) -> tuple:
+    """
+    Tiles whose triplet is a yaku: the dragons, plus the round and seat wind when known
+    Args:
+        round_wind, seat_wind: 0 east, 1 south, 2 west
+    """
+    winds = {WINDS[w] for w in (round_wind, seat_wind) if w is not None}
+    return DRAGONS + tuple(sorted(winds))
+
+
+def call_options(hand: list, tile: str, kinds) -> dict:
+    """
+    Every way the hand can call tile
+    Args:
+        hand: Closed hand, tiles like '1p' ('0p' is red 5p)
+        kinds: Call buttons shown
+    Returns: dict kind -> list of tuples of hand tiles going into the meld
+    """
+    index = tile_index(tile)
+    by_index = {}
+    for held in sorted(hand, key=lambda t: t[0] == '0'):  # 普通5优先放进副露，赤宝牌留在手里
+        by_index.setdefault(tile_index(held), []).append(held)
+    same = by_index.get(index, [])
+    options = {}
+    if PENG in kinds and len(same) >= 2:
+        options[PENG] = [tuple(same[:2])]
+    if GANG in kinds and len(same) >= 3:
+        options[GANG] = [tuple(same[:3])]
+    if CHI in kinds and index < 27:
+        number = index % 9
+        chis = []
+        for a, b in ((-2, -1), (-1, 1), (1, 2)):
+            if 0 <= number + a and number + b < 9 and by_index.get(index + a) and by_index.get(index + b):
+                chis.append((by_index[index + a][0], by_index[index + b][0]))
+        if chis:
+            options[CHI] = chis
+    return options
+
+
+def parse_options(operations: dict) -> dict:
+    """
+    Call options of the game's OptionalOperation list (combinations like '1s|1s')
+    Args:
+        operations: GameModel.operations
+    """
+    from utils.liqi import CHI as OP_CHI, PENG as OP_PENG, MINGGANG as OP_MINGGANG
+    options = {}
+    for kind, operation in ((CHI, OP_CHI), (PENG, OP_PENG), (GANG, OP_MINGGANG)):
+        if operation in operations:
+            options[kind] = [tuple(combination.split('|')) for combination in operations[operation] if combination]
+    return options
+
+
+def _yaku_path(rest: list, meld: list, kind: str, called: int, yaku: tuple, opened: bool) -> bool:
+    """
+    Whether the hand still has an obvious yaku once open: a yakuhai triplet (called or a pair of one
+    in hand), all simples, or a single suit; an already open hand is trusted to have one
+    """
+    if opened:
+        return True
+    if kind != CHI and called in yaku:
+        return True
+    if any(rest[i] >= 2 for i in yaku):
+        return True
+    tiles = [i for i in range(34) if rest[i]] + meld
+    if not any(IS_YAOCHU[i] for i in tiles):  # 断幺
+        return True
+    return len({i // 9 for i in tiles if i < 27}) <= 1  # 混一色/清一色
+
+
+def _hand_tile(hand: list, index: int) -> str:
+    """The string of tile index in hand, a normal five before a red one"""
+    return min((tile for tile in hand if tile_index(tile) == index), key=lambda x: x[0] == '0')
+
+
+def swap_tiles(kind: str, called: int, option) -> tuple:
+    """
+    Tile indices the client does not let us discard right after the call (swap calling, 食替):
+    the called tile, and after a chi on the end of a run also the tile on the other side of it
+    Args:
+        option: Tile indices of the hand that went into the meld
+    """
+    if kind != CHI:
+        return (called,)
+    low, high = min(option), max(option)
+    if called < low and called % 9 + 3 <= 8:
+        return called, called + 3
+    if called > high and called % 9 >= 3:
+        return called, called - 3
+    return (called,)
+
+
+def _evaluate(hand: list, counts: list, kind: str, tile: str, option: tuple, yaku: tuple, opened: bool):
+    """Call of tile with option, None when the option does not fit the hand or leaves no yaku"""
+    rest_hand = list(hand)
+    for used in option:
+        if used not in rest_hand:
+            return None
+        rest_hand.remove(used)
+    rest = list(counts)
+    for used in option:
+        rest[tile_index(used)] -= 1
+    called = tile_index(tile)
+    meld = [tile_index(used) for used in option] + [called]
+    if not _yaku_path(rest, meld, kind, called, yaku, opened):
+        return None
+    if kind == GANG:  # 大明杠后摸岭上牌，这时还不切牌
+        return Call(kind, tile, option, None, shanten(rest), ukeire(rest), bytes(rest))
+    forbidden = swap_tiles(kind, called, meld[:-1])
+    if all(i in forbidden for i in range(34) if rest[i]):
+        return None  # 鸣牌后没有能打的牌，客户端不允许这样鸣
+    index, s, u = choose_discard(rest, forbidden)
+    return Call(kind, tile, option, _hand_tile(rest_hand, index), s, u, bytes(rest))
+
+
+def _decide(hand: list, tile: str, options: dict, deadline: float, yaku: tuple, opened: bool) -> Call:
+    counts = to_counts(hand)
+    base_shanten = shanten(counts)
+    base_ukeire = None
+    best = Call()
+    for kind in (PENG, CHI, GANG):  # 碰/吃在前，预算不够时先放弃大明杠
+        for option in options.get(kind, []):
+            if perf_counter() > deadline:
+                best.complete = False
+                return best
+            call = _evaluate(hand, counts, kind, tile, option, yaku, opened)
+            if call is None:
+                continue
+            if kind == GANG:
+                # 杠不改变向听，只在进张不减少时才杠（多一张宝牌指示牌）
+                if base_ukeire is None:
+                    base_ukeire = ukeire(counts)
+                if call.shanten > base_shanten or call.ukeire < base_ukeire:
+                    continue
+            elif call.shanten >= base_shanten:
+                continue
+            if best.kind == PASS or (call.shanten, -call.ukeire) < (best.shanten, -best.ukeire):
+                best = call
+    return best
+
+
+def decide_call(hand: list, tile: str, kinds, options: dict = None, budget: float = 0.005,
+                yaku: tuple = DRAGONS, opened: bool = None) -> Call:
+    """
+    Best call of tile, or pass
+    Args:
+        hand: Closed hand (13, 10, ... tiles) like '1p' ('0p' is red 5p)
+        tile: The tile offered
+        kinds: Call buttons shown ('chi', 'peng', 'gang')
+        options: kind -> hand tiles of every meld offered by the game, derived from the hand if None
+        budget: Seconds after which the options not compared yet are dropped
+        yaku: Tile indices whose triplet is a yaku, see yaku_tiles
+        opened: Whether the hand already has an open meld, guessed from its size if None
+    Returns: Call
+    """
+    start = perf_counter()
+    if opened is None:
+        opened = len(hand) < 13
+    if options is None:
+        options = call_options(hand, tile, kinds)
+    call = _decide(hand, tile, options, start + budget, yaku, opened)
+    call.elapsed = perf_counter() - start
+    return call
+
+
+def decide_unseen(hand: list, kinds, budget: float = 0.005, yaku: tuple = DRAGONS, opened: bool = None) -> list:
+    """
+    Call decision when the offered tile is not known (vision only): every tile the hand could call
+    with the buttons shown is evaluated, and the call is taken only if it is right for all of them
+    Returns: list of Call, one per possible tile, all of one kind; empty to pass
+    """
+    start = perf_counter()
+    deadline = start + budget
+    if opened is None:
+        opened = len(hand) < 13
+    counts = to_counts(hand)
+    need = 3 if GANG in kinds else 2  # 能大明杠说明手里有三张
+    candidates = [CARD[i] for i in range(34) if counts[i] >= need]
+    if not candidates or CHI in kinds:  # 吃的牌无从推断
+        return []
+    calls = []
+    for tile in candidates:
+        call = _decide(hand, tile, call_options(hand, tile, kinds), deadline, yaku, opened)
+        if call.kind == PASS or (calls and call.kind != calls[0].kind):
+            return []
+        calls.append(call)
+    elapsed = perf_counter() - start
+    for call in calls:
+        call.elapsed = elapsed
+    return calls
+
+
+if __name__ == '__main__':
+    import random
+    import time
+    hand = ['1m', '9m', '2p', '3p', '6p', '6p', '7p', '4s', '5s', '7z', '7z', '1z', '9s']
+    print(hand, 'offered 7z:', decide_call(hand, '7z', (PENG,)))
+    wall = [CARD[i] for i in range(34) if not 1 <= i <= 7 and i != 30] * 4
+    latencies = []
+    for _ in range(1000):
+        tiles = random.sample(wall, 14)
+        hand, tile = tiles[:13], tiles[13]
+        start = time.perf_counter()
+        decide_call(hand, tile, (PENG, GANG), budget=1)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print('p50 %.3f ms, p99 %.3f ms / call decision' % (latencies[500] * 1000, latencies[990] * 1000))
@@ -0,0 +1,109 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from strategy.shanten import CARD, SANMA_TILES, to_counts, tile_index
+
+
+def _lower_priority():
+    """Worker initializer: precomputation is speculative, the game loop goes first"""
+    if hasattr(os, 'nice'):
+        os.nice(10)
+
+
+class DrawPrecomputer:
+    def __init__(self, step, workers: int = 2, stable_frames: int = 2):
+        """
+        Evaluate step() for every possible draw while waiting with 13 tiles. The evaluations are
+        pure-Python and CPU bound, so they run in worker processes: threads would hold the GIL
+        against the capture / detection loop instead of using idle cores
+        Args:
+            step: Uncached strategy function, hand (14 tiles) -> (tile, action); must be picklable
+                  (a module-level function)
+            workers: Number of worker processes, 0 disables precomputation
+            stable_frames: How many identical detections before the hand counts as stable
+        """
+        self.step = step
+        self.stable_frames = stable_frames
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority) if workers else None
+        self.lock = threading.Lock()
+        self.base_key = None  # 当前13张手牌
+        self.seen_count = 0
+        self.generation = 0   # 手牌变化时递增，丢弃过期的结果
+        self.futures = []
+        self.table = {}       # 14张手牌的计数向量 -> (tile, action)
+        self.hits = 0
+        self.misses = 0
+
+    def update(self, hand: list) -> None:
+        """
+        Feed the hand detected while waiting; starts precomputation once it is stable
+        :param hand: list (length=13) of tiles (str like '1p', '2z')
+        """
+        if self.pool is None or len(hand) != 13:
+            return
+        counts = to_counts(hand)
+        key = bytes(counts)
+        if key != self.base_key:
+            self.invalidate()
+            self.base_key = key
+        self.seen_count += 1
+        if self.seen_count != self.stable_frames:
+            return
+        generation = self.generation
+        for i in SANMA_TILES:
+            if counts[i] < 4:
+                drawn = hand + [CARD[i]]
+                future = self.pool.submit(self.step, drawn)
+                future.add_done_callback(lambda f, drawn=drawn: self._store(generation, drawn, f))
+                self.futures.append(future)
+
+    def _store(self, generation: int, hand: list, future) -> None:
+        """Done callback (runs in the pool's management thread)"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self.lock:
+            if generation == self.generation:
+                self.table[bytes(to_counts(hand))] = future.result()
+
+    def invalidate(self) -> None:
+        """Drop the table and pending work, e.g. when the 13-tile hand changed"""
+        with self.lock:
+            self.generation += 1
+            self.table = {}
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+        self.base_key = None
+        self.seen_count = 0
+
+    def lookup(self, hand: list):
+        """
+        :param hand: list (length=14) of tiles (str like '1p', '2z')
+        :return: (tile, action) if precomputed, else None
+        """
+        if self.pool is None:
+            return None
+        with self.lock:
+            decision = self.table.get(bytes(to_counts(hand)))
+        if decision is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        tile, action = decision
+        if tile is not None and tile not in hand:  # 赤宝牌与普通5在计数向量里是同一格
+            tile = next(t for t in hand if tile_index(t) == tile_index(tile))
+        return tile, action
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.invalidate()
+            self.pool.shutdown(wait=False)
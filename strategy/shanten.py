@@ -0,0 +1,317 @@
+"""
+Native sanma (three-player) shanten / ukeire engine.
+
+A hand is a compact 34-slot count array (index = suit * 9 + number - 1, suits in
+'mpsz' order). Every suit is looked up in a table that stores, for each
+mentsu count and head flag, the best taatsu count of that suit. The tables are
+filled recursively (every sub-configuration is cached as well), so after a few
+hands nearly every lookup is a single dict hit, and evaluating a discard or a
+draw only re-reads the suit it touches.
+"""
+
+CARD = [str(i % 9 + 1) + str(['m', 'p', 's', 'z'][i // 9]) for i in range(34)]
+CARD_VALUE = [int(i < 27) * (5 - abs(i % 9 + 1 - 5)) for i in range(34)]  # 中张价值高，字牌/幺九低
+SANMA_TILES = [i for i in range(34) if not 1 <= i <= 7]  # 三麻没有2m-8m
+YAOCHU = [0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33]
+IS_YAOCHU = [i in YAOCHU for i in range(34)]
+SUIT_SLICES = [(0, 9), (9, 18), (18, 27), (27, 34)]
+
+_NEG = -100
+_EMPTY = (0,) + (_NEG,) * 9
+_SUIT_TABLE = {}   # tuple(9 counts) -> (entry, options)
+_HONOR_TABLE = {}  # tuple(7 counts) -> (entry, options)
+
+
+def tile_index(tile: str) -> int:
+    """
+    Slot of a tile string in the 34-slot count array
+    :param tile: str like '1p', '2z' ('0p' is treated as red 5p)
+    :return: int in [0, 34)
+    """
+    return 'mpsz'.index(tile[1]) * 9 + (int(tile[0]) or 5) - 1
+
+
+def to_counts(hand: list) -> list:
+    """
+    :param hand: list of tiles (str like '1p', '2z')
+    :return: list (length=34) of tile counts
+    """
+    counts = [0] * 34
+    for tile in hand:
+        counts[tile_index(tile)] += 1
+    return counts
+
+
+def _shift(entry, dm, dt, dh):
+    """Put one more block (dm mentsu, dt taatsu, dh head) on top of every option of entry"""
+    out = [_NEG] * 10
+    for h in range(2 - dh):
+        for m in range(5 - dm):
+            t = entry[h * 5 + m]
+            if t >= 0:
+                out[(h + dh) * 5 + m + dm] = t + dt
+    return out
+
+
+def _suit_entry(key: tuple, honor: bool):
+    """
+    Lookup table entry of one suit
+    :param key: tuple of counts in the suit (9 for m/p/s, 7 for z)
+    :param honor: honors form no sequences
+    :return: (entry, options)
+             entry: tuple (length=10), [h * 5 + m] = max taatsu with m mentsu and h (0/1) head
+             options: the same table in sparse form, see _options
+    """
+    table = _HONOR_TABLE if honor else _SUIT_TABLE
+    found = table.get(key)
+    if found is not None:
+        return found
+    i = 0
+    while i < len(key) and not key[i]:
+        i += 1
+    if i == len(key):
+        found = table[key] = (_EMPTY, _options(_EMPTY))
+        return found
+
+    c = list(key)
+    options = []
+
+    def remove(tiles, dm, dt, dh):
+        for j in tiles:
+            c[j] -= 1
+        options.append(_shift(_suit_entry(tuple(c), honor)[0], dm, dt, dh))
+        for j in tiles:
+            c[j] += 1
+
+    if c[i] >= 3:  # 刻子
+        remove((i, i, i), 1, 0, 0)
+    if not honor and i < 7 and c[i + 1] and c[i + 2]:  # 顺子
+        remove((i, i + 1, i + 2), 1, 0, 0)
+    if c[i] >= 2:  # 雀头 / 对子搭子
+        remove((i, i), 0, 0, 1)
+        remove((i, i), 0, 1, 0)
+    if not honor:
+        if i < 8 and c[i + 1]:  # 两面 / 边张
+            remove((i, i + 1), 0, 1, 0)
+        if i < 7 and c[i + 2]:  # 嵌张
+            remove((i, i + 2), 0, 1, 0)
+    remove((i,), 0, 0, 0)  # 孤张
+    entry = tuple(map(max, *options)) if len(options) > 1 else tuple(options[0])
+    found = table[key] = (entry, _options(entry))
+    return found
+
+
+def _merge(a, b):
+    """Max-plus convolution of two entries (at most one head in total)"""
+    c = [_NEG] * 10
+    for i in range(5):
+        x0, x1 = a[i], a[5 + i]
+        if x0 < 0 and x1 < 0:
+            continue
+        for j in range(5 - i):
+            y0, y1 = b[j], b[5 + j]
+            k = i + j
+            if x0 >= 0:
+                if y0 >= 0 and x0 + y0 > c[k]:
+                    c[k] = x0 + y0
+                if y1 >= 0 and x0 + y1 > c[5 + k]:
+                    c[5 + k] = x0 + y1
+            if x1 >= 0 and y0 >= 0 and x1 + y0 > c[5 + k]:
+                c[5 + k] = x1 + y0
+    return c
+
+
+def _options(entry) -> tuple:
+    """
+    Sparse form of an entry: (m, t, h) triples, dropping options that can never be better
+    ((m', t') beats (m, t) with the same head when m' >= m and m' + t' >= m + t)
+    """
+    options = []
+    for h in (0, 1):
+        top = -1
+        for m in range(4, -1, -1):
+            t = entry[h * 5 + m]
+            if t >= 0 and m + t > top:
+                options.append((m, t, h))
+                top = m + t
+    return tuple(options)
+
+
+def _merged_shanten(a, b, n_sets: int) -> int:
+    """Regular shanten of the hand made of option sets a and b, without building the merged entry"""
+    best = 8
+    for m1, t1, h1 in a:
+        for m2, t2, h2 in b:
+            if h1 and h2:
+                continue
+            left = n_sets - m1 - m2  # 还差几组面子
+            t = t1 + t2
+            s = 2 * left - (t if t < left else left) - h1 - h2
+            if s < best:
+                best = s
+    return best
+
+
+def _entries(counts: list) -> list:
+    return [_suit_entry(tuple(counts[lo:hi]), lo == 27)[0] for lo, hi in SUIT_SLICES]
+
+
+def regular_shanten(counts: list) -> int:
+    """Shanten of the standard n-mentsu-1-head form (n = tiles // 3)"""
+    e = _entries(counts)
+    return _merged_shanten(_options(_merge(e[0], e[1])), _options(_merge(e[2], e[3])), sum(counts) // 3)
+
+
+def chiitoi_shanten(counts: list) -> int:
+    pairs = kinds = 0
+    for c in counts:
+        if c:
+            kinds += 1
+            if c >= 2:
+                pairs += 1
+    return 6 - pairs + max(0, 7 - kinds)
+
+
+def kokushi_shanten(counts: list) -> int:
+    kinds = pair = 0
+    for i in YAOCHU:
+        if counts[i]:
+            kinds += 1
+            if counts[i] >= 2:
+                pair = 1
+    return 13 - kinds - pair
+
+
+def shanten(counts: list) -> int:
+    """
+    :param counts: list (length=34) of tile counts
+    :return: int, -1 means a complete hand, 0 means tenpai
+    """
+    s = regular_shanten(counts)
+    if sum(counts) >= 13:  # 七对/国士只在门清时成立
+        s = min(s, chiitoi_shanten(counts), kokushi_shanten(counts))
+    return s
+
+
+def _ukeire(counts: list, rest: list, n_sets: int, base: int, seen: list) -> int:
+    """
+    :param counts: hand waiting for a draw, restored on return
+    :param rest: rest[s] = options of every suit but s merged together
+    :param n_sets: mentsu needed by the hand
+    :param base: shanten of counts
+    :param seen: counts used for "tiles left in the wall"
+    :return: int
+    """
+    closed = n_sets == 4
+    if closed:
+        pairs = kinds = y_kinds = y_pair = 0
+        for i in range(34):
+            c = counts[i]
+            if c:
+                kinds += 1
+                pairs += c >= 2
+                if IS_YAOCHU[i]:
+                    y_kinds += 1
+                    y_pair |= c >= 2
+    total = 0
+    for j in SANMA_TILES:
+        left = 4 - seen[j]
+        if left <= 0:
+            continue
+        c = counts[j]
+        if closed:  # 七对/国士的进张直接增量计算
+            if 6 - pairs - (c == 1) + max(0, 7 - kinds - (c == 0)) < base:
+                total += left
+                continue
+            if IS_YAOCHU[j] and 13 - y_kinds - (c == 0) - (y_pair or c == 1) < base:
+                total += left
+                continue
+        suit = j // 9
+        lo, hi = SUIT_SLICES[suit]
+        if suit < 3:  # 数牌只有和手牌相距2以内才可能改善一般形
+            if not any(counts[max(lo, j - 2):min(hi, j + 3)]):
+                continue
+        elif not c:
+            continue
+        counts[j] = c + 1
+        options = _suit_entry(tuple(counts[lo:hi]), suit == 3)[1]
+        counts[j] = c
+        if _merged_shanten(rest[suit], options, n_sets) < base:
+            total += left
+    return total
+
+
+def _rest_entries(e: list) -> list:
+    """rest[s] = entry of every suit but s merged together"""
+    e01, e23 = _merge(e[0], e[1]), _merge(e[2], e[3])
+    return [_merge(e[1], e23), _merge(e[0], e23), _merge(e01, e[3]), _merge(e01, e[2])]
+
+
+def ukeire(counts: list, seen: list = None) -> int:
+    """
+    Number of tiles left in the wall that lower the shanten of a hand waiting for a draw
+    :param counts: list (length=34) of tile counts
+    :param seen: counts used for "tiles left in the wall" (e.g. the 14-tile hand before discarding)
+    :return: int
+    """
+    counts = list(counts)
+    rest = [_options(e) for e in _rest_entries(_entries(counts))]
+    return _ukeire(counts, rest, sum(counts) // 3, shanten(counts), seen or counts)
+
+
+def choose_discard(counts: list, exclude=()):
+    """
+    Pick the discard which minimizes shanten, then maximizes ukeire, then throws the least valuable tile
+    :param counts: list (length=34) of tile counts, a hand right after drawing (14 tiles when closed)
+    :param exclude: tile indices that may not be discarded (e.g. swap calling right after a call),
+                    at least one tile of the hand must be allowed
+    :return: (int, int, int) = (tile index, shanten after discard, ukeire after discard)
+    """
+    counts = list(counts)
+    seen = list(counts)
+    n_sets = sum(counts) // 3
+    entries = _entries(counts)
+    rest = _rest_entries(entries)
+    rest_options = [_options(e) for e in rest]
+    pair_rest = {}  # 除去某两门以外的合并结果
+    for a in range(4):
+        for b in range(a + 1, 4):
+            x, y = [entries[s] for s in range(4) if s != a and s != b]
+            pair_rest[a, b] = pair_rest[b, a] = _merge(x, y)
+
+    best = None
+    for i in range(34):
+        if not counts[i] or i in exclude:
+            continue
+        suit = i // 9
+        lo, hi = SUIT_SLICES[suit]
+        counts[i] -= 1
+        entry, options = _suit_entry(tuple(counts[lo:hi]), suit == 3)
+        s = _merged_shanten(rest_options[suit], options, n_sets)
+        if n_sets == 4 and s > 0:
+            s = min(s, chiitoi_shanten(counts), kokushi_shanten(counts))
+        if best is None or s <= best[1]:
+            # 只有打出的那一门变了，其余各门的合并结果直接复用
+            sub_rest = [rest_options[k] if k == suit else _options(_merge(pair_rest[k, suit], entry))
+                        for k in range(4)]
+            u = _ukeire(counts, sub_rest, n_sets, s, seen)
+            if best is None or (s, -u, CARD_VALUE[i]) < best[1:]:
+                best = (i, s, -u, CARD_VALUE[i])
+        counts[i] += 1
+    return best[0], best[1], -best[2]
+
+
+if __name__ == '__main__':
+    import random
+    import time
+    hand = ['2p', '2p', '6p', '8p', '4s', '4s', '5s', '5s', '6s', '6s', '7s', '7s', '8s', '9s']
+    tile, s, u = choose_discard(to_counts(hand))
+    print(hand, 'discard %s, shanten = %d, ukeire = %d' % (CARD[tile], s, u))
+    wall = [CARD[i] for i in SANMA_TILES if i != 30] * 4
+    hands = [to_counts(random.sample(wall, 14)) for _ in range(1000)]
+    for hand in hands:  # 预热查找表
+        choose_discard(hand)
+    start = time.perf_counter()
+    for hand in hands:
+        choose_discard(hand)
+    print('%.3f ms / decision' % ((time.perf_counter() - start) / len(hands) * 1000))
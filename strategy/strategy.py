@@ -2,6 +2,9 @@ import subprocess
 import copy
 import os
 
+from strategy.cache import DecisionCache
+from strategy.shanten import choose_discard, to_counts, tile_index
+
 
 TRANSLATOR = {'东': '1z', '南': '2z', '西': '3z', '北': '4z', '白': '5z', '发': '6z', '中': '7z',
               '索': 's', '万': 'm', '饼': 'p'}
@@ -11,18 +14,12 @@ def sort_hand(hand: list):
     return copy.deepcopy(sorted(hand, key=lambda x: ord(x[1]) * 10 + int(x[0])))
 
 
-def step(hand: list):
-    """
-    Discard a tile which maximizes the number of tiles which can form a new set
-    :param log: log or not
-    :param hand: list (length=14) of tiles (str like '1p', '2z')
-    :return: tile: str (str like '1p', '2z') indicating which to discard
-             action: str ('lizhi', 'babei', ...)
-    """
-    if len(hand) != 14:
-        return hand[0], None
-    if '4z' in hand:
-        return None, 'babei'
+def _native_decide(hand: list, counts: list):
+    index, shanten, _ = choose_discard(counts)
+    return index, ('lizhi' if shanten == 0 and len(hand) == 14 else None)  # 副露后不能立直
+
+
+def _helper_decide(hand: list, counts: list):
     str_hand = ''.join(hand)
     # Author : https://github.com/EndlessCheng
     # Project: https://github.com/EndlessCheng/mahjong-helper
@@ -36,16 +33,49 @@ def step(hand: list):
     result = result.replace('切牌', '')  # 可能出现的提示
     best_tile = (result[result.index('切'):])[1:3]
     best_tile = ('' if best_tile[0] == ' ' else best_tile[0]) + (TRANSLATOR[best_tile[1]])
-    return best_tile, ('lizhi' if tenpai else None)
+    return tile_index(best_tile), ('lizhi' if tenpai else None)
+
+
+def _step(hand: list, decide, cache=None):
+    if len(hand) % 3 != 2:
+        return hand[0], None
+    if '4z' in hand:
+        return None, 'babei'
+    counts = to_counts(hand)
+    key = DecisionCache.key(counts) if cache is not None else None
+    decision = cache.get(key) if cache is not None else None
+    if decision is None:
+        decision = decide(hand, counts)
+        if cache is not None:
+            cache.put(key, decision)
+    index, action = decision
+    # 返回手牌里原本的字符串（赤宝牌'0p'等），方便上层用 tiles.index 定位
+    candidates = [tile for tile in hand if tile_index(tile) == index]
+    best_tile = min(candidates, key=lambda x: x[0] == '0')
+    return best_tile, action
+
+
+def step(hand: list, cache: DecisionCache = None):
+    """
+    Discard a tile which minimizes shanten and then maximizes ukeire (native engine, see shanten.py)
+    :param hand: list (length=14, or 11, 8... after calls) of tiles (str like '1p', '2z')
+    :param cache: optional DecisionCache shared between calls
+    :return: tile: str (str like '1p', '2z') indicating which to discard
+             action: str ('lizhi', 'babei', ...)
+    """
+    return _step(hand, _native_decide, cache)
+
+
+def helper_step(hand: list, cache: DecisionCache = None):
+    """
+    Same as step, but asks mahjong-helper.exe (Windows only, one subprocess per call)
+    :param hand: list (length=14, or 11, 8... after calls) of tiles (str like '1p', '2z')
+    :param cache: optional DecisionCache shared between calls
+    :return: tile: str (str like '1p', '2z') indicating which to discard
+             action: str ('lizhi', 'babei', ...)
+    """
+    return _step(hand, _helper_decide, cache)
 
 
 if __name__ == '__main__':
-    import random
-    CARD = [str(i % 9 + 1) + str(['m', 'p', 's', 'z'][i // 9]) for i in range(34)]
-    step(['2p', '2p', '6p', '8p', '4s', '4s', '5s', '5s', '6s', '6s', '7s', '7s', '8s', '9s'])
-    # for i in range(10):
-    #     hand = []
-    #     for j in range(14):
-    #         hand.append(CARD[random.randint(0, 10)])
-    #     print(sort_hand(hand))
-    #     print(step(hand))
+    print(step(['2p', '2p', '6p', '8p', '4s', '4s', '5s', '5s', '6s', '6s', '7s', '7s', '8s', '9s']))
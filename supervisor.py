@@ -0,0 +1,250 @@
+"""
+Run several accounts ("tables") in one process: one browser with a context per account,
+one set of models shared by every table.
+
+    python supervisor.py accounts.json
+
+accounts.json is a list of per-account settings, merged over the environment / .env:
+
+    [{"MAJSOUL_ACCOUNT": "a@example.com", "MAJSOUL_PASSWORD": "...", "MATCH_RANK": "silver"},
+     {"MAJSOUL_ACCOUNT": "b@example.com", "MAJSOUL_PASSWORD": "..."}]
+
+Every table runs the async game loop (async_main.py). Frames of all tables are detected by a
+shared InferenceScheduler, tables that have to act (our turn, call prompt) first, the others
+round robin. A crashed table is restarted with back-off without touching the others; if the
+browser itself dies it is relaunched.
+"""
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+# 账号密码来自 accounts.json，全局配置里可以不填
+os.environ.setdefault('MAJSOUL_ACCOUNT', 'supervisor')
+os.environ.setdefault('MAJSOUL_PASSWORD', 'supervisor')
+
+from config import Config, config
+from detector.backends import profile_from_config
+from detector.loader import DetectorLoader
+from detector.tracker import HandTracker
+from game_state import OUR_TURN, CALL_PROMPT
+from utils.async_window import AsyncMajsoulWindow, launch_browser
+from utils.window import storage_state_path
+from utils.render import render_profile_from_config
+from utils.log import get_logger, setup as setup_logging
+from utils.metrics import metrics
+
+log = get_logger(__name__)
+
+URGENT_STATES = (OUR_TURN, CALL_PROMPT)
+
+
+class TableDetector:
+    def __init__(self, detector, hand_tracker: bool = False):
+        """
+        One table's view of the shared Detector: the models are shared, per-table state
+        (the tracked hand) is not
+        """
+        self.detector = detector
+        self.hand_tracker = HandTracker() if hand_tracker else None
+
+    def resync(self):
+        if self.hand_tracker is not None:
+            self.hand_tracker.resync()
+
+    def wait_ready(self, timeout: float = None) -> None:
+        """Wait for the shared models if they are still loading (DetectorLoader)"""
+        if isinstance(self.detector, DetectorLoader):
+            self.detector.wait_ready(timeout)
+
+    def detect_tiles(self, image=None):
+        if self.hand_tracker is not None:
+            return self.hand_tracker.track(image, self.detector._detect_tiles)
+        return self.detector._detect_tiles(image)
+
+    def detect_frame(self, image=None):
+        return self.detector.detect_frame(image)
+
+    def detect_characters(self, image=None):
+        return self.detector.detect_characters(image)
+
+
+class InferenceScheduler:
+    def __init__(self, workers: int = 1):
+        """
+        Detect the frames of every table on `workers` threads, one frame per table in flight
+        Args:
+            workers: Concurrent detections, 1 keeps the shared models single-threaded
+        """
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+        self.waiting = {}     # game -> (enqueued_at, future, box, image, index)
+        self.wakeup = None
+        self.tasks = []
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def detect(self, game, box, image, index: int = None):
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[game] = (perf_counter(), future, box, image, index)
+        self.wakeup.set()
+        return await future
+
+    def _next(self):
+        """Tables that have to act first, then the one waiting longest"""
+        game = min(self.waiting, key=lambda g: (g.state.state not in URGENT_STATES, self.waiting[g][0]))
+        return game, self.waiting.pop(game)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.waiting:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            game, (enqueued_at, future, box, image, index) = self._next()
+            metrics.observe('inference_queue', perf_counter() - enqueued_at)
+            try:
+                frame = await loop.run_in_executor(self.executor, game.pipeline.detect, box, image, index)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(frame)
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.executor.shutdown(wait=False)
+
+
+def table_configs(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        accounts = json.load(f)
+    configs = [Config({**os.environ, **{k: str(v) for k, v in account.items()}}) for account in accounts]
+    for cfg in configs:
+        if cfg.PIPELINE_MODE == 'process':
+            cfg.PIPELINE_MODE = 'off'  # 子进程会各自加载模型，多桌时模型只在本进程里共享
+    return configs
+
+
+class Supervisor:
+    def __init__(self, configs, detector=None, workers: int = 1, max_backoff: float = 300,
+                 game_factory=None, launch=None):
+        """
+        Args:
+            configs: One Config per table
+            detector: Shared Detector, an InferenceClient if INFERENCE_SERVER is set, built from the
+                      global config when None
+            workers: Inference threads shared by all tables
+            max_backoff: Longest wait in seconds before restarting a crashed table
+            game_factory: (cfg, window, detector, inference) -> game, AsyncMajsoulGame by default
+            launch: Coroutine function returning (playwright, browser), by default the shared browser is
+                    launched with the RENDER_PROFILE of the global config
+        """
+        if detector is None and config.INFERENCE_SERVER:
+            from detector.server import InferenceClient, parse_address
+            detector = InferenceClient(parse_address(config.INFERENCE_SERVER), config.INFERENCE_AUTHKEY,
+                                       slots=max(4, len(configs)))
+        if detector is None:
+            # 浏览器启动、登录的同时在后台加载模型
+            detector = DetectorLoader(config.MODEL_WARMUP, char_backend=config.CHAR_BACKEND,
+                                      backend=config.DETECTOR_BACKEND, int8=config.DETECTOR_INT8,
+                                      tile_profile=profile_from_config(config, 'TILE'),
+                                      ui_profile=profile_from_config(config, 'UI'), tile_backend=config.TILE_BACKEND)
+        if game_factory is None:
+            from async_main import AsyncMajsoulGame
+
+            def game_factory(cfg, window, table_detector, inference):
+                return AsyncMajsoulGame(window, table_detector, cfg=cfg, inference=inference)
+        self.configs = configs
+        self.detector = detector
+        self.scheduler = InferenceScheduler(workers)
+        self.max_backoff = max_backoff
+        self.game_factory = game_factory
+        self.launch = launch or (lambda: launch_browser(render=render_profile_from_config(config)))
+        self.pw = self.browser = None
+        self.browser_lock = None
+        self.restarts = [0] * len(configs)
+        self.games = [None] * len(configs)
+
+    async def _browser(self):
+        """The shared browser, relaunched if it died"""
+        async with self.browser_lock:
+            if self.browser is None or not self.browser.is_connected():
+                if self.pw is not None:
+                    try:
+                        await self.pw.stop()
+                    except Exception as e:
+                        log.warning("Error stopping playwright: %s", e)
+                self.pw, self.browser = await self.launch()
+                log.info("browser launched")
+            return self.browser
+
+    async def table(self, index: int):
+        """Run one table forever, restarting it after a crash"""
+        cfg = self.configs[index]
+        backoff = 5.0
+        while True:
+            started = perf_counter()
+            try:
+                browser = await self._browser()
+                window = AsyncMajsoulWindow(cfg.CAPTURE_BACKEND, browser,
+                                            storage_state_path(cfg.STORAGE_STATE_PATH, cfg.ACCOUNT), cfg.LOAD_TIMEOUT,
+                                            render_profile_from_config(cfg))
+                game = self.game_factory(cfg, window, TableDetector(self.detector, cfg.HAND_TRACKER), self.scheduler)
+                self.games[index] = game
+                await game.run()
+                log.info("table %d (%s) stopped", index, cfg.ACCOUNT)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.count('table_crashes')
+                log.error("table %d (%s) crashed: %s", index, cfg.ACCOUNT, e)
+                if isinstance(self.detector, DetectorLoader) and self.detector.failed():
+                    raise  # 共享的模型没能加载，重启哪一桌都没用
+            # 运行了足够久说明不是启动就崩溃，退避时间重置
+            if perf_counter() - started > self.max_backoff:
+                backoff = 5.0
+            self.restarts[index] += 1
+            log.info("restarting table %d in %.0f s", index, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def stats(self) -> dict:
+        return {i: {'account': cfg.ACCOUNT, 'restarts': self.restarts[i],
+                    'state': self.games[i].state.state if self.games[i] is not None else None}
+                for i, cfg in enumerate(self.configs)}
+
+    async def run(self):
+        self.browser_lock = asyncio.Lock()
+        self.scheduler.start()
+        tables = [asyncio.create_task(self.table(i)) for i in range(len(self.configs))]
+        try:
+            await asyncio.gather(*tables)
+        finally:
+            for task in tables:
+                task.cancel()
+            self.scheduler.stop()
+            if self.browser is not None:
+                await self.browser.close()
+            if self.pw is not None:
+                await self.pw.stop()
+
+
+if __name__ == '__main__':
+    setup_logging(config.LOG_LEVEL, config.LOG_RATE)
+    if config.METRICS_PORT:
+        metrics.serve(config.METRICS_PORT)
+    accounts_path = sys.argv[1] if len(sys.argv) > 1 else config.ACCOUNTS_FILE
+    try:
+        asyncio.run(Supervisor(table_configs(accounts_path), workers=config.INFERENCE_WORKERS).run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        metrics.shutdown()
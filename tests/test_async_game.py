@@ -0,0 +1,129 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+pytest.importorskip('playwright')
+os.environ.setdefault('MAJSOUL_ACCOUNT', 'test')  # config 需要账号，测试不登录
+os.environ.setdefault('MAJSOUL_PASSWORD', 'test')
+
+from async_main import AsyncMajsoulGame
+from config import Config
+
+
+class DeadWindow:
+    """Window whose page died after start(): the box is still known, every grab fails"""
+    def __init__(self, alive=True):
+        self.page = None
+        self.scale = 1.0
+        self.ws_state = None
+        self.is_alive = alive
+        self.grabs = 0
+        self.cleaned = False
+
+    async def start(self, account, password):
+        return self
+
+    def __call__(self):
+        return 0, 0, 1440, 900
+
+    def alive(self):
+        return self.is_alive
+
+    async def grab(self, clip=None):
+        self.grabs += 1
+        raise RuntimeError('Target page, context or browser has been closed')
+
+    async def cleanup(self):
+        self.cleaned = True
+
+
+class NoDetector:
+    def resync(self):
+        pass
+
+
+def make_game(window):
+    cfg = Config({**os.environ, 'PRECOMPUTE_WORKERS': '0', 'PIPELINE_MODE': 'off', 'FRAME_GOVERNOR': 'false',
+                  'RECORD_PATH': '', 'METRICS_PORT': '0', 'PROFILE_SAMPLING': 'false'})
+    return AsyncMajsoulGame(window, NoDetector(), cfg=cfg)
+
+
+def test_run_raises_when_the_page_is_closed():
+    window = DeadWindow(alive=False)
+    with pytest.raises(ConnectionError):
+        asyncio.run(asyncio.wait_for(make_game(window).run(), 5))
+    assert window.grabs == 1
+    assert window.cleaned
+
+
+def test_run_raises_after_max_failures():
+    window = DeadWindow(alive=True)
+    game = make_game(window)
+    with pytest.raises(RuntimeError):
+        asyncio.run(asyncio.wait_for(game.run(), 5))
+    assert window.grabs == game.MAX_FAILURES
+    assert window.cleaned
+
+
+class BrokenLoader(NoDetector):
+    def wait_ready(self, timeout=None):
+        raise RuntimeError('no weights')
+
+
+def test_run_raises_when_the_models_do_not_load():
+    window = DeadWindow(alive=True)
+    cfg = Config({**os.environ, 'PRECOMPUTE_WORKERS': '0', 'PIPELINE_MODE': 'off'})
+    with pytest.raises(RuntimeError, match='no weights'):
+        asyncio.run(asyncio.wait_for(AsyncMajsoulGame(window, BrokenLoader(), cfg=cfg).run(), 5))
+    assert window.grabs == 0
+    assert window.cleaned
+
+
+class CountingClick:
+    def __init__(self):
+        self.boxes = []
+
+    async def click(self, box, click=True, center=True):
+        self.boxes.append(box)
+
+
+class Frame:
+    def __init__(self, buttons):
+        self.buttons = buttons
+
+
+def acting_game(frames):
+    """Game whose clicks are counted and whose next frame after a click is the next of frames (None: no change)"""
+    game = make_game(DeadWindow())
+    game.click = CountingClick()
+    frames = iter(frames)
+
+    async def expect(predicate, after, timeout=None):
+        frame = next(frames)
+        return frame is not None and predicate(frame)
+
+    game.expect = expect
+    return game
+
+
+def test_act_retries_until_confirmed():
+    game = acting_game([None, Frame([])])
+    assert asyncio.run(game.act((0, 0, 10, 10), lambda frame: True, retries=2))
+    assert len(game.click.boxes) == 2
+
+
+def test_act_gives_up_after_the_retries():
+    game = acting_game([None, None, None])
+    assert not asyncio.run(game.act((0, 0, 10, 10), lambda frame: True, retries=1))
+    assert len(game.click.boxes) == 2
+
+
+def test_act_button_is_confirmed_by_the_button_going_away():
+    game = acting_game([Frame(['match']), Frame([])])
+    assert asyncio.run(game.act_button(['match'], [(0, 0, 10, 10)], 'match'))
+    assert game.click.boxes == [(0, 0, 10, 10)] * 2
+    assert not asyncio.run(game.act_button(['match'], [(0, 0, 10, 10)], 'silver'))
+    assert len(game.click.boxes) == 2
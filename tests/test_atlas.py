@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from detector.atlas import TileAtlas
+
+LEFT, TOP, WIDTH, HEIGHT, PITCH = 100, 700, 32, 44, 33
+HAND = ['1m', '2m', '3m', '4p', '5p', '6p', '7s', '8s', '9s', '1z', '1z', '2z', '3z']
+
+
+def sprite(seed):
+    """Random pattern standing in for one tile face, far from every other seed"""
+    return np.random.default_rng(seed).integers(0, 256, (HEIGHT, WIDTH), dtype=np.uint8)
+
+
+SPRITES = {tile: sprite(i) for i, tile in enumerate(sorted(set(HAND)))}
+
+
+def draw(hand, sprites=SPRITES):
+    """Frame with the hand drawn at the fixed slot geometry, and its model detection"""
+    image = np.zeros((900, 1440, 3), np.uint8)
+    xyxy = []
+    for i, tile in enumerate(hand):
+        left = LEFT + i * PITCH
+        image[TOP:TOP + HEIGHT, left:left + WIDTH] = sprites[tile][..., np.newaxis]
+        xyxy.append([left, TOP, left + WIDTH, TOP + HEIGHT])
+    return image, xyxy
+
+
+class CountingModel:
+    def __init__(self, hand):
+        self.calls = 0
+        self.image, self.xyxy = draw(hand)
+        self.hand = hand
+
+    def __call__(self, image):
+        self.calls += 1
+        return self.xyxy, list(self.hand)
+
+
+def test_recognize_after_learning(tmp_path):
+    atlas = TileAtlas(str(tmp_path))
+    image, xyxy = draw(HAND)
+    assert not atlas.ready()
+    atlas.learn(image, xyxy, HAND)
+    assert atlas.ready()
+    boxes, tiles = atlas.recognize(image)
+    assert tiles == HAND
+    assert boxes == [[float(v) for v in box] for box in xyxy]
+
+
+def test_recognize_shorter_hand(tmp_path):
+    atlas = TileAtlas(str(tmp_path))
+    atlas.learn(*draw(HAND), HAND)
+    image, _ = draw(HAND[:10])
+    assert atlas.recognize(image)[1] == HAND[:10]
+
+
+def test_detect_falls_back_to_the_model_until_learned(tmp_path):
+    atlas = TileAtlas(str(tmp_path))
+    model = CountingModel(HAND)
+    for _ in range(5):
+        assert atlas.detect(model.image, model)[1] == HAND
+    assert model.calls == 1
+    assert atlas.stats() == {'atlas': 4, 'model': 1, 'tiles': len(set(HAND))}
+
+
+def test_learn_evicts_the_oldest_template(tmp_path):
+    atlas = TileAtlas(str(tmp_path), max_templates=2)
+    for seed in (100, 101, 102):
+        # 同一张牌的三种样子（比如鼠标悬停时的高亮）
+        image, xyxy = draw(HAND, {**SPRITES, '1m': sprite(seed)})
+        atlas.learn(image, xyxy, HAND)
+    crops = [crop for label, crop in zip(atlas.labels, atlas.crops) if label == '1m']
+    assert len(crops) == 2
+    newest = [atlas._crop(draw(['1m'], {'1m': sprite(seed)})[0][..., 0], (LEFT, TOP, LEFT + WIDTH, TOP + HEIGHT))
+              for seed in (101, 102)]
+    assert all(np.array_equal(crop, expected) for crop, expected in zip(crops, newest))
+    assert atlas.labels.count('2m') == 1  # 已经认得准的牌不再加模板
+
+
+def test_learn_does_not_save_on_every_change(tmp_path):
+    atlas = TileAtlas(str(tmp_path), save_interval=60)
+    atlas.learn(*draw(HAND), HAND)
+    assert atlas.dirty
+    assert not os.path.exists(tmp_path / 'index.json')
+    atlas.flush()
+    assert not atlas.dirty
+    assert os.path.exists(tmp_path / 'index.json')
+    loaded = TileAtlas(str(tmp_path))
+    assert loaded.recognize(draw(HAND)[0])[1] == HAND
+
+
+def test_learn_saves_once_the_interval_passed(tmp_path):
+    atlas = TileAtlas(str(tmp_path), save_interval=0)
+    atlas.learn(*draw(HAND), HAND)
+    assert not atlas.dirty
+    assert os.path.exists(tmp_path / 'index.json')
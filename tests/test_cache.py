@@ -0,0 +1,66 @@
+import json
+
+from strategy.cache import DecisionCache
+
+
+def key(i):
+    return DecisionCache.key([i] + [0] * 33)
+
+
+def test_least_recently_used_is_evicted_first():
+    cache = DecisionCache(max_size=2)
+    cache.put(key(1), (0, None))
+    cache.put(key(2), (1, None))
+    assert cache.get(key(1)) == (0, None)   # 1 变成最近使用
+    cache.put(key(3), (2, 'lizhi'))
+    assert cache.get(key(2)) is None
+    assert cache.get(key(1)) == (0, None)
+    assert cache.get(key(3)) == (2, 'lizhi')
+    assert list(cache.entries) == [key(1), key(3)]
+
+
+def test_stats():
+    cache = DecisionCache()
+    assert cache.stats() == {'size': 0, 'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+    cache.put(key(1), (0, None))
+    cache.get(key(1))
+    cache.get(key(2))
+    cache.get(key(1))
+    assert cache.stats() == {'size': 1, 'hits': 2, 'misses': 1, 'hit_rate': 2 / 3}
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = DecisionCache(path=path)
+    for i in range(5):
+        cache.put(key(i), (i, 'lizhi' if i % 2 else None))
+    cache.get(key(0))
+    cache.save()
+
+    loaded = DecisionCache(path=path)
+    assert list(loaded.entries) == list(cache.entries)   # LRU 顺序也保留
+    assert loaded.get(key(3)) == (3, 'lizhi')
+    assert loaded.get(key(4)) == (4, None)
+
+    smaller = DecisionCache(max_size=2, path=path)
+    assert list(smaller.entries) == list(cache.entries)[-2:]
+
+
+def test_snapshot_of_another_backend_is_not_loaded(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = DecisionCache(path=path, backend='helper')
+    cache.put(key(1), (0, None))
+    cache.save()
+    assert json.loads(open(path, encoding='utf-8').read())['backend'] == 'helper'
+    assert DecisionCache(path=path, backend='native').entries == {}
+    assert len(DecisionCache(path=path, backend='helper').entries) == 1
+
+
+def test_missing_broken_or_old_snapshot(tmp_path):
+    assert DecisionCache(path=str(tmp_path / 'missing.json')).entries == {}
+    broken = tmp_path / 'broken.json'
+    broken.write_text('{', encoding='utf-8')
+    assert DecisionCache(path=str(broken)).entries == {}
+    old = tmp_path / 'old.json'   # 没有记录策略的旧格式
+    old.write_text(json.dumps([[key(1).hex(), [0, None]]]), encoding='utf-8')
+    assert DecisionCache(path=str(old)).entries == {}
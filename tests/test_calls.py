@@ -0,0 +1,95 @@
+import pytest
+
+from strategy.calls import (CHI, DRAGONS, GANG, PASS, PENG, Call, _evaluate, decide_call, decide_unseen,
+                            parse_options, swap_tiles)
+from strategy.shanten import tile_index, to_counts
+from utils.liqi import CHI as OP_CHI, DISCARD, MINGGANG, PENG as OP_PENG
+
+SPREAD = ['1m', '9m', '2p', '3p', '6p', '6p', '7p', '4s', '5s', '7z', '7z', '1z', '9s']
+TENPAI = ['1p', '2p', '3p', '4s', '5s', '6s', '7s', '8s', '9s', '9m', '7z', '7z', '1m']
+
+
+def test_peng_a_yakuhai_pair():
+    call = decide_call(SPREAD, '7z', (PENG,))
+    assert call.kind == PENG and call.option == ('7z', '7z')
+    assert call.discard in SPREAD and call.discard != '7z'
+    assert call.complete
+    assert call.matches([t for t in SPREAD if t != '7z'])
+
+
+def test_pass_when_the_call_does_not_help():
+    # 没有役的对子，碰了也没有役
+    hand = ['1m', '9m', '2p', '3p', '6p', '6p', '7p', '4s', '5s', '1z', '1z', '2z', '9s']
+    assert decide_call(hand, '1z', (PENG,), yaku=DRAGONS).kind == PASS
+    # 已经听牌（双碰），碰了还是听牌
+    assert decide_call(TENPAI[:10] + ['5z', '5z', '9m'], '5z', (PENG,)).kind == PASS
+
+
+def test_gang_a_concealed_triplet_when_ukeire_stays():
+    hand = ['7z', '7z', '7z', '1p', '2p', '3p', '4s', '5s', '6s', '7s', '8s', '9s', '9m']
+    call = decide_call(hand, '7z', (PENG, GANG))
+    assert call.kind == GANG and call.discard is None
+
+
+def test_discard_after_peng_is_never_the_called_tile():
+    hand = ['5z', '5z', '5z', '1p', '2p', '3p', '4s', '5s', '6s', '7s', '8s', '9s', '9m']
+    call = _evaluate(hand, to_counts(hand), PENG, '5z', ('5z', '5z'), DRAGONS, False)
+    assert call.discard != '5z'
+
+
+def test_discard_after_chi_skips_the_suji_swap_tile():
+    # 吃3p（45p），6p 和 3p 都不能马上打
+    hand = ['4p', '5p', '6p', '3p', '1s', '2s', '3s', '7s', '8s', '9s', '5z', '5z', '9m']
+    call = _evaluate(hand, to_counts(hand), CHI, '3p', ('4p', '5p'), DRAGONS, True)
+    assert call.discard not in ('3p', '6p')
+
+
+def test_swap_tiles():
+    assert swap_tiles(PENG, 31, (31, 31)) == (31,)
+    assert swap_tiles(CHI, tile_index('3p'), (tile_index('4p'), tile_index('5p'))) == (11, 14)
+    assert swap_tiles(CHI, tile_index('6p'), (tile_index('4p'), tile_index('5p'))) == (14, 11)
+    assert swap_tiles(CHI, tile_index('4p'), (tile_index('3p'), tile_index('5p'))) == (12,)
+    assert swap_tiles(CHI, tile_index('7p'), (tile_index('8p'), tile_index('9p'))) == (15,)
+
+
+def test_call_without_an_allowed_discard_is_dropped():
+    hand = ['5z', '5z', '5z', '5z']
+    assert _evaluate(hand, to_counts(hand), PENG, '5z', ('5z', '5z'), DRAGONS, True) is None
+
+
+def test_budget_cutoff():
+    call = decide_call(SPREAD, '7z', (PENG,), budget=-1)
+    assert call.kind == PASS
+    assert not call.complete
+
+
+def test_parse_options():
+    operations = {DISCARD: [], OP_CHI: ['2s|3s', '3s|4s'], OP_PENG: ['5p|0p'], MINGGANG: ['7z|7z|7z', '']}
+    assert parse_options(operations) == {CHI: [('2s', '3s'), ('3s', '4s')], PENG: [('5p', '0p')],
+                                         GANG: [('7z', '7z', '7z')]}
+    assert parse_options({DISCARD: []}) == {}
+
+
+def test_decide_with_the_options_of_the_game():
+    call = decide_call(SPREAD, '7z', (PENG,), parse_options({OP_PENG: ['7z|7z']}))
+    assert call.kind == PENG
+    assert decide_call(SPREAD, '7z', (PENG,), {PENG: [('7z', '5z')]}).kind == PASS  # 手里没有5z
+
+
+def test_decide_unseen():
+    calls = decide_unseen(TENPAI, (PENG,))
+    assert [call.tile for call in calls] == ['7z']
+    assert all(isinstance(call, Call) and call.kind == PENG for call in calls)
+    assert decide_unseen(TENPAI, (CHI, PENG)) == []    # 吃的牌无从推断
+    assert decide_unseen(['1m', '9m', '1p', '5p', '9p', '1s', '5s', '9s', '1z', '2z', '3z', '5z', '6z'],
+                         (PENG,)) == []
+    # 两个对子的判断不一致时不鸣
+    assert decide_unseen(['1z', '1z'] + TENPAI[:11], (PENG,)) == []
+
+
+@pytest.mark.parametrize('tile', ['7z', '5z'])
+def test_unseen_calls_agree_with_decide_call(tile):
+    hand = TENPAI[:11] + [tile, tile]
+    calls = decide_unseen(hand, (PENG,))
+    call = decide_call(hand, tile, (PENG,))
+    assert [c.kind for c in calls] == ([call.kind] if call.kind != PASS else [])
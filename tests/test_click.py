@@ -0,0 +1,96 @@
+import asyncio
+
+from utils.click import AsyncClick, HandLayout, MyClick
+from utils.metrics import metrics
+
+
+class Mouse:
+    def __init__(self):
+        self.calls = []
+
+    def move(self, x, y):
+        self.calls.append(('move', x, y))
+
+    def click(self, x, y):
+        self.calls.append(('click', x, y))
+
+
+class AsyncMouse(Mouse):
+    async def move(self, x, y):
+        super().move(x, y)
+
+    async def click(self, x, y):
+        super().click(x, y)
+
+
+class Page:
+    def __init__(self, mouse):
+        self.mouse = mouse
+
+
+class Recorder:
+    def __init__(self):
+        self.clicks = []
+
+    def click(self, x, y, click):
+        self.clicks.append((x, y, click))
+
+
+def test_point():
+    click = MyClick()
+    click.set_top_left_corner((100, 50, 1540, 950))
+    assert click.point((10, 20, 30, 60)) == (120, 90)
+    assert click.point((10, 20, 30, 60), center=False) == (110, 70)
+    click.scale = 2.0  # 帧像素是页面像素的两倍
+    assert click.point((10, 20, 30, 60)) == (60, 45)
+
+
+def test_click_moves_then_clicks():
+    mouse, recorder = Mouse(), Recorder()
+    click = MyClick(Page(mouse), recorder)
+    click.click((0, 0, 20, 10))
+    click.click((0, 0, 40, 10), click=False)
+    assert mouse.calls == [('move', 10, 5), ('click', 10, 5), ('move', 20, 5)]
+    assert recorder.clicks == [(10, 5, True), (20, 5, False)]
+
+
+def test_first_action_is_measured_once():
+    before = metrics.snapshot()['stages'].get('first_action', {}).get('count', 0)
+    click = MyClick(Page(Mouse()), started_at=0.0)
+    assert click.last_click == 0.0
+    click.click((0, 0, 20, 10), click=False)
+    assert click.started_at == 0.0 and click.last_click == 0.0  # 只移动不算操作
+    click.click((0, 0, 20, 10))
+    click.click((0, 0, 20, 10))
+    assert click.started_at is None
+    assert click.last_click > 0
+    assert metrics.snapshot()['stages']['first_action']['count'] == before + 1
+
+
+def test_async_click_clicks_without_a_separate_move():
+    mouse = AsyncMouse()
+    click = AsyncClick(Page(mouse))
+    asyncio.run(click.click((0, 0, 20, 10)))
+    asyncio.run(click.click((0, 0, 40, 10), click=False))
+    assert mouse.calls == [('click', 10, 5), ('move', 20, 5)]
+    assert click.last_click > 0
+
+
+def test_no_page_does_not_click():
+    recorder = Recorder()
+    click = MyClick(recorder=recorder)
+    click.click((0, 0, 20, 10))
+    asyncio.run(AsyncClick(recorder=recorder).click((0, 0, 20, 10)))
+    assert recorder.clicks == [(10, 5, True), (10, 5, True)]
+    assert click.last_click == 0.0
+
+
+def test_hand_layout():
+    layout = HandLayout()
+    hand = [[100 + 32 * i, 700, 131 + 32 * i, 744] for i in range(13)]
+    assert not layout.calibrate(hand[:3], drawn=False)
+    assert layout.calibrate(hand + [[100 + 32 * 13 + 16, 700, 131 + 32 * 13 + 16, 744]], drawn=True)
+    assert layout.ready()
+    assert layout.box(0, 13) == [100, 700, 131, 744]
+    assert layout.box(13, 13) == [532, 700, 563, 744]
+    assert layout.box(10, 10) == [436, 700, 467, 744]  # 鸣牌后手牌变短，摸牌位跟着左移
@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('playwright')
+
+from utils.frames import FramePool
+from utils.render import ClipCanvas
+from utils.window import ScreenshotCapture
+
+WIDTH, HEIGHT = 400, 300
+CLIP = (0.5, 0.5, 1.0, 1.0)
+
+
+class PngPage:
+    """screenshot() returns a white full page, or a grey clip"""
+    viewport_size = {'width': WIDTH, 'height': HEIGHT}
+
+    def screenshot(self, type='jpeg', full_page=False, clip=None):
+        if clip is None:
+            image = np.full((HEIGHT, WIDTH, 3), 255, np.uint8)
+        else:
+            image = np.full((int(clip['height']), int(clip['width']), 3), 100, np.uint8)
+        return cv2.imencode('.png', image)[1].tobytes()
+
+
+def test_clip_full_clip_keeps_outside_black():
+    capture = ScreenshotCapture(PngPage())
+    for clip in [CLIP] * 4 + [None] * 4 + [CLIP] * 4:
+        frame = capture.grab(clip)
+        if clip is None:
+            assert (frame == 255).all()
+        else:
+            assert (frame[:HEIGHT // 2] == 0).all() and (frame[:, :WIDTH // 2] == 0).all()
+            assert (frame[HEIGHT // 2:, WIDTH // 2:] == 100).all()
+
+
+def test_frames_are_read_only():
+    capture = ScreenshotCapture(PngPage())
+    for clip in (None, CLIP):
+        with pytest.raises(ValueError):
+            capture.grab(clip)[0, 0, 0] = 1
+
+
+def test_canvas_clears_when_clip_changes():
+    canvas = ClipCanvas(FramePool(1))
+    part = np.full((10, 10, 3), 7, np.uint8)
+    canvas.paste(part, (0, 0, 10, 10), 40, 30)
+    frame = canvas.paste(part, (20, 10, 30, 20), 40, 30)
+    assert (frame[:10, :10] == 0).all() and (frame[10:20, 20:30] == 7).all()
@@ -0,0 +1,156 @@
+import pytest
+
+import game_state
+from game_state import LOGIN, LOBBY, QUEUE, IN_GAME, OUR_TURN, ROUND_END, FrameGovernor, GameStateMachine
+
+HAND = ['1p'] * 13
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(game_state, 'time', clock)
+    return clock
+
+
+@pytest.mark.parametrize('state', [LOGIN, LOBBY, QUEUE])
+def test_nothing_detected_keeps_the_menu_states(state):
+    machine = GameStateMachine(state=state)
+    assert machine.update([], {}, []) == state
+
+
+@pytest.mark.parametrize('state', [IN_GAME, OUR_TURN, ROUND_END])
+def test_nothing_detected_in_a_game_counts_as_in_game(state):
+    machine = GameStateMachine(state=state)
+    assert machine.update([], {}, []) == IN_GAME
+
+
+def test_transitions():
+    machine = GameStateMachine()
+    assert machine.update(['3p-east'], {}, []) == LOBBY
+    machine.enter(QUEUE)
+    assert machine.update(['3p-east'], {}, []) == QUEUE  # 排队时大厅按钮还在
+    assert machine.update([], {}, HAND) == IN_GAME
+    assert machine.update([], {}, HAND + ['2p']) == OUR_TURN
+    assert machine.update(['peng'], {}, HAND) == 'call_prompt'
+    assert machine.update([], {'zhongju': (0, 0, 1, 1)}, []) == ROUND_END
+
+
+def test_queue_times_out_back_to_the_lobby(clock):
+    machine = GameStateMachine(queue_timeout=30, state=QUEUE)
+    clock.now += 31
+    assert machine.update(['3p-east'], {}, []) == LOBBY
+
+
+@pytest.mark.parametrize('state', [LOGIN, LOBBY, QUEUE])
+def test_stalled_without_lobby_buttons(clock, state):
+    machine = GameStateMachine(state=state)
+    assert not machine.stalled([], 15)      # 空闲计时从这里开始
+    clock.now += 10
+    assert not machine.stalled([], 15)
+    clock.now += 6
+    assert machine.stalled([], 15)
+    assert not machine.stalled([], 15)      # 点击后重新计时
+    clock.now += 16
+    assert machine.stalled([], 15)
+
+
+def test_lobby_buttons_are_not_stalled(clock):
+    machine = GameStateMachine(state=LOBBY)
+    machine.stalled([], 15)
+    clock.now += 20
+    assert not machine.stalled(['3p-east'], 15)
+    clock.now += 10
+    assert not machine.stalled([], 15)
+
+
+def test_game_states_never_stall(clock):
+    machine = GameStateMachine(state=IN_GAME)
+    machine.stalled([], 15)
+    clock.now += 100
+    assert not machine.stalled([], 15)
+
+
+class FakeTimes:
+    def __init__(self):
+        self.now = 1000.0
+        self.cpu = 10.0
+
+    def perf_counter(self):
+        return self.now
+
+    def process_time(self):
+        return self.cpu
+
+
+@pytest.fixture
+def times(monkeypatch):
+    times = FakeTimes()
+    monkeypatch.setattr(game_state, 'perf_counter', times.perf_counter)
+    monkeypatch.setattr(game_state, 'process_time', times.process_time)
+    return times
+
+
+def test_governor_paces_by_state(times):
+    governor = FrameGovernor({LOBBY: 2, OUR_TURN: 0})
+    assert governor.delay(LOBBY) == 0.0  # 第一帧不等
+    governor.start(LOBBY)
+    times.now += 0.1
+    assert governor.delay(LOBBY) == pytest.approx(0.4)
+    assert governor.delay(OUR_TURN) == 0.0
+    times.now += 1.0
+    assert governor.delay(LOBBY) == 0.0  # 这一帧已经比间隔还慢
+
+
+def test_governor_does_not_throttle_right_after_a_click(times):
+    governor = FrameGovernor({LOBBY: 2}, settle=1.0)
+    governor.start(LOBBY)
+    clicked = times.now
+    times.now += 0.1
+    assert governor.delay(LOBBY, last_action=clicked) == 0.0
+    governor.start(LOBBY)
+    times.now += 1.0
+    assert governor.delay(LOBBY, last_action=clicked) == 0.0  # 这一帧本身用了 1 s
+    governor.start(LOBBY)
+    times.now += 0.1
+    assert governor.delay(LOBBY, last_action=clicked) == pytest.approx(0.4)
+
+
+def test_governor_disabled(times):
+    governor = FrameGovernor({LOBBY: 2}, enabled=False)
+    governor.start(LOBBY)
+    times.now += 0.1
+    assert governor.delay(LOBBY) == 0.0
+
+
+def test_governor_wait_is_cut_short(times):
+    governor = FrameGovernor(step=0.05)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        times.now += seconds
+
+    assert governor.wait(0.5, sleep=sleep) == pytest.approx(0.5)
+    assert sleeps == [0.5]
+    sleeps.clear()
+    assert governor.wait(0.5, sleep=sleep, wake=lambda: len(sleeps) == 3) == pytest.approx(0.15)
+    assert sleeps == [0.05] * 3
+
+
+def test_governor_estimates_cpu_saved(times):
+    governor = FrameGovernor({LOBBY: 1})
+    governor.start(LOBBY)
+    times.now += 0.2
+    times.cpu += 0.1  # 不限速时每秒用掉 0.5 s CPU
+    governor.delay(LOBBY)
+    governor.start(LOBBY, slept=0.8)
+    assert governor.stats() == {'frames': {LOBBY: 2}, 'slept': 0.8, 'cpu_used': 0.1, 'cpu_saved': 0.4}
@@ -0,0 +1,74 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from detector.gate import DEPENDENCIES, FrameGate
+
+ALL = set(DEPENDENCIES)
+
+
+def frame(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (900, 1440, 3), dtype=np.uint8)
+
+
+def changed(image, left, top, right, bottom, seed=1):
+    """Copy of image with the region (relative coordinates) replaced by other noise"""
+    image = image.copy()
+    height, width = image.shape[:2]
+    region = np.s_[int(height * top):int(height * bottom), int(width * left):int(width * right)]
+    image[region] = frame(seed)[region]
+    return image
+
+
+def test_first_frame_runs_everything_then_skips():
+    gate = FrameGate()
+    image = frame()
+    assert gate.check(image) == ALL
+    assert gate.check(image.copy()) == set()
+    assert gate.stats()['skipped_frames'] == 1
+
+
+def test_only_dependent_detectors_run():
+    gate = FrameGate()
+    image = frame()
+    gate.check(image)
+    assert gate.check(changed(image, 0.3, 0.3, 0.7, 0.5)) == {'detect_frame'}  # 牌河变了
+    hand = changed(image, 0.2, 0.8, 0.8, 1.0)
+    assert gate.check(hand) == ALL
+
+
+def test_max_skip_forces_a_run():
+    gate = FrameGate(max_skip=3)
+    image = frame()
+    gate.check(image)
+    assert [gate.check(image) for _ in range(4)] == [set(), set(), set(), ALL]
+    assert gate.check(image) == set()
+    assert gate.stats()['processed'] == {name: 2 for name in DEPENDENCIES}
+    assert gate.stats()['skipped'] == {name: 4 for name in DEPENDENCIES}
+
+
+def test_skipped_count_is_per_detector():
+    gate = FrameGate(max_skip=2)
+    image = frame()
+    gate.check(image)
+    gate.check(changed(image, 0.3, 0.3, 0.7, 0.5))  # detect_frame 重新运行，计数从头开始
+    assert gate.check(image) == {'detect_frame'}
+    assert gate.check(image) == {'detect_tiles', 'detect_characters'}
+
+
+def test_wanted_force_and_reset():
+    gate = FrameGate()
+    image = frame()
+    assert gate.check(image, wanted={'detect_tiles'}) == {'detect_tiles'}
+    assert gate.check(image, wanted={'detect_tiles', 'detect_frame'}) == {'detect_frame'}
+    assert gate.check(image, force={'detect_tiles'}) == {'detect_tiles', 'detect_characters'}
+    gate.reset()
+    assert gate.check(image) == ALL
+
+
+def test_small_changes_are_ignored():
+    gate = FrameGate(threshold=0.5)
+    image = frame()
+    gate.check(image)
+    assert gate.check(changed(image, 0.3, 0.3, 0.7, 0.5)) == set()
@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from detector.keywords import KeywordMatcher
+
+
+class CountingOcr:
+    def __init__(self, hits=()):
+        self.calls = 0
+        self.hits = list(hits)
+
+    def __call__(self, image):
+        self.calls += 1
+        return {}, self.hits
+
+
+def test_ocr_every_frame_while_templates_missing(tmp_path):
+    matcher = KeywordMatcher(template_dir=str(tmp_path))
+    ocr = CountingOcr()
+    image = np.zeros((90, 144, 3), np.uint8)
+    for _ in range(5):
+        matcher.detect(image, ocr)
+    assert ocr.calls == 5
+
+
+def test_periodic_refresh_once_templates_learned(tmp_path):
+    matcher = KeywordMatcher(template_dir=str(tmp_path), ocr_interval=10)
+    image = np.zeros((90, 144, 3), np.uint8)
+    image[30:50, 40:100] = 255
+    image[35:45, 50:90] = 0
+    ocr = CountingOcr([(name, (40, 30, 100, 50)) for name in matcher.templates])
+    matcher.detect(image, ocr)
+    assert all(matcher.templates.values())
+    ocr.calls = 0
+    for _ in range(19):
+        matcher.detect(image, ocr)
+    assert ocr.calls == 2
@@ -0,0 +1,122 @@
+from utils.liqi import ANGANG, BABEI, DISCARD, PENG, GameModel, decode_action
+
+
+def varint(n):
+    out = bytearray()
+    while True:
+        byte, n = n & 0x7f, n >> 7
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def message(*fields):
+    """(number, int / str / bytes) pairs -> protobuf"""
+    out = b''
+    for number, value in fields:
+        if isinstance(value, int):
+            out += varint(number << 3) + varint(value)
+        else:
+            value = value.encode('utf-8') if isinstance(value, str) else value
+            out += varint(number << 3 | 2) + varint(len(value)) + value
+    return out
+
+
+def operations(*ops):
+    """OptionalOperationList of (type, [combination])"""
+    return message(*[(2, message((1, kind), *[(2, c) for c in combination])) for kind, combination in ops])
+
+
+def action(name, *fields):
+    data = decode_action(message(*fields))  # 异或混淆是对称的
+    return bytes([1]) + message((1, '.lq.ActionPrototype'), (2, message((1, 0), (2, name), (3, data))))
+
+
+HAND = ['1m', '9m', '1p', '0p', '5p', '9p', '1s', '1s', '1s', '2s', '3s', '4z', '5z', '5z']
+
+
+def test_decode_action_known_vector():
+    assert decode_action(bytes(10)).hex() == 'a180756e6ad85aa061ce'
+    assert decode_action(b'\x01\x02') == b'\x98\x7a'
+    assert decode_action(decode_action(b'hello')) == b'hello'
+
+
+def test_remove_falls_back_to_the_other_five():
+    model = GameModel()
+    model.hand = ['0p', '1s']
+    model._remove('5p')
+    assert model.hand == ['1s']
+    model.hand = ['5p', '5s']
+    model._remove('0s')
+    assert model.hand == ['5p']
+
+
+def test_round_of_our_seat():
+    model = GameModel()
+    assert not model.feed('text frame')
+    assert not model.discard_prompt()
+
+    # 亲家配牌14张，座位就是局数
+    assert model.feed(action('ActionNewRound', (1, 0), (2, 0), (3, 0), (13, 40), *[(4, t) for t in HAND],
+                             (7, operations((DISCARD, [])))))
+    assert model.valid and model.seat == 0
+    assert model.hand == ['1m', '9m', '1p', '0p', '5p', '9p', '1s', '1s', '1s', '2s', '3s', '4z', '5z', '5z']
+    assert model.drawn == '5z'
+    assert model.closed() == model.hand[:-1]
+    assert model.discard_prompt() and not model.call_prompt()
+
+    model.feed(action('ActionDiscardTile', (1, 0), (2, '9m')))
+    assert model.drawn is None and len(model.hand) == 13
+    assert model.operations == {}
+    assert not model.discard_prompt()
+
+    # 别家打出5p，可以碰
+    model.feed(action('ActionDiscardTile', (1, 1), (2, '5p'), (4, operations((PENG, ['5p|5p'])))))
+    assert model.last_discard == '5p'
+    assert model.operations == {PENG: ['5p|5p']}
+    assert model.call_prompt() and not model.discard_prompt()
+
+    # 碰：手里的5p和赤5p各拿走一张
+    model.feed(action('ActionChiPengGang', (1, 0), (3, '5p'), (3, '5p'), (3, '5p'), (4, 0), (4, 0), (4, 1),
+                      (6, operations((DISCARD, [])))))
+    assert model.hand == ['1m', '1p', '9p', '1s', '1s', '1s', '2s', '3s', '4z', '5z', '5z']
+    assert model.discard_prompt()
+    model.feed(action('ActionDiscardTile', (1, 0), (2, '1m')))
+
+    model.feed(action('ActionDealTile', (1, 0), (2, '1s'), (3, 30),
+                      (4, operations((DISCARD, []), (ANGANG, ['1s|1s|1s|1s'])))))
+    assert model.drawn == '1s' and model.hand[-1] == '1s'
+    assert model.round['left'] == 30
+    assert set(model.operations) == {DISCARD, ANGANG}
+
+    model.feed(action('ActionAnGangAddGang', (1, 0), (2, 3), (3, '1s'), (4, operations((BABEI, [])))))
+    assert model.hand == ['1p', '9p', '2s', '3s', '4z', '5z', '5z']
+    assert model.drawn is None
+
+    model.feed(action('ActionBaBei', (1, 0), (2, operations((DISCARD, [])))))
+    assert model.hand == ['1p', '9p', '2s', '3s', '5z', '5z']
+    assert model.discard_prompt()
+
+
+def test_other_seat_actions_leave_our_hand():
+    model = GameModel()
+    model.feed(action('ActionNewRound', (1, 0), (2, 1), (3, 0), *[(4, t) for t in HAND[:13]]))
+    model.seat = 0
+    hand = list(model.hand)
+    model.feed(action('ActionDealTile', (1, 2), (3, 39)))
+    model.feed(action('ActionChiPengGang', (1, 2), (3, '1s'), (3, '1s'), (3, '1s'), (4, 2), (4, 2), (4, 0)))
+    model.feed(action('ActionBaBei', (1, 1)))
+    assert model.hand == hand
+    assert model.drawn is None and model.last_discard is None
+
+
+def test_sync_game_invalidates_the_model():
+    model = GameModel()
+    model.feed(action('ActionNewRound', (1, 0), (2, 0), (3, 0), *[(4, t) for t in HAND],
+                      (7, operations((DISCARD, [])))))
+    assert model.discard_prompt()
+    version = model.version
+    assert not model.feed(bytes([2, 7, 0]) + message((1, '.lq.FastTest.syncGame'), (2, b'')))
+    assert model.feed(bytes([3, 7, 0]) + message((1, ''), (2, b'')))
+    assert not model.valid and model.version > version
+    assert not model.discard_prompt() and not model.call_prompt()
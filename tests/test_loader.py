@@ -0,0 +1,38 @@
+import pytest
+
+import detector.loader as loader
+from detector.loader import DetectorLoader
+from detector.pipeline import DetectorPipeline
+
+
+class Loaded:
+    def detect_frame(self, image=None):
+        return [], ['match']
+
+
+def test_loader_forwards_to_the_detector(monkeypatch):
+    monkeypatch.setattr(loader, 'load_detector', lambda warmup, **kwargs: Loaded())
+    detector = DetectorLoader(False)
+    DetectorPipeline(None, detector).wait_ready(5)
+    assert not detector.failed()
+    assert detector.detect_frame() == ([], ['match'])
+
+
+def test_load_error_is_raised_by_wait_ready(monkeypatch):
+    def broken(warmup, **kwargs):
+        raise RuntimeError('no weights')
+
+    monkeypatch.setattr(loader, 'load_detector', broken)
+    detector = DetectorLoader(False)
+    pipeline = DetectorPipeline(None, detector, mode='thread')
+    try:
+        with pytest.raises(RuntimeError, match='no weights'):
+            pipeline.wait_ready(5)
+        assert detector.failed()
+    finally:
+        pipeline.shutdown()
+
+
+def test_wait_ready_without_a_loader():
+    DetectorPipeline(None, Loaded()).wait_ready(5)
+    DetectorPipeline(None, None).wait_ready(5)
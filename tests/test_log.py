@@ -0,0 +1,50 @@
+import logging
+
+from utils import log as log_module
+from utils.log import RateLimitFilter, get_logger
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def record(msg='RGB: %.1f', level=logging.DEBUG, name='majsoulbot.main'):
+    return logging.LogRecord(name, level, __file__, 1, msg, (1.0,), None)
+
+
+def test_burst_then_rate(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(log_module, 'monotonic', clock)
+    limit = RateLimitFilter(rate=2.0, burst=3)
+    assert [limit.filter(record()) for _ in range(5)] == [True, True, True, False, False]
+    clock.now += 0.5  # 攒够一个令牌
+    passed = record()
+    assert limit.filter(passed)
+    assert passed.msg == 'RGB: %.1f (+2 suppressed)'
+    assert not limit.filter(record())
+
+
+def test_messages_are_limited_separately(monkeypatch):
+    monkeypatch.setattr(log_module, 'monotonic', Clock())
+    limit = RateLimitFilter(rate=1.0, burst=1)
+    assert limit.filter(record('a'))
+    assert not limit.filter(record('a'))
+    assert limit.filter(record('b'))
+    assert limit.filter(record('a', name='majsoulbot.async_main'))
+
+
+def test_warnings_and_zero_rate_are_not_limited(monkeypatch):
+    monkeypatch.setattr(log_module, 'monotonic', Clock())
+    limit = RateLimitFilter(rate=1.0, burst=1)
+    assert all(limit.filter(record(level=logging.WARNING)) for _ in range(10))
+    unlimited = RateLimitFilter(rate=0)
+    assert all(unlimited.filter(record()) for _ in range(10))
+
+
+def test_get_logger_names():
+    assert get_logger('detector.atlas').name == 'majsoulbot.atlas'
+    assert get_logger('main').name == 'majsoulbot.main'
@@ -0,0 +1,83 @@
+import json
+import urllib.request
+
+from utils.metrics import Histogram, Metrics
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.observe(ms / 1000)
+    assert histogram.count == 100
+    assert abs(histogram.total - 5.05) < 1e-9
+    assert histogram.percentiles() == {0.5: 0.051, 0.95: 0.096, 0.99: 0.1}
+
+
+def test_histogram_window_keeps_lifetime_totals():
+    histogram = Histogram(window=10)
+    for value in [10.0] * 10 + [1.0] * 10:
+        histogram.observe(value)
+    assert histogram.count == 20
+    assert histogram.total == 110.0
+    assert histogram.percentiles((0.99,)) == {0.99: 1.0}  # 旧样本已经滚出窗口
+
+
+def test_empty_histogram():
+    assert Histogram().percentiles() == {0.5: 0.0, 0.95: 0.0, 0.99: 0.0}
+
+
+def test_span_and_timed():
+    metrics = Metrics()
+    with metrics.span('capture'):
+        pass
+
+    @metrics.timed('decide')
+    def decide(x):
+        return x * 2
+
+    assert decide(21) == 42
+    assert decide.__name__ == 'decide'
+    stages = metrics.snapshot()['stages']
+    assert stages['capture']['count'] == 1
+    assert stages['decide']['count'] == 1
+
+
+def test_span_records_on_error():
+    metrics = Metrics()
+    try:
+        with metrics.span('detect'):
+            raise ValueError
+    except ValueError:
+        pass
+    assert metrics.snapshot()['stages']['detect']['count'] == 1
+
+
+def test_prometheus_text():
+    metrics = Metrics()
+    metrics.observe('detect_tiles', 0.25)
+    metrics.observe('detect_tiles', 0.5)
+    metrics.count('clicks')
+    metrics.count('clicks', 2)
+    lines = metrics.prometheus().splitlines()
+    assert lines[0] == '# TYPE majsoulbot_stage_seconds summary'
+    assert 'majsoulbot_stage_seconds{stage="detect_tiles",quantile="0.5"} 0.500000' in lines
+    assert 'majsoulbot_stage_seconds_sum{stage="detect_tiles"} 0.750000' in lines
+    assert 'majsoulbot_stage_seconds_count{stage="detect_tiles"} 2' in lines
+    assert '# TYPE majsoulbot_events_total counter' in lines
+    assert lines[-1] == 'majsoulbot_events_total{event="clicks"} 3'
+
+
+def test_serve():
+    metrics = Metrics()
+    metrics.count('clicks')
+    server = metrics.serve(0)
+    try:
+        assert metrics.serve(0) is server
+        url = 'http://127.0.0.1:%d' % server.server_address[1]
+        with urllib.request.urlopen(url + '/metrics', timeout=5) as response:
+            assert 'majsoulbot_events_total{event="clicks"} 1' in response.read().decode()
+        with urllib.request.urlopen(url + '/json', timeout=5) as response:
+            assert json.load(response)['counters'] == {'clicks': 1}
+    finally:
+        metrics.shutdown()
+    assert metrics.server is None
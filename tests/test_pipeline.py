@@ -0,0 +1,66 @@
+import threading
+import time
+
+from detector.pipeline import DetectorPipeline
+
+
+class SlowDetector:
+    """Records how many calls of every method overlap"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.overlap = 0
+        self.resyncs = 0
+
+    def _call(self, method, result):
+        with self.lock:
+            self.running[method] = self.running.get(method, 0) + 1
+            self.overlap = max(self.overlap, self.running[method])
+        time.sleep(0.005)
+        with self.lock:
+            self.running[method] -= 1
+        return result
+
+    def detect_tiles(self, image=None):
+        return self._call('detect_tiles', ([], []))
+
+    def detect_frame(self, image=None):
+        return self._call('detect_frame', ([], []))
+
+    def detect_characters(self, image=None):
+        return self._call('detect_characters', {})
+
+    def resync(self):
+        self.resyncs += 1
+
+
+def frames(n):
+    remaining = [n]
+
+    def capture():
+        if remaining[0] == 0:
+            return None
+        remaining[0] -= 1
+        return (0, 0, 10, 10), object()
+    return capture
+
+
+def test_thread_mode_never_runs_a_detector_on_two_frames_at_once():
+    detector = SlowDetector()
+    pipeline = DetectorPipeline(frames(20), detector, mode='thread')
+    count = 0
+    while pipeline.next_frame() is not None:
+        count += 1
+    pipeline.resync()
+    pipeline.shutdown()
+    assert count == 20
+    assert detector.overlap == 1
+
+
+def test_resync_in_thread_mode_reaches_the_detector():
+    detector = SlowDetector()
+    pipeline = DetectorPipeline(frames(2), detector, mode='thread')
+    pipeline.next_frame()
+    pipeline.resync()
+    pipeline.pools['detect_tiles'].shutdown(wait=True)
+    assert detector.resyncs == 1
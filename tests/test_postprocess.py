@@ -0,0 +1,46 @@
+"""
+Post-processing and discard decision benchmarks (pytest-benchmark), plus the checks that the
+NumPy post-processing agrees with the loops it replaced.
+
+    python -m pytest tests/test_postprocess.py --benchmark-autosave
+    python -m pytest tests/test_postprocess.py --benchmark-compare --benchmark-compare-fail=min:20%
+"""
+import importlib.util
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from benchmark.postprocess import CASES, SIZES, legacy_hand_tiles, legacy_suppress, synthetic_buttons, synthetic_hand
+from detector.postprocess import hand_tiles, suppress
+
+
+@pytest.mark.parametrize('n', (8, 32, 128))
+def test_suppress_matches_loops(n):
+    xyxy, confidence = synthetic_buttons(n, seed=n)
+    assert np.array_equal(suppress(xyxy, confidence, 0.5), legacy_suppress(xyxy, confidence))
+
+
+@pytest.mark.parametrize('n', (14, 40, 160))
+def test_hand_tiles_matches_loops(n):
+    xyxy, confidence, names = synthetic_hand(n, seed=n)
+    boxes, tiles = hand_tiles(xyxy, confidence, names)
+    legacy_boxes, legacy_tiles = legacy_hand_tiles(xyxy, confidence, names)
+    assert tiles == legacy_tiles
+    assert np.allclose(boxes, np.array(legacy_boxes).reshape(-1, 4))
+
+
+def test_hand_tiles_fills_the_missed_middle_tile():
+    xyxy = np.array([[0, 0, 10, 20], [20, 0, 30, 20], [30, 0, 40, 20]], np.float32)
+    boxes, tiles = hand_tiles(xyxy, [0.9, 0.9, 0.9], ['1m', '1m', '2m'], offset=(100, 50))
+    assert tiles == ['1m', '1m', '1m', '2m']
+    assert boxes[1].tolist() == [110, 50, 120, 70]
+
+
+@pytest.mark.skipif(importlib.util.find_spec('pytest_benchmark') is None, reason='needs pytest-benchmark')
+@pytest.mark.parametrize('case', [(name, n) for name in SIZES for n in SIZES[name]],
+                         ids=lambda case: f'{case[0]}[{case[1]}]')
+def test_benchmark(case, benchmark):
+    name, n = case
+    benchmark.group = name.replace('legacy_', '')
+    benchmark(CASES[name](n))
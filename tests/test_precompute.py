@@ -0,0 +1,40 @@
+import time
+
+from strategy.precompute import DrawPrecomputer
+from strategy.strategy import step
+
+def settle(precompute, timeout=5.0):
+    """Wait for the workers and the done callbacks that store their results"""
+    deadline = time.time() + timeout
+    for future in list(precompute.futures):
+        future.result(timeout)
+    while len(precompute.table) < len(precompute.futures) and time.time() < deadline:
+        time.sleep(0.01)
+
+
+HAND = ['1m', '9m', '1p', '2p', '3p', '5p', '6p', '7p', '1s', '2s', '3s', '5z', '5z']
+
+
+def test_precomputed_decisions_match_step():
+    precompute = DrawPrecomputer(step, workers=1)
+    try:
+        for _ in range(precompute.stable_frames):
+            precompute.update(HAND)
+        settle(precompute)
+        for drawn in ('4p', '9s', '5z'):
+            hand = HAND + [drawn]
+            assert precompute.lookup(hand) == step(hand)
+    finally:
+        precompute.shutdown()
+
+
+def test_invalidate_drops_results():
+    precompute = DrawPrecomputer(step, workers=1)
+    try:
+        for _ in range(precompute.stable_frames):
+            precompute.update(HAND)
+        settle(precompute)
+        precompute.invalidate()
+        assert precompute.lookup(HAND + ['4p']) is None
+    finally:
+        precompute.shutdown()
@@ -0,0 +1,126 @@
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from multiprocessing.connection import Client
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from detector.server import InferenceClient, InferenceServer
+
+AUTHKEY = 'test'
+
+
+class SlowDetector:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def detect_batch(self, method, images):
+        time.sleep(self.delay)
+        return [int(image.sum()) for image in images]
+
+
+def start_server(detector, port):
+    server = InferenceServer(detector, ('127.0.0.1', port), AUTHKEY, max_wait=0.001)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    deadline = time.time() + 5
+    while True:
+        try:
+            return InferenceClient(('127.0.0.1', port), AUTHKEY, slots=1, slot_bytes=64, timeout=0.05)
+        except ConnectionRefusedError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.02)
+
+
+def test_timed_out_slot_stays_reserved_until_the_reply():
+    client = start_server(SlowDetector(delay=0.3), 16101)
+    try:
+        with pytest.raises((TimeoutError, FutureTimeout)):
+            client.detect_frame(np.ones(8, np.uint8))
+        assert client.free.empty()  # 服务端可能还在读这个槽位
+        deadline = time.time() + 2
+        while client.free.empty() and time.time() < deadline:
+            time.sleep(0.01)
+        assert not client.free.empty()
+    finally:
+        client.close()
+
+
+def test_bad_requests_get_an_error_and_the_client_keeps_working():
+    client = start_server(SlowDetector(), 16102)
+    client.timeout = 5
+    try:
+        raw = Client(('127.0.0.1', 16102), authkey=AUTHKEY.encode())
+        raw.send({'shm': client.shm.name, 'slot_bytes': 64})
+        for request in [(1, 'detect_frame', 0, (1000,), '|u1'),   # 放不进槽位
+                        (2, 'detect_frame', 5, (8,), '|u1'),      # 槽位越界
+                        (3, 'detect_frame', 0, (8,), 'not a dtype'),
+                        (4, 'detect_frame', 0, (8,), '|O')]:
+            raw.send(request)
+            request_id, error, _ = raw.recv()
+            assert request_id == request[0] and error.startswith('bad request')
+        raw.send((5, 'detect_frame', 0, (8,), '|u1'))
+        assert raw.recv()[1] is None
+        raw.close()
+        assert client.detect_frame(np.ones(8, np.uint8)) == 8
+    finally:
+        client.close()
+
+
+def test_concurrent_replies_arrive_whole():
+    from multiprocessing import Pipe
+    from multiprocessing.shared_memory import SharedMemory
+    from detector.server import _Connection
+
+    shm = SharedMemory(create=True, size=64)
+    server_end, client_end = Pipe()
+    connection = _Connection(server_end, SharedMemory(name=shm.name), 64)
+    payload = list(range(20000))  # 一次 send 要写好几次
+    received = []
+
+    def replies(start):
+        for request_id in range(start, start + 50):
+            connection.reply(request_id, payload)
+
+    def read():
+        try:
+            for _ in range(200):
+                received.append(client_end.recv())
+        except Exception as e:  # 交错写坏的流
+            received.append(e)
+
+    reader = threading.Thread(target=read, daemon=True)  # 流被写坏时 recv 可能永远等下去
+    threads = [threading.Thread(target=replies, args=(start,), daemon=True) for start in (0, 1000, 2000, 3000)]
+    try:
+        reader.start()
+        for thread in threads:
+            thread.start()
+        reader.join(10)
+        assert len(received) == 200
+        assert all(error is None and result == payload for _, error, result in received)
+        assert len({request_id for request_id, _, _ in received}) == 200
+    finally:
+        connection.close()
+        client_end.close()
+        shm.close()
+        shm.unlink()
+
+
+def test_attached_ring_outlives_the_server_process():
+    import subprocess
+    import sys
+    from multiprocessing.shared_memory import SharedMemory
+
+    shm = SharedMemory(create=True, size=64)
+    try:
+        # 服务进程附加后退出，它的 resource tracker 不能删掉客户端的共享内存
+        code = f'from detector.server import attach; attach({shm.name!r}).close()'
+        done = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=30)
+        assert done.returncode == 0, done.stderr
+        assert 'leaked' not in done.stderr
+        SharedMemory(name=shm.name).close()
+    finally:
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,58 @@
+import json
+import threading
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from detector.pipeline import FrameState
+from utils.session import SessionReader, SessionRecorder
+
+
+def frame_state(image, index):
+    return FrameState((0, 0, 8, 8), image, ([], []), ([], []), {}, index)
+
+
+def test_detections_follow_the_frame_index_not_the_array(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    image = np.zeros((8, 8, 3), np.uint8)
+    first = recorder.frame((0, 0, 8, 8), image)
+    image[...] = 255  # 帧池复用同一个数组
+    second = recorder.frame((0, 0, 8, 8), image)
+    recorder.detections(frame_state(image, first))
+    recorder.decision(['1p'] * 14, '1p', None)
+    recorder.detections(frame_state(image, second))
+    recorder.click(1, 2, True)
+    recorder.close()
+
+    reader = SessionReader(str(tmp_path))
+    assert reader.decisions[0]['frame'] == first
+    assert reader.clicks[0]['frame'] == second
+    assert sorted(reader.frames) == [first, second]
+    assert reader.frame(first)[1].max() == 0
+    assert reader.frame(second)[1].min() == 255
+    reader.close()
+
+
+def test_events_from_several_threads_do_not_interleave(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    image = np.zeros((8, 8, 3), np.uint8)
+
+    def clicks():
+        for i in range(500):
+            recorder.click(i, i, True)
+
+    threads = [threading.Thread(target=clicks) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(50):
+        recorder.frame((0, 0, 8, 8), image)
+    for thread in threads:
+        thread.join()
+    recorder.close()
+
+    with open(tmp_path / 'events.jsonl', encoding='utf-8') as f:
+        events = [json.loads(line) for line in f]
+    assert sum(event['type'] == 'click' for event in events) == 2000
+    assert sum(event['type'] == 'frame' for event in events) == 50
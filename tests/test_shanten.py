@@ -0,0 +1,88 @@
+import itertools
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from strategy.shanten import SANMA_TILES, shanten, to_counts, ukeire
+
+# 暴力枚举用的牌：1m 9m、整门筒子、三元牌，完整的和牌形都能枚举出来
+KINDS = [0, 8] + list(range(9, 18)) + [31, 32, 33]
+MELDS = [(i, i, i) for i in KINDS] + [(i, i + 1, i + 2) for i in range(9, 16)]
+
+
+def complete_hands(n_sets: int):
+    """Every complete hand of n_sets mentsu and a head over KINDS (plus chiitoi when closed), as count rows"""
+    hands = set()
+    for melds in itertools.combinations_with_replacement(MELDS, n_sets):
+        for head in KINDS:
+            counts = [0] * 34
+            for tile in sum(melds, (head, head)):
+                counts[tile] += 1
+            if max(counts) <= 4:
+                hands.add(tuple(counts))
+    if n_sets == 4:
+        for pairs in itertools.combinations(KINDS, 7):
+            counts = [0] * 34
+            for tile in pairs:
+                counts[tile] = 2
+            hands.add(tuple(counts))
+    return np.array(sorted(hands), np.int8)
+
+
+@pytest.fixture(scope='module')
+def complete():
+    return {n_sets: complete_hands(n_sets) for n_sets in (3, 4)}
+
+
+def brute_shanten(counts, complete):
+    """Fewest tiles to swap for a complete hand, minus one (the definition of shanten)"""
+    hands = complete[sum(counts) // 3]
+    missing = np.maximum(hands - np.array(counts, np.int8), 0).sum(axis=1)
+    return int(missing.min()) - 1
+
+
+def random_hand(rng, size, kinds):
+    wall = [i for i in kinds for _ in range(4)]
+    counts = [0] * 34
+    for tile in rng.sample(wall, size):
+        counts[tile] += 1
+    return counts
+
+
+def brute_ukeire(counts):
+    """Draw every tile still in the wall and keep the ones that lower the shanten"""
+    base = shanten(counts)
+    total = 0
+    for j in SANMA_TILES:
+        left = 4 - counts[j]
+        if left and shanten(counts[:j] + [counts[j] + 1] + counts[j + 1:]) < base:
+            total += left
+    return total
+
+
+def test_known_hands():
+    assert shanten(to_counts(['1p', '2p', '3p', '4p', '5p', '6p', '7p', '8p', '9p', '1s', '1s', '1s', '5z', '5z'])) == -1
+    assert shanten(to_counts(['1m', '1m', '9m', '9m', '1p', '1p', '5p', '5p', '9s', '9s', '1z', '1z', '7z', '7z'])) == -1
+    assert shanten(to_counts(['1m', '9m', '1p', '9p', '1s', '9s', '1z', '2z', '3z', '4z', '5z', '6z', '7z'])) == 0
+    # 1234p单骑：等1p 4p
+    hand = to_counts(['1p', '2p', '3p', '4p', '5s', '6s', '7s', '7z', '7z', '7z', '9m', '9m', '9m'])
+    assert shanten(hand) == 0
+    assert ukeire(hand) == 3 + 3
+
+
+@pytest.mark.parametrize('size', [10, 11, 13, 14])
+def test_shanten_matches_brute_force(size, complete):
+    rng = random.Random(size)
+    for _ in range(150):
+        counts = random_hand(rng, size, KINDS)
+        assert shanten(counts) == brute_shanten(counts, complete), counts
+
+
+@pytest.mark.parametrize('size', [10, 13])
+def test_ukeire_matches_brute_force(size):
+    rng = random.Random(size)
+    for _ in range(200):
+        counts = random_hand(rng, size, SANMA_TILES)
+        assert ukeire(counts) == brute_ukeire(counts), counts
@@ -0,0 +1,106 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from detector.tracker import HandTracker
+
+LEFT, TOP, WIDTH, HEIGHT, GAP = 100, 700, 32, 44, 16
+HAND = ['1m', '2m', '3m', '4p', '5p', '6p', '7s', '8s', '9s', '1z', '1z', '2z', '3z']
+LABELS = sorted(set(HAND)) + ['4z', '5z']
+SPRITES = {tile: np.random.default_rng(i).integers(0, 256, (HEIGHT, WIDTH), dtype=np.uint8)
+           for i, tile in enumerate(LABELS)}
+
+
+def draw(hand, drawn=None):
+    """Frame with the closed hand and the drawn tile, and the tile model's detection of it"""
+    image = np.zeros((900, 1440, 3), np.uint8)
+    xyxy = []
+    lefts = [LEFT + i * WIDTH for i in range(len(hand))]
+    if drawn is not None:
+        lefts.append(LEFT + len(hand) * WIDTH + GAP)
+    for left, tile in zip(lefts, hand + ([drawn] if drawn else [])):
+        image[TOP:TOP + HEIGHT, left:left + WIDTH] = SPRITES[tile][..., np.newaxis]
+        xyxy.append([left, TOP, left + WIDTH, TOP + HEIGHT])
+    return image, xyxy
+
+
+class Model:
+    """Tile model returning the detection of whatever frame was drawn last"""
+    def __init__(self):
+        self.calls = 0
+        self.detections = {}
+
+    def frame(self, hand, drawn=None):
+        image, xyxy = draw(hand, drawn)
+        self.detections[image.tobytes()] = (xyxy, hand + ([drawn] if drawn else []))
+        return image
+
+    def __call__(self, image):
+        self.calls += 1
+        return self.detections[image.tobytes()]
+
+
+def learned(tracker=None):
+    """Tracker that saw a drawn tile (the gap) and a hand without one (the empty slot)"""
+    tracker = tracker or HandTracker()
+    model = Model()
+    tracker.track(model.frame(HAND, '5p'), model)
+    tracker.track(model.frame(HAND), model)
+    assert model.calls == 2
+    return tracker, model
+
+
+def test_unchanged_hand_is_tracked():
+    tracker, model = learned()
+    image = model.frame(HAND)
+    for _ in range(5):
+        xyxy, tiles = tracker.track(image, model)
+        assert tiles == HAND
+    assert xyxy == draw(HAND)[1]
+    assert model.calls == 2
+    assert tracker.stats() == {'full': 2, 'tracked': 5}
+
+
+def test_drawn_tile_is_classified():
+    tracker, model = learned()
+    xyxy, tiles = tracker.track(model.frame(HAND, '1m'), model)
+    assert tiles == HAND + ['1m']
+    assert xyxy[-1] == draw(HAND, '1m')[1][-1]
+    assert model.calls == 2
+
+
+def test_swapped_slot_is_reclassified():
+    tracker, model = learned()
+    hand = ['9s'] + HAND[1:]
+    assert tracker.track(model.frame(hand), model)[1] == hand
+    assert model.calls == 2
+
+
+def test_unknown_tile_falls_back_to_the_model():
+    tracker, model = learned()
+    hand = ['5z'] + HAND[1:]  # 没见过的牌
+    assert tracker.track(model.frame(hand), model)[1] == hand
+    assert model.calls == 3
+    assert tracker.track(model.frame(hand), model)[1] == hand
+    assert model.calls == 3
+
+
+def test_resync_interval_and_resync():
+    tracker, model = learned(HandTracker(resync_interval=3))
+    image = model.frame(HAND)
+    for _ in range(4):
+        tracker.track(image, model)
+    assert model.calls == 3  # 跟踪3帧后强制整体检测一次
+    tracker.resync()
+    tracker.track(image, model)
+    assert model.calls == 4
+
+
+def test_no_hand_is_not_tracked():
+    tracker, model = learned()
+    empty = np.zeros((900, 1440, 3), np.uint8)
+    model.detections[empty.tobytes()] = ([], [])
+    assert tracker.track(empty, model) == ([], [])
+    assert tracker.track(empty, model) == ([], [])
+    assert model.calls == 4
@@ -0,0 +1,285 @@
+import asyncio
+import base64
+import os
+from time import perf_counter
+
+import cv2
+import numpy as np
+from playwright.async_api import async_playwright
+
+from utils.frames import FramePool, readonly
+from utils.log import get_logger
+from utils.metrics import metrics
+from utils.render import ClipCanvas, RenderProfile, clip_rect
+from utils.window import LOGIN_CLICKS, canvas_settled, canvas_thumbnail
+
+log = get_logger(__name__)
+
+
+def _decode(data: bytes, pool: FramePool):
+    """JPEG -> read-only frame of pool in the detectors' channel order"""
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    return readonly(cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=pool.take(image.shape)))
+
+
+def _decode_part(data: bytes):
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+class AsyncScreenshotCapture:
+    def __init__(self, page, scale: float = 1.0, slots: int = 8):
+        """
+        Async ScreenshotCapture, the JPEG is decoded in a worker thread
+        Args:
+            slots: Frames of the pool; the action task may still look at a frame while the next ones
+                   are captured and detected, so it is larger than the sync capture's
+        """
+        self.page = page
+        self.scale = scale
+        self.pool = FramePool(slots)
+        self.canvas = ClipCanvas(FramePool(slots))  # 整帧和裁剪帧各用各的帧池
+
+    async def grab(self, clip=None):
+        """ScreenshotCapture.grab"""
+        if clip is None:
+            with metrics.span('screenshot'):
+                screenshot = await self.page.screenshot(type="jpeg", full_page=True)
+            with metrics.span('decode'):
+                return await asyncio.to_thread(_decode, screenshot, self.pool)
+        viewport_size = self.page.viewport_size or {'width': 1440, 'height': 900}
+        width, height = viewport_size['width'], viewport_size['height']
+        left, top, right, bottom = clip_rect(clip, width, height)  # 页面坐标
+        with metrics.span('screenshot'):
+            screenshot = await self.page.screenshot(type="jpeg", clip={'x': left, 'y': top, 'width': right - left,
+                                                                       'height': bottom - top})
+        with metrics.span('decode'):
+            part = await asyncio.to_thread(_decode_part, screenshot)
+        frame_width, frame_height = int(round(width * self.scale)), int(round(height * self.scale))
+        return self.canvas.paste(part, clip_rect(clip, frame_width, frame_height), frame_width, frame_height,
+                                 reverse=True)
+
+    async def stop(self):
+        pass
+
+
+class AsyncScreencastCapture:
+    def __init__(self, page, width: int = 1440, height: int = 900, quality: int = 80, timeout: float = 1.0,
+                 slots: int = 8):
+        """
+        Async ScreencastCapture: grab() waits for the next frame Chromium pushes instead of polling.
+        Frames are decoded into a pool of slots frames (see AsyncScreenshotCapture).
+        Call start() before grabbing.
+        """
+        self.page = page
+        self.pool = FramePool(slots)
+        self.width, self.height = width, height
+        self.quality = quality
+        self.timeout = timeout
+        self.latest = None
+        self.latest_id = 0
+        self.returned_id = 0
+        self.arrived = asyncio.Event()
+        self.clip_warned = False
+        self.cdp = None
+
+    async def start(self):
+        self.cdp = await self.page.context.new_cdp_session(self.page)
+        self.cdp.on('Page.screencastFrame', self._on_frame)
+        await self.cdp.send('Page.startScreencast', {
+            'format': 'jpeg', 'quality': self.quality, 'maxWidth': self.width, 'maxHeight': self.height,
+            'everyNthFrame': 1})
+        return self
+
+    def _on_frame(self, params):
+        self.latest = params['data']
+        self.latest_id += 1
+        self.arrived.set()
+        asyncio.ensure_future(self.cdp.send('Page.screencastFrameAck', {'sessionId': params['sessionId']}))
+
+    async def grab(self, clip=None):
+        """The next frame not returned yet, waits for the browser to push one (always whole, clip is ignored)"""
+        if clip is not None and not self.clip_warned:
+            self.clip_warned = True
+            log.warning("CAPTURE_CLIP has no effect with CAPTURE_BACKEND=screencast, whole frames are captured")
+        if self.latest_id == self.returned_id:
+            self.arrived.clear()
+            try:
+                await asyncio.wait_for(self.arrived.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                if self.latest is None:
+                    raise TimeoutError('No screencast frame received')
+                # 画面静止时浏览器不推新帧，沿用最后一帧
+        self.returned_id = self.latest_id
+        with metrics.span('decode'):
+            return await asyncio.to_thread(_decode, base64.b64decode(self.latest), self.pool)
+
+    async def stop(self):
+        try:
+            await self.cdp.send('Page.stopScreencast')
+            await self.cdp.detach()
+        except Exception as e:
+            log.warning("Error stopping screencast: %s", e)
+
+
+async def make_async_capture(page, backend: str = 'screenshot', width: int = 1440, height: int = 900,
+                             scale: float = 1.0):
+    if backend == 'screencast':
+        try:
+            return await AsyncScreencastCapture(page, width, height).start()
+        except Exception as e:
+            log.warning("Screencast unavailable, using screenshots: %s", e)
+    return AsyncScreenshotCapture(page, scale)
+
+
+async def launch_browser(headless: bool = False, render: RenderProfile = None):
+    """
+    Args:
+        render: RenderProfile whose launch flags are used, its headless setting wins over headless
+    Returns: (playwright, browser)
+    """
+    render = render or RenderProfile(headless=headless)
+    pw = await async_playwright().start()
+    browser = await pw.chromium.launch(
+        headless=render.headless,
+        args=render.launch_args(),
+        timeout=0
+    )
+    return pw, browser
+
+
+class AsyncMajsoulWindow:
+    def __init__(self, capture_backend: str = 'screenshot', browser=None, storage_state: str = '',
+                 load_timeout: float = 60, render: RenderProfile = None):
+        """
+        MajsoulWindow on Playwright's async API, call start() to launch and log in
+        Args:
+            browser: Shared browser (supervisor.py); the window then only owns its context
+            storage_state, load_timeout, render: See MajsoulWindow
+        """
+        self.render = render or RenderProfile()
+        self.scale = self.render.scale
+        self.capture_backend = capture_backend
+        self.capture = None
+        self.ws_state = None
+        self.shared_browser = browser is not None
+        self.pw, self.browser = None, browser
+        self.context = self.page = None
+        self.storage_state = storage_state
+        self.load_timeout = load_timeout
+        self.session_restored = False
+        self.logged_in = False
+        self.ready_at = None
+
+    async def start(self, account: str, password: str):
+        try:
+            if self.browser is None:
+                self.pw, self.browser = await launch_browser(render=self.render)
+            self.session_restored = bool(self.storage_state) and os.path.exists(self.storage_state)
+            self.context = await self.browser.new_context(
+                **self.render.context_options(),
+                storage_state=self.storage_state if self.session_restored else None
+            )
+            if self.render.init_script():
+                await self.context.add_init_script(self.render.init_script())
+            self.page = await self.context.new_page()
+
+            # Navigate and login
+            start = perf_counter()
+            await self.page.goto("https://game.maj-soul.com/1/")
+            log.info("Waiting for Majsoul to load...")
+            await self.wait_until_ready(self.load_timeout)
+            log.info("Majsoul ready after %.1f s", perf_counter() - start)
+            if self.session_restored:
+                log.info("Restored login session from %s", self.storage_state)
+            else:
+                await self.login(account, password)
+        except Exception as e:
+            log.error("Failed to initialize Majsoul window: %s", e)
+            await self.cleanup()
+            raise
+        return self
+
+    async def wait_until_ready(self, timeout: float = 60, interval: float = 0.5):
+        """MajsoulWindow.wait_until_ready"""
+        deadline = perf_counter() + timeout
+        canvas = self.page.locator("#layaCanvas")
+        try:
+            await canvas.wait_for(state='visible', timeout=timeout * 1000)
+            await self.page.wait_for_load_state('networkidle', timeout=max(deadline - perf_counter(), 0.001) * 1000)
+        except Exception as e:
+            log.debug("load state: %s", e)
+        previous, settled = None, 0
+        while perf_counter() < deadline:
+            thumbnail = canvas_thumbnail(await canvas.screenshot(type='jpeg', quality=50))
+            settled = settled + 1 if canvas_settled(previous, thumbnail) else 0
+            if settled >= 2:
+                self.ready_at = perf_counter()
+                return True
+            previous = thumbnail
+            await asyncio.sleep(interval)
+        log.warning("Majsoul not ready after %.0f s, continuing", timeout)
+        self.ready_at = perf_counter()
+        return False
+
+    async def login(self, account: str, password: str):
+        """Type the credentials into the login screen"""
+        await self.page.locator("html").click()
+        points = [self.render.page_point(x, y) for x, y in LOGIN_CLICKS]
+        for (x, y), text in zip(points, (account, password)):
+            await self.page.locator("#layaCanvas").click(position={"x": x, "y": y})
+            await self.page.get_by_role("textbox").wait_for(state='visible', timeout=5000)
+            await self.page.get_by_role("textbox").fill(text)
+        x, y = points[-1]
+        await self.page.locator("#layaCanvas").click(position={"x": x, "y": y})
+        self.logged_in = True
+
+    async def save_session(self):
+        """Keep the login session (cookies, local storage) for the next start"""
+        if not self.storage_state:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.storage_state) or '.', exist_ok=True)
+            await self.context.storage_state(path=self.storage_state)
+            log.info("Saved login session to %s", self.storage_state)
+        except Exception as e:
+            log.warning("Error saving login session: %s", e)
+
+    def get_box(self):
+        """(left, top, right, bottom) of the game in frame pixels, the viewport size is known without a round trip"""
+        viewport_size = self.page.viewport_size if self.page else None
+        if not viewport_size:
+            return None
+        return 0, 0, int(round(viewport_size['width'] * self.scale)), int(round(viewport_size['height'] * self.scale))
+
+    def __call__(self):
+        return self.get_box()
+
+    def alive(self) -> bool:
+        """The page is open and its browser connected (get_box only reads the cached viewport size)"""
+        return self.page is not None and not self.page.is_closed() and \
+            self.browser is not None and self.browser.is_connected()
+
+    async def grab(self, clip=None):
+        if self.capture is None:
+            _, _, width, height = self.get_box() or (0, 0, 1440, 900)
+            self.capture = await make_async_capture(self.page, self.capture_backend, width, height, self.scale)
+        return await self.capture.grab(clip)
+
+    async def cleanup(self):
+        if self.capture is not None:
+            await self.capture.stop()
+            self.capture = None
+        if self.shared_browser:
+            if self.context is not None:
+                try:
+                    await self.context.close()
+                except Exception as e:  # 浏览器已经崩溃
+                    log.warning("Error closing context: %s", e)
+                self.context = None
+            return
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+        if self.pw is not None:
+            await self.pw.stop()
+            self.pw = None
@@ -1,17 +1,52 @@
+from time import perf_counter
+
+from utils.log import get_logger
+from utils.metrics import metrics
+
+log = get_logger(__name__)
+
+
 class MyClick:
-    def __init__(self, page=None):
+    def __init__(self, page=None, recorder=None, started_at: float = None, scale: float = 1.0):
         """
         Initialize click handler with optional Playwright page
         Args:
             page: Playwright page object
+            recorder: Optional SessionRecorder every click is logged to
+            started_at: perf_counter() when the bot started, the first click logs the time since
+            scale: Frame pixels per page pixel (RenderProfile.scale), boxes are given in frame pixels
         """
         self.page = page
+        self.scale = scale
+        self.recorder = recorder
+        self.started_at = started_at
+        self.last_click = 0.0   # perf_counter() of the last click
         self.top_left_corner = (0, 0)
 
+    def first_action(self):
+        self.last_click = perf_counter()
+        if self.started_at is not None:
+            seconds = perf_counter() - self.started_at
+            self.started_at = None
+            log.info("time to first action: %.1f s", seconds)
+            metrics.observe('first_action', seconds)
+
     def set_top_left_corner(self, box):
-        """Set the top-left corner coordinates of the game window"""
+        """Set the top-left corner coordinates of the game window (frame pixels, as returned by the window)"""
         self.top_left_corner = (box[0], box[1])
 
+    def point(self, box, center=True):
+        """Page coordinates of the center (or the top-left corner) of a box in game coordinates"""
+        if center:
+            x = (box[0] + box[2]) // 2 + self.top_left_corner[0]
+            y = (box[1] + box[3]) // 2 + self.top_left_corner[1]
+        else:  # click top-left corner
+            x = box[0] + self.top_left_corner[0]
+            y = box[1] + self.top_left_corner[1]
+        if self.scale != 1.0:  # 帧像素 -> 页面像素
+            x, y = x / self.scale, y / self.scale
+        return x, y
+
     def click(self, box, click=True, center=True) -> None:
         """
         Move to and optionally click at the specified coordinates
@@ -20,17 +55,81 @@ class MyClick:
             click: Whether to perform click action
             center: Whether to click at center of box (True) or top-left corner (False)
         """
-        if center:
-            x = (box[0] + box[2]) // 2 + self.top_left_corner[0]
-            y = (box[1] + box[3]) // 2 + self.top_left_corner[1]
-        else:  # click top-left corner
-            x = box[0] + self.top_left_corner[0]
-            y = box[1] + self.top_left_corner[1]
+        x, y = self.point(box, center)
 
+        if self.recorder is not None:
+            self.recorder.click(x, y, click)
         if self.page:
-            self.page.mouse.move(x, y)
-            if click:
-                print('click x = %d, y = %d' % (x, y))
-                self.page.mouse.click(x, y)
+            with metrics.span('mouse'):
+                self.page.mouse.move(x, y)
+                if click:
+                    log.debug('click x = %d, y = %d', x, y)
+                    metrics.count('clicks')
+                    self.page.mouse.click(x, y)
+                    self.first_action()
         else:
-            print("Warning: No Playwright page available for clicking")
+            log.warning("No Playwright page available for clicking")
+
+
+class AsyncClick(MyClick):
+    async def click(self, box, click=True, center=True) -> None:
+        """
+        MyClick.click on Playwright's async API; mouse.click moves and clicks in one call
+        instead of awaiting a separate move first
+        """
+        x, y = self.point(box, center)
+        if self.recorder is not None:
+            self.recorder.click(x, y, click)
+        if not self.page:
+            log.warning("No Playwright page available for clicking")
+            return
+        with metrics.span('mouse'):
+            if click:
+                log.debug('click x = %d, y = %d', x, y)
+                metrics.count('clicks')
+                await self.page.mouse.click(x, y)
+                self.first_action()
+            else:
+                await self.page.mouse.move(x, y)
+
+
+class HandLayout:
+    def __init__(self):
+        """
+        Where the client draws every slot of the hand, learned from a vision detection,
+        so a hand known from the game messages can be clicked without detecting it
+        """
+        self.left = None     # 第一张牌的左边
+        self.top = self.bottom = None
+        self.pitch = None    # 相邻两张牌左边的间距
+        self.width = None
+        self.gap = 0         # 摸到的牌多出来的间隔
+
+    def ready(self) -> bool:
+        return self.pitch is not None
+
+    def calibrate(self, xyxy_tiles, drawn: bool) -> bool:
+        """
+        Args:
+            xyxy_tiles: Boxes of a detected hand, left to right
+            drawn: Whether the last box is a just drawn tile
+        Returns: whether the layout was (re)learned
+        """
+        closed = xyxy_tiles[:-1] if drawn else xyxy_tiles
+        if len(closed) < 4:
+            return False
+        lefts = sorted(box[0] for box in closed)
+        pitches = sorted(b - a for a, b in zip(lefts, lefts[1:]))
+        self.pitch = pitches[len(pitches) // 2]
+        self.left = lefts[0]
+        self.top = sorted(box[1] for box in closed)[len(closed) // 2]
+        self.bottom = sorted(box[3] for box in closed)[len(closed) // 2]
+        self.width = sorted(box[2] - box[0] for box in closed)[len(closed) // 2]
+        if drawn:
+            self.gap = max(0, xyxy_tiles[-1][0] - lefts[-1] - self.pitch)
+        return True
+
+    def box(self, index: int, n_closed: int):
+        """Box of slot index in a hand of n_closed tiles, index == n_closed is the drawn tile"""
+        left = self.left + index * self.pitch + (self.gap if index >= n_closed else 0)
+        return [left, self.top, left + self.width, self.bottom]
@@ -0,0 +1,72 @@
+"""
+Frame buffers reused from capture to capture.
+
+Captures decode into the slots of a FramePool and hand out read-only views of them, so every
+detector can share one frame without copying it; a detector that needs a modified image (OCR
+with the board blanked) builds it in a MaskedScratch instead of writing into the frame.
+"""
+import threading
+
+import numpy as np
+
+
+def readonly(array):
+    """A view of array that raises on any write, array itself stays writable"""
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class FramePool:
+    def __init__(self, slots: int = 4):
+        """
+        Preallocated frames handed out round robin
+        Args:
+            slots: Number of frames; a frame is overwritten slots takes later, so slots must exceed
+                   the frames alive at once (the pipeline holds the handled, the detected and the
+                   captured frame)
+        """
+        self.slots = slots
+        self.frames = []
+        self.index = 0
+        self.lock = threading.Lock()
+
+    def take(self, shape, dtype=np.uint8):
+        """The next frame (writable) of shape, all frames are reallocated when the shape changes"""
+        with self.lock:
+            if not self.frames or self.frames[0].shape != tuple(shape) or self.frames[0].dtype != dtype:
+                self.frames = [np.zeros(shape, dtype) for _ in range(self.slots)]
+            frame = self.frames[self.index]
+            self.index = (self.index + 1) % self.slots
+            return frame
+
+
+def pixel_rect(rect, width: int, height: int):
+    """Relative (left, top, right, bottom) -> pixels, truncated like the detectors' own crops"""
+    left, top, right, bottom = rect
+    return int(width * left), int(height * top), int(width * right), int(height * bottom)
+
+
+class MaskedScratch:
+    def __init__(self, rect):
+        """
+        Per-thread copies of frames with one rectangle blacked out. The rectangle of the scratch
+        buffer is zeroed once and never written, every call only copies the pixels around it
+        Args:
+            rect: (left, top, right, bottom) relative to the frame
+        """
+        self.rect = rect
+        self.local = threading.local()
+
+    def __call__(self, image):
+        """image with rect blacked out, valid until the next call on the same thread"""
+        scratch = getattr(self.local, 'scratch', None)
+        if scratch is None or scratch.shape != image.shape or scratch.dtype != image.dtype:
+            scratch = self.local.scratch = np.zeros_like(image)
+        height, width = image.shape[:2]
+        left, top, right, bottom = pixel_rect(self.rect, width, height)
+        scratch[:top] = image[:top]
+        scratch[bottom:] = image[bottom:]
+        scratch[top:bottom, :left] = image[top:bottom, :left]
+        scratch[top:bottom, right:] = image[top:bottom, right:]
+        return scratch
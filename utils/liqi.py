@@ -0,0 +1,281 @@
+"""
+Incremental decoder of the game's WebSocket messages (the "liqi" protobuf protocol).
+
+Only the handful of messages and fields the bot needs are decoded, straight from the
+protobuf wire format, so no .proto / liqi.json is required:
+
+    frame   = type (1 notify, 2 request, 3 response) [+ uint16 index] + Wrapper{name=1, data=2}
+    action  = .lq.ActionPrototype{step=1, name=2, data=3 (XOR obfuscated)}
+"""
+from time import perf_counter
+
+NOTIFY, REQUEST, RESPONSE = 1, 2, 3
+
+# OptionalOperation.type
+DISCARD, CHI, PENG, ANGANG, MINGGANG, JIAGANG, LIQI, ZIMO, HU, JIUZHONGJIUPAI, BABEI = range(1, 12)
+
+XOR_KEYS = (0x84, 0x5e, 0x4e, 0x42, 0x39, 0xa2, 0x1f, 0x60, 0x1c)
+SUIT_ORDER = {'m': 0, 'p': 1, 's': 2, 'z': 3}
+
+
+def read_varint(buf, pos: int):
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def parse_fields(buf) -> dict:
+    """Protobuf message -> {field number: [raw values]}, varints as int, length-delimited as bytes"""
+    fields = {}
+    pos = 0
+    while pos < len(buf):
+        key, pos = read_varint(buf, pos)
+        wire = key & 7
+        if wire == 0:
+            value, pos = read_varint(buf, pos)
+        elif wire == 2:
+            length, pos = read_varint(buf, pos)
+            value = bytes(buf[pos:pos + length])
+            pos += length
+        elif wire == 1:
+            value, pos = bytes(buf[pos:pos + 8]), pos + 8
+        elif wire == 5:
+            value, pos = bytes(buf[pos:pos + 4]), pos + 4
+        else:
+            raise ValueError(f'unsupported wire type {wire}')
+        fields.setdefault(key >> 3, []).append(value)
+    return fields
+
+
+def ints(values) -> list:
+    """Repeated integer field, packed (bytes) or not"""
+    result = []
+    for value in values:
+        if isinstance(value, bytes):
+            pos = 0
+            while pos < len(value):
+                number, pos = read_varint(value, pos)
+                result.append(number)
+        else:
+            result.append(value)
+    return result
+
+
+def strings(values) -> list:
+    return [value.decode('utf-8') for value in values]
+
+
+def first(fields: dict, number: int, default=None):
+    values = fields.get(number)
+    return values[0] if values else default
+
+
+def decode_action(data: bytes) -> bytes:
+    """Undo the XOR obfuscation of ActionPrototype.data"""
+    data = bytearray(data)
+    for i in range(len(data)):
+        data[i] ^= ((23 ^ len(data)) + 5 * i + XOR_KEYS[i % len(XOR_KEYS)]) & 0xff
+    return bytes(data)
+
+
+def tile_key(tile: str):
+    """Order of the tiles in the client's hand, red fives ('0p') sort as fives"""
+    return SUIT_ORDER[tile[1]], int(tile[0]) or 5
+
+
+class GameModel:
+    def __init__(self):
+        """
+        Hand, round and prompt of our seat, rebuilt from the game's WebSocket messages.
+        valid stays False until a round start was seen (e.g. after a reconnect),
+        callers fall back to vision meanwhile.
+        """
+        self.pending = {}        # request index -> method name, to know what a response answers
+        self.account_id = None
+        self.seat = None
+        self.hand = []           # 手牌（不含副露），摸到的牌在最后
+        self.drawn = None        # 刚摸到的牌，副露后为 None
+        self.round = {}
+        self.doras = []
+        self.last_discard = None  # 别家最后打出的牌，鸣牌提示时就是能鸣的那张
+        self.operations = {}     # type -> [combination] we may do now
+        self.phase = 'idle'      # idle / playing / round_end / game_end
+        self.valid = False
+        self.version = 0
+        self.updated = 0.0       # perf_counter of the last change
+
+    def feed(self, payload) -> bool:
+        """
+        Decode one WebSocket frame
+        Returns: whether the model changed
+        """
+        if isinstance(payload, str) or len(payload) < 1:
+            return False
+        kind = payload[0]
+        if kind == NOTIFY:
+            wrapper = parse_fields(payload[1:])
+            return self._notify(first(wrapper, 1, b'').decode('utf-8'), first(wrapper, 2, b''))
+        if kind not in (REQUEST, RESPONSE) or len(payload) < 3:
+            return False
+        index = payload[1] | payload[2] << 8
+        wrapper = parse_fields(payload[3:])
+        if kind == REQUEST:
+            name = first(wrapper, 1, b'').decode('utf-8')
+            self.pending[index] = name
+            if name == '.lq.FastTest.authGame':
+                self.account_id = first(parse_fields(first(wrapper, 2, b'')), 1)
+            return False
+        return self._response(self.pending.pop(index, ''), first(wrapper, 2, b''))
+
+    def _response(self, name: str, data: bytes) -> bool:
+        if name == '.lq.FastTest.authGame':
+            seats = ints(parse_fields(data).get(2, []))
+            if self.account_id in seats:
+                self.seat = seats.index(self.account_id)
+            return False
+        if name in ('.lq.FastTest.syncGame', '.lq.FastTest.enterGame'):
+            # 断线重连恢复的局面不解码，等下一局开始前交给视觉
+            self.valid = False
+            self._changed()
+            return True
+        return False
+
+    def _notify(self, name: str, data: bytes) -> bool:
+        if name == '.lq.ActionPrototype':
+            action = parse_fields(data)
+            return self._action(first(action, 2, b'').decode('utf-8'), decode_action(first(action, 3, b'')))
+        if name in ('.lq.NotifyGameEndResult', '.lq.NotifyGameTerminate'):
+            self.phase = 'game_end'
+            self.valid = False
+            self.operations = {}
+            self._changed()
+            return True
+        return False
+
+    def _action(self, name: str, data: bytes) -> bool:
+        fields = parse_fields(data)
+        handler = getattr(self, '_' + name, None)
+        if handler is None:
+            return False
+        handler(fields)
+        self._changed()
+        return True
+
+    def _changed(self):
+        self.version += 1
+        self.updated = perf_counter()
+
+    def _set_operations(self, fields: dict, number: int):
+        """OptionalOperationList, only ever sent to the seat it is for"""
+        self.operations = {}
+        operation_list = first(fields, number)
+        if operation_list is None:
+            return
+        for operation in parse_fields(operation_list).get(2, []):
+            operation = parse_fields(operation)
+            self.operations[first(operation, 1, 0)] = strings(operation.get(2, []))
+
+    def _remove(self, tile: str, count: int = 1):
+        """Remove tiles, an equal tile (red / normal five) if the exact one is not in hand"""
+        for _ in range(count):
+            if tile in self.hand:
+                self.hand.remove(tile)
+                continue
+            for held in self.hand:
+                if tile_key(held) == tile_key(tile):
+                    self.hand.remove(held)
+                    break
+
+    def _mine(self, fields: dict) -> bool:
+        return self.seat is not None and first(fields, 1, 0) == self.seat
+
+    def _ActionNewRound(self, fields):
+        self.round = {'chang': first(fields, 1, 0), 'ju': first(fields, 2, 0), 'ben': first(fields, 3, 0),
+                      'left': first(fields, 13, 0)}
+        self.hand = sorted(strings(fields.get(4, [])), key=tile_key)
+        self.drawn = None
+        self.last_discard = None
+        self.doras = strings(fields.get(14, [])) or strings(fields.get(5, []))
+        if len(self.hand) % 3 == 2:  # 亲家配牌就是14张
+            self.seat = self.round['ju']
+            self.drawn = self.hand[-1]
+        self._set_operations(fields, 7)
+        self.phase = 'playing'
+        self.valid = True
+
+    def _ActionDealTile(self, fields):
+        tile = first(fields, 2, b'').decode('utf-8')
+        if tile:  # 只有自己摸的牌才看得到
+            self.seat = first(fields, 1, 0)
+            self.hand = sorted(self.hand, key=tile_key) + [tile]
+            self.drawn = tile
+        self.last_discard = None
+        self.round['left'] = first(fields, 3, self.round.get('left', 0))
+        self.doras = strings(fields.get(6, [])) or self.doras
+        self._set_operations(fields, 4)
+
+    def _ActionDiscardTile(self, fields):
+        if self._mine(fields):
+            self._remove(first(fields, 2, b'').decode('utf-8'))
+            self.hand.sort(key=tile_key)
+            self.drawn = None
+        else:
+            self.last_discard = first(fields, 2, b'').decode('utf-8')
+        self.doras = strings(fields.get(8, [])) or self.doras
+        self._set_operations(fields, 4)
+
+    def _ActionChiPengGang(self, fields):
+        if self._mine(fields):
+            for tile, source in zip(strings(fields.get(3, [])), ints(fields.get(4, []))):
+                if source == self.seat:
+                    self._remove(tile)
+            self.hand.sort(key=tile_key)
+            self.drawn = None
+        self._set_operations(fields, 6)
+
+    def _ActionAnGangAddGang(self, fields):
+        if self._mine(fields):
+            tile = first(fields, 3, b'').decode('utf-8')
+            self._remove(tile, 4 if first(fields, 2, 0) == 3 else 1)  # 3 暗杠，2 加杠
+            self.hand.sort(key=tile_key)
+            self.drawn = None
+        self._set_operations(fields, 4)
+
+    def _ActionBaBei(self, fields):
+        if self._mine(fields):
+            self._remove('4z')
+            self.hand.sort(key=tile_key)
+            self.drawn = None
+        self._set_operations(fields, 2)
+
+    def _round_over(self, fields):
+        self.operations = {}
+        self.drawn = None
+        self.phase = 'round_end'
+
+    _ActionHule = _ActionNoTile = _ActionLiuJu = _round_over
+
+    def discard_prompt(self) -> bool:
+        """It is our turn to discard"""
+        return self.valid and self.phase == 'playing' and DISCARD in self.operations
+
+    def call_prompt(self) -> bool:
+        """Another seat's discard can be called"""
+        return self.valid and self.phase == 'playing' and self.last_discard is not None and \
+            any(op in self.operations for op in (CHI, PENG, MINGGANG))
+
+    def winds(self):
+        """(round wind, seat wind), 0 east, 1 south, 2 west; the seat wind is None until our seat is known"""
+        seat_wind = (self.seat - self.round.get('ju', 0)) % 3 if self.seat is not None else None
+        return self.round.get('chang', 0), seat_wind
+
+    def closed(self) -> list:
+        """Hand without the drawn tile, in the client's order"""
+        if self.drawn is None:
+            return list(self.hand)
+        return self.hand[:-1]
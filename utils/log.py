@@ -0,0 +1,69 @@
+"""
+Leveled, rate-limited logging for the per-frame debug output.
+
+    log = get_logger(__name__)
+    log.debug('RGB: %.1f, %.1f, %.1f', r, g, b)   # formatted only if it passes level and rate limit
+
+Every distinct message (its format string) is let through at most `rate` times per second,
+the number of suppressed repeats is appended to the next one that passes.
+"""
+import logging
+import threading
+from time import monotonic
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, rate: float = 2.0, burst: int = 5):
+        """Token bucket per message format: `rate` messages per second, bursts of up to `burst`"""
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}   # (logger, msg) -> [tokens, last update, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.msg = f'{record.msg} (+{suppressed} suppressed)'
+        return True
+
+
+_configured = False
+
+
+def setup(level: str = 'INFO', rate: float = 2.0):
+    """Configure the 'majsoulbot' logger tree once, later calls only change level and rate"""
+    global _configured
+    root = logging.getLogger('majsoulbot')
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+    if not _configured:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s %(name)s: %(message)s'))
+        handler.addFilter(RateLimitFilter(rate))
+        root.addHandler(handler)
+        root.propagate = False
+        _configured = True
+    else:
+        for handler in root.handlers:
+            for f in handler.filters:
+                if isinstance(f, RateLimitFilter):
+                    f.rate = rate
+    return root
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger('majsoulbot.' + name.rsplit('.', 1)[-1])
@@ -0,0 +1,190 @@
+"""
+Stage timings, counters and a sampling profiler of the game loop.
+
+    with metrics.span('detect_tiles'):
+        ...
+    metrics.count('clicks')
+    metrics.serve(9100)   # GET /metrics (Prometheus text), /json, /profile, /profile/start, /profile/stop
+
+Spans recorded in PIPELINE_MODE=process workers stay in the worker processes.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+
+
+class Histogram:
+    def __init__(self, window: int = 2048):
+        """Rolling latency histogram over the last `window` samples, plus lifetime count and sum"""
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentiles(self, qs=(0.5, 0.95, 0.99)) -> dict:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in qs}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in qs}
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        """
+        Sample the stack of one thread every interval seconds from a background thread,
+        costs the sampled thread nothing but the GIL switches
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread = None
+        self.running = False
+        self.target = None
+
+    def start(self, thread_id: int = None):
+        if self.running:
+            return
+        self.target = thread_id or threading.main_thread().ident
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _sample(self):
+        while self.running:
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+            sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """Collapsed stacks ('a;b;c count' per line), the input format of flamegraph.pl / speedscope"""
+        return '\n'.join(f'{stack} {n}' for stack, n in self.stacks.most_common()) + '\n'
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self.profiler = SamplingProfiler()
+        self.server = None
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the block into the histogram `name`"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start)
+
+    def timed(self, name: str):
+        """Decorator form of span"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name: str, seconds: float):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] += n
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            stages = {}
+            for name, histogram in self.histograms.items():
+                p = histogram.percentiles()
+                stages[name] = {'count': histogram.count, 'sum': histogram.total,
+                                'p50': p[0.5], 'p95': p[0.95], 'p99': p[0.99]}
+            return {'stages': stages, 'counters': dict(self.counters)}
+
+    def prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = ['# TYPE majsoulbot_stage_seconds summary']
+        for name, stage in sorted(snapshot['stages'].items()):
+            for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                lines.append(f'majsoulbot_stage_seconds{{stage="{name}",quantile="{quantile}"}} {stage[key]:.6f}')
+            lines.append(f'majsoulbot_stage_seconds_sum{{stage="{name}"}} {stage["sum"]:.6f}')
+            lines.append(f'majsoulbot_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+        lines.append('# TYPE majsoulbot_events_total counter')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'majsoulbot_events_total{{event="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """One line per stage, for the console"""
+        return '\n'.join(f'{name:>20}: n={s["count"]} p50={s["p50"] * 1000:.1f}ms p95={s["p95"] * 1000:.1f}ms '
+                         f'p99={s["p99"] * 1000:.1f}ms' for name, s in sorted(self.snapshot()['stages'].items()))
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """Serve the metrics over HTTP from a daemon thread, once per process"""
+        if self.server is not None:
+            return self.server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = metrics.prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/json':
+                    body, content_type = json.dumps(metrics.snapshot(), indent=1), 'application/json'
+                elif self.path == '/profile':
+                    body, content_type = metrics.profiler.collapsed(), 'text/plain'
+                elif self.path in ('/profile/start', '/profile/stop'):
+                    metrics.profiler.start() if self.path.endswith('start') else metrics.profiler.stop()
+                    body, content_type = f'profiler running: {metrics.profiler.running}\n', 'text/plain'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True).start()
+        return self.server
+
+    def shutdown(self):
+        self.profiler.stop()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+metrics = Metrics()
@@ -0,0 +1,170 @@
+"""
+How the game's Chromium renders and what part of it is captured.
+
+A RenderProfile picks headless or headed mode, the viewport, the device scale factor (the canvas
+is drawn and captured at viewport * scale pixels), a frame-rate cap for the game's render loop,
+and software-rendering flags for hosts without a GPU. Frames, detections and MyClick boxes are in
+captured pixels; MyClick divides by the scale to get page coordinates.
+
+Capture clips restrict the screenshot to a rectangle of the game per state, e.g. only the hand
+and the button bar while waiting for the others. The clipped pixels are pasted into a full-size
+frame (black elsewhere), so detectors and clicks keep their coordinates.
+"""
+from utils.frames import FramePool, readonly
+
+GAME_WIDTH, GAME_HEIGHT = 1440, 900   # LOGIN_CLICKS 等坐标按这个大小量的
+
+# Chromium没有GPU时用SwiftShader渲染WebGL，关掉GPU合成和平滑滚动省去多余的软件合成
+SOFTWARE_ARGS = ('--disable-gpu-compositing', '--use-angle=swiftshader', '--enable-unsafe-swiftshader',
+                 '--disable-smooth-scrolling', '--disable-background-timer-throttling')
+
+RENDER_PROFILES = {
+    'default': {},                                                          # 原来的有界面1440x900
+    'headless': {'headless': True},
+    'low': {'headless': True, 'scale': 0.75, 'fps': 30, 'software': True},
+    'minimal': {'headless': True, 'scale': 0.5, 'fps': 15, 'software': True},
+}
+
+# requestAnimationFrame 限速：同一帧内的回调照常执行，间隔不够的推迟到下一次
+FPS_CAP_SCRIPT = """
+(() => {
+    const interval = 1000 / %(fps)f;
+    const raf = window.requestAnimationFrame.bind(window);
+    let current = -1, next = 0;
+    window.requestAnimationFrame = callback => raf(function tick(t) {
+        if (t !== current && t < next) {
+            return raf(tick);
+        }
+        if (t !== current) {
+            current = t;
+            next = t + interval - 1;
+        }
+        callback(t);
+    });
+})();
+"""
+
+
+class RenderProfile:
+    def __init__(self, headless: bool = False, width: int = GAME_WIDTH, height: int = GAME_HEIGHT,
+                 scale: float = 1.0, fps: float = 0, software: bool = False):
+        """
+        How the game's Chromium renders
+        Args:
+            headless: Run Chromium without a window
+            width, height: Viewport in page (CSS) pixels, the game lays itself out to fit
+            scale: Device scale factor, frames are width * scale by height * scale pixels
+            fps: Cap of the game's requestAnimationFrame loop, 0 leaves it at the display rate
+            software: Add the software-rendering flags (SOFTWARE_ARGS)
+        """
+        if scale <= 0:
+            raise ValueError(f'render scale must be positive, got {scale}')
+        self.headless = headless
+        self.width, self.height = width, height
+        self.scale = scale
+        self.fps = fps
+        self.software = software
+
+    @classmethod
+    def named(cls, name: str, **overrides):
+        """Profile of RENDER_PROFILES, settings that are not None in overrides replace its own"""
+        if name not in RENDER_PROFILES:
+            raise ValueError(f'unknown render profile {name!r}, one of: {", ".join(RENDER_PROFILES)}')
+        settings = dict(RENDER_PROFILES[name])
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**settings)
+
+    def default(self) -> bool:
+        """The original headed full-size window, launched exactly as before"""
+        return self.scale == 1.0 and (self.width, self.height) == (GAME_WIDTH, GAME_HEIGHT) and not self.headless
+
+    def launch_args(self) -> list:
+        args = [f'--window-size={self.width},{self.height + 20}']
+        if self.software:
+            args += SOFTWARE_ARGS
+        return args
+
+    def context_options(self) -> dict:
+        """Viewport arguments of browser.new_context"""
+        if self.default():
+            # 有界面时沿用窗口大小，不做视口模拟
+            return {'viewport': {'width': self.width, 'height': self.height}, 'no_viewport': True}
+        return {'viewport': {'width': self.width, 'height': self.height}, 'device_scale_factor': self.scale}
+
+    def init_script(self):
+        """Script run in the page before the game, None when nothing has to be injected"""
+        return FPS_CAP_SCRIPT % {'fps': self.fps} if self.fps > 0 else None
+
+    def frame_size(self):
+        """(width, height) of a captured frame"""
+        return int(round(self.width * self.scale)), int(round(self.height * self.scale))
+
+    def page_point(self, x: float, y: float):
+        """Page coordinates of a point measured on the 1440x900 game (LOGIN_CLICKS)"""
+        return x * self.width / GAME_WIDTH, y * self.height / GAME_HEIGHT
+
+
+def render_profile_from_config(config) -> RenderProfile:
+    """RenderProfile from RENDER_PROFILE, with RENDER_HEADLESS / RENDER_SCALE / RENDER_FPS overriding it"""
+    return RenderProfile.named(config.RENDER_PROFILE, headless=config.RENDER_HEADLESS,
+                               scale=config.RENDER_SCALE, fps=config.RENDER_FPS)
+
+
+def parse_clips(text: str, states) -> dict:
+    """
+    'in_game=0,0.55,1,1;our_turn=0,0.55,1,1' -> {IN_GAME: (0, 0.55, 1, 1), ...}
+    Args:
+        states: Valid state names
+    Returns: dict state -> (left, top, right, bottom) relative to the frame
+    """
+    clips = {}
+    for item in text.split(';'):
+        if not item.strip():
+            continue
+        state, _, rect = item.partition('=')
+        state = state.strip().lower()
+        if state not in states:
+            raise ValueError(f'CAPTURE_CLIP: unknown state {state!r}, one of: {", ".join(states)}')
+        values = tuple(float(v) for v in rect.split(','))
+        if len(values) != 4 or not 0 <= values[0] < values[2] <= 1 or not 0 <= values[1] < values[3] <= 1:
+            raise ValueError(f'CAPTURE_CLIP: {state} needs left,top,right,bottom within 0..1, got {rect!r}')
+        clips[state] = values
+    return clips
+
+
+def clip_rect(clip, width: int, height: int):
+    """Relative clip -> (left, top, right, bottom) in whole pixels of a width x height image"""
+    left, top, right, bottom = clip
+    return int(width * left), int(height * top), int(round(width * right)), int(round(height * bottom))
+
+
+class ClipCanvas:
+    def __init__(self, pool: FramePool = None):
+        """
+        Full-size frames that clipped captures are pasted into
+        Args:
+            pool: Frames to paste into, a frame stays valid until the pool hands it out again. The pool
+                  must not be shared: rects remembers what every frame was last pasted with, a full
+                  frame decoded into one of them would leave its pixels outside the next clip
+        """
+        self.pool = pool or FramePool()
+        self.rects = {}     # 每一帧上次贴图的区域，区域不变时不用先清零
+
+    def paste(self, part, rect, width: int, height: int, reverse: bool = False):
+        """
+        Args:
+            part: The clipped pixels
+            rect: (left, top, right, bottom) they cover in the frame
+            width, height: Size of the whole frame
+            reverse: Reverse the channel order while pasting (RGB <-> BGR), saves a converted copy of part
+        Returns: width x height frame (read-only), black outside rect
+        """
+        frame = self.pool.take((height, width) + part.shape[2:], part.dtype)
+        if self.rects.get(id(frame)) != tuple(rect):
+            frame[...] = 0
+            self.rects[id(frame)] = tuple(rect)
+        left, top = rect[0], rect[1]
+        rows = min(part.shape[0], height - top)
+        cols = min(part.shape[1], width - left)
+        frame[top: top + rows, left: left + cols] = part[:rows, :cols, ::-1] if reverse else part[:rows, :cols]
+        return readonly(frame)
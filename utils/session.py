@@ -0,0 +1,160 @@
+"""
+On-disk record of a bot session, for offline replay (see benchmark/replay.py).
+
+    <session>/events.jsonl      one JSON object per line: frame / detections / decision / click
+    <session>/frames_00000.bin  PNG-compressed frames appended back to back, chunk_frames per file
+
+Frame events carry the chunk, offset and length of their PNG, so SessionReader decodes
+frames straight from memory-mapped chunks without reading whole files.
+"""
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, time
+
+import cv2
+import numpy as np
+
+
+class SessionRecorder:
+    def __init__(self, path: str = '', chunk_frames: int = 256, compression: int = 1):
+        """
+        Args:
+            path: Session directory, '' keeps the events in memory only (replay)
+            chunk_frames: Frames per chunk file
+            compression: PNG compression level, low values keep the encoder cheap
+        """
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.compression = compression
+        self.frame_count = 0
+        self.current = None              # 正在处理的帧
+        self.frame_times = OrderedDict()  # frame index -> perf_counter when captured
+        self.decisions = []
+        self.clicks = []
+        self.events = None
+        self.lock = threading.Lock()     # 主线程和写帧线程都会写事件文件
+        self.writer = None
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self.events = open(os.path.join(path, 'events.jsonl'), 'a', encoding='utf-8')
+            # PNG编码放到后台线程，不拖慢主循环
+            self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recorder')
+            self.chunk = None
+            self.chunk_index = -1
+
+    def _write(self, event: dict):
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with self.lock:
+            if self.events is not None:
+                self.events.write(line)
+
+    def _store(self, index: int, timestamp: float, box, image):
+        ok, png = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, self.compression])
+        if not ok:
+            return
+        chunk_index = index // self.chunk_frames
+        if chunk_index != self.chunk_index:
+            if self.chunk is not None:
+                self.chunk.close()
+            self.chunk = open(os.path.join(self.path, f'frames_{chunk_index:05d}.bin'), 'ab')
+            self.chunk_index = chunk_index
+        offset = self.chunk.tell()
+        self.chunk.write(png.tobytes())
+        self._write({'type': 'frame', 'frame': index, 't': timestamp, 'box': list(box),
+                     'chunk': chunk_index, 'offset': offset, 'length': int(png.size)})
+
+    def frame(self, box, image) -> int:
+        """A frame was captured, returns its index (passed back with the frame as FrameState.index)"""
+        index = self.frame_count
+        self.frame_count += 1
+        self.frame_times[index] = perf_counter()
+        while len(self.frame_times) > 8:
+            self.frame_times.popitem(last=False)
+        if self.writer is not None:
+            self.writer.submit(self._store, index, time(), tuple(box), image.copy())
+        return index
+
+    def detections(self, frame):
+        """The loop handles a FrameState, later decisions and clicks belong to it"""
+        # 帧池会复用图像数组，id(image) 不能区分帧，用随帧传递的序号
+        self.current = (frame.index, self.frame_times.get(frame.index))
+        self._write({'type': 'detections', 'frame': self.current[0],
+                     'xyxy_tiles': [[float(v) for v in box] for box in frame.xyxy_tiles], 'tiles': list(frame.tiles),
+                     'xyxy_buttons': [[float(v) for v in box] for box in frame.xyxy_buttons],
+                     'buttons': list(frame.buttons),
+                     'char_dict': {k: v if isinstance(v, bool) else [float(x) for x in v]
+                                   for k, v in frame.char_dict.items()}})
+
+    def decision(self, hand, tile, button):
+        index, captured = self.current or (None, None)
+        latency = perf_counter() - captured if captured is not None else None
+        event = {'type': 'decision', 'frame': index, 'hand': list(hand), 'tile': tile, 'button': button,
+                 'latency': latency}
+        self.decisions.append(event)
+        self._write(event)
+
+    def click(self, x, y, click: bool):
+        if not click:
+            return
+        event = {'type': 'click', 'frame': (self.current or (None,))[0], 'x': int(x), 'y': int(y)}
+        self.clicks.append(event)
+        self._write(event)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.shutdown(wait=True)
+            self.writer = None
+            if self.chunk is not None:
+                self.chunk.close()
+        with self.lock:
+            if self.events is not None:
+                self.events.close()
+                self.events = None
+
+
+class SessionReader:
+    def __init__(self, path: str):
+        self.path = path
+        self.frames = {}       # index -> frame event
+        self.detections = {}   # index -> detections event
+        self.decisions = []
+        self.clicks = []
+        with open(os.path.join(path, 'events.jsonl'), 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                kind = event['type']
+                if kind == 'frame':
+                    self.frames[event['frame']] = event
+                elif kind == 'detections':
+                    self.detections[event['frame']] = event
+                elif kind == 'decision':
+                    self.decisions.append(event)
+                elif kind == 'click':
+                    self.clicks.append(event)
+        self.maps = {}
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _map(self, chunk: int):
+        if chunk not in self.maps:
+            with open(os.path.join(self.path, f'frames_{chunk:05d}.bin'), 'rb') as f:
+                self.maps[chunk] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.maps[chunk]
+
+    def frame(self, index: int):
+        """Returns: (box, image) of a recorded frame"""
+        event = self.frames[index]
+        buffer = np.frombuffer(self._map(event['chunk']), np.uint8, event['length'], event['offset'])
+        return tuple(event['box']), cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+    def close(self):
+        for mapped in self.maps.values():
+            mapped.close()
+        self.maps = {}
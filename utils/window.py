@@ -1,60 +1,360 @@
+import base64
+import json
+import os
 import time
+import cv2
+import numpy as np
 from playwright.sync_api import sync_playwright
 
+from utils.frames import FramePool, readonly
+from utils.liqi import GameModel
+from utils.log import get_logger
+from utils.metrics import metrics
+from utils.render import ClipCanvas, RenderProfile, clip_rect
+
+log = get_logger(__name__)
+
+
+class ScreenshotCapture:
+    def __init__(self, page, scale: float = 1.0):
+        """
+        Capture frames with full-page JPEG screenshots (one round trip per frame)
+        Args:
+            page: Playwright page object
+            scale: Device scale factor of the page, frame pixels per page pixel
+        """
+        self.page = page
+        self.scale = scale
+        self.pool = FramePool()
+        self.canvas = ClipCanvas()  # 整帧和裁剪帧各用各的帧池
+
+    def grab(self, clip=None):
+        """
+        Returns the current frame (read-only, decoded into the next frame of the pool), channels in the
+        order the detectors were trained on
+        Args:
+            clip: Optional (left, top, right, bottom) relative to the frame, only that part is captured
+                  and the rest of the returned frame is black
+        """
+        if clip is None:
+            with metrics.span('screenshot'):
+                screenshot = self.page.screenshot(type="jpeg", full_page=True)
+            with metrics.span('decode'):
+                image = cv2.imdecode(np.frombuffer(screenshot, np.uint8), cv2.IMREAD_COLOR)
+                return readonly(cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=self.pool.take(image.shape)))
+        viewport_size = self.page.viewport_size or {'width': 1440, 'height': 900}
+        width, height = viewport_size['width'], viewport_size['height']
+        left, top, right, bottom = clip_rect(clip, width, height)  # 页面坐标
+        with metrics.span('screenshot'):
+            screenshot = self.page.screenshot(type="jpeg", clip={'x': left, 'y': top, 'width': right - left,
+                                                                 'height': bottom - top})
+        with metrics.span('decode'):
+            part = cv2.imdecode(np.frombuffer(screenshot, np.uint8), cv2.IMREAD_COLOR)
+            frame_width, frame_height = int(round(width * self.scale)), int(round(height * self.scale))
+            return self.canvas.paste(part, clip_rect(clip, frame_width, frame_height), frame_width, frame_height,
+                                     reverse=True)
+
+    def stop(self):
+        pass
+
+
+class ScreencastCapture:
+    def __init__(self, page, width: int = 1440, height: int = 900, ring_size: int = 4,
+                 quality: int = 80, timeout: float = 1.0):
+        """
+        Capture frames pushed by Chromium's Page.startScreencast over a CDP session
+        Args:
+            page: Playwright page object (Chromium only)
+            width, height: Frame size requested from the browser
+            ring_size: Number of pooled frames; a frame returned by grab() stays valid for ring_size - 1 more grabs
+            quality: JPEG quality of the pushed frames
+            timeout: Seconds grab() waits for the first frame before giving up
+        """
+        self.page = page
+        self.width, self.height = width, height
+        self.quality = quality
+        self.timeout = timeout
+        self.pool = FramePool(ring_size)
+        self.latest = None      # 最新一帧的JPEG（base64），只在取用时才解码
+        self.latest_id = 0
+        self.returned_id = 0
+        self.last_frame = None
+        self.clip_warned = False
+        self.cdp = page.context.new_cdp_session(page)
+        self.cdp.on('Page.screencastFrame', self._on_frame)
+        self.cdp.send('Page.startScreencast', {
+            'format': 'jpeg', 'quality': quality, 'maxWidth': width, 'maxHeight': height, 'everyNthFrame': 1})
+
+    def _on_frame(self, params):
+        self.latest = params['data']
+        self.latest_id += 1
+        self.cdp.send('Page.screencastFrameAck', {'sessionId': params['sessionId']})
+
+    def grab(self, clip=None):
+        """
+        Returns the newest pushed frame decoded into the next frame of the pool (read-only);
+        the previous frame is returned again if nothing new was pushed since.
+        clip is ignored (warned once), the browser always pushes whole frames
+        """
+        if clip is not None and not self.clip_warned:
+            self.clip_warned = True
+            log.warning("CAPTURE_CLIP has no effect with CAPTURE_BACKEND=screencast, whole frames are captured")
+        deadline = time.time() + self.timeout
+        while self.latest is None and time.time() < deadline:
+            self.page.wait_for_timeout(5)  # 让Playwright处理CDP事件
+        if self.latest is None:
+            raise TimeoutError('No screencast frame received')
+        if self.latest_id == self.returned_id:
+            self.page.wait_for_timeout(0)
+            if self.latest_id == self.returned_id:
+                return self.last_frame
+        self.returned_id = self.latest_id
+        with metrics.span('decode'):
+            buffer = np.frombuffer(base64.b64decode(self.latest), np.uint8)
+            image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+            slot = self.pool.take(image.shape)  # 页面缩放等导致尺寸变化时整个池重新分配
+            self.last_frame = readonly(cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=slot))
+        return self.last_frame
+
+    def stop(self):
+        try:
+            self.cdp.send('Page.stopScreencast')
+            self.cdp.detach()
+        except Exception as e:
+            log.warning("Error stopping screencast: %s", e)
+
+
+def make_capture(page, backend: str = 'screenshot', width: int = 1440, height: int = 900, scale: float = 1.0):
+    """
+    Create the capture backend, falling back to screenshots if the screencast cannot start
+    Args:
+        width, height: Frame size in pixels
+        scale: Device scale factor of the page
+    """
+    if backend == 'screencast':
+        try:
+            return ScreencastCapture(page, width, height)
+        except Exception as e:
+            log.warning("Screencast unavailable, using screenshots: %s", e)
+    return ScreenshotCapture(page, scale)
+
+
+class WebSocketState:
+    def __init__(self, page, url_filter: str = '', record_path: str = ''):
+        """
+        Follow the game through the messages of its WebSocket instead of the screen
+        Args:
+            page: Playwright page object, subscribed before the game connects
+            url_filter: Only sockets whose URL contains this are decoded ('' for all)
+            record_path: Optional JSON lines log of every frame, replayable by benchmark/websocket.py
+        """
+        self.page = page
+        self.url_filter = url_filter
+        self.model = GameModel()
+        self.record = open(record_path, 'a', encoding='utf-8') if record_path else None
+        self.frame_count = 0
+        self.received = 0       # perf_counter when the last frame arrived
+        self.latencies = []     # 收到消息到模型更新完成（秒）
+        page.on('websocket', self._on_websocket)
+
+    def _on_websocket(self, ws):
+        if self.url_filter not in ws.url:
+            return
+        ws.on('framereceived', lambda payload: self._on_frame(payload, 'recv'))
+        ws.on('framesent', lambda payload: self._on_frame(payload, 'send'))
+
+    def _on_frame(self, payload, direction: str):
+        if isinstance(payload, str):
+            return
+        self.received = time.perf_counter()
+        self.frame_count += 1
+        if self.record is not None:
+            self.record.write(json.dumps({'t': time.time(), 'dir': direction,
+                                          'data': base64.b64encode(payload).decode('ascii')}) + '\n')
+        try:
+            if self.model.feed(payload):
+                self.latencies.append(self.model.updated - self.received)
+                del self.latencies[:-1000]
+                metrics.observe('websocket_decode', self.model.updated - self.received)
+        except (IndexError, ValueError, UnicodeDecodeError) as e:
+            # 协议变了或者解码出错，交还给视觉
+            log.warning("WebSocket decode error: %s", e)
+            self.model.valid = False
+
+    def poll(self):
+        """Let Playwright dispatch pending WebSocket events (sync API only does so inside its calls)"""
+        self.page.wait_for_timeout(0)
+        return self.model
+
+    def stop(self):
+        if self.record is not None:
+            self.record.close()
+            self.record = None
+
+
+LOGIN_CLICKS = ((926, 214), (922, 300), (914, 465))  # 账号框、密码框、登录按钮
+
+
+def storage_state_path(template: str, account: str) -> str:
+    """Where the login session of account is kept, '' when persistence is off"""
+    if not template:
+        return ''
+    return template.format(account=''.join(c if c.isalnum() or c in '-_.@' else '_' for c in account))
+
+
+def canvas_thumbnail(jpeg: bytes):
+    """Small grayscale version of a canvas screenshot, for the readiness check"""
+    return cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8).astype(np.float32)
+
+
+def canvas_settled(previous, current, min_contrast: float = 10.0, max_change: float = 2.0) -> bool:
+    """The canvas shows something (not a blank or black loading screen) and stopped changing"""
+    if previous is None or previous.shape != current.shape:
+        return False
+    return current.std() > min_contrast and float(np.abs(current - previous).mean()) < max_change
+
+
 class MajsoulWindow:
-    def __init__(self, account: str, password: str):
-        """Initialize Majsoul window and perform login"""
+    def __init__(self, account: str, password: str, capture_backend: str = 'screenshot',
+                 state_source: str = 'vision', ws_record_path: str = '', storage_state: str = '',
+                 load_timeout: float = 60, render: RenderProfile = None):
+        """
+        Initialize Majsoul window and perform login
+        Args:
+            state_source: 'websocket' also decodes the game's WebSocket messages (self.ws_state)
+            ws_record_path: Log of the WebSocket frames, see WebSocketState
+            storage_state: File the login session is saved to and restored from; with a restored
+                           session the credentials are only typed if the game asks for them
+            load_timeout: Longest wait in seconds for the game to finish loading
+            render: RenderProfile, the headed 1440x900 window by default
+        """
+        self.render = render or RenderProfile()
+        self.scale = self.render.scale
+        self.capture_backend = capture_backend
+        self.capture = None
+        self.ws_state = None
+        self.storage_state = storage_state
+        self.session_restored = bool(storage_state) and os.path.exists(storage_state)
+        self.logged_in = False
+        self.ready_at = None
         try:
             self.pw = sync_playwright().start()
             self.browser = self.pw.chromium.launch(
-                headless=False,
-                args=['--window-size=1440,920'],
+                headless=self.render.headless,
+                args=self.render.launch_args(),
                 timeout=0
             )
             self.context = self.browser.new_context(
-                viewport={'width': 1440, 'height': 900},
-                no_viewport=True
+                **self.render.context_options(),
+                storage_state=storage_state if self.session_restored else None
             )
+            if self.render.init_script():
+                self.context.add_init_script(self.render.init_script())
             self.page = self.context.new_page()
+            if state_source == 'websocket':
+                self.ws_state = WebSocketState(self.page, 'maj-soul', ws_record_path)
             
             # Navigate and login
+            start = time.perf_counter()
             self.page.goto("https://game.maj-soul.com/1/")
-            print("Waiting for Majsoul to load...")
-            time.sleep(40)
-            self.page.locator("html").click()
-            self.page.locator("#layaCanvas").click(position={"x":926,"y":214})
-            time.sleep(0.5)
-            self.page.get_by_role("textbox").fill(account)
-            self.page.locator("#layaCanvas").click(position={"x":922,"y":300})
-            time.sleep(0.5)
-            self.page.get_by_role("textbox").fill(password)
-            self.page.locator("#layaCanvas").click(position={"x":914,"y":465})
+            log.info("Waiting for Majsoul to load...")
+            self.wait_until_ready(load_timeout)
+            log.info("Majsoul ready after %.1f s", time.perf_counter() - start)
+            if self.session_restored:
+                log.info("Restored login session from %s", storage_state)
+            else:
+                self.login(account, password)
             
         except Exception as e:
-            print(f"Failed to initialize Majsoul window: {e}")
+            log.error("Failed to initialize Majsoul window: %s", e)
             self.cleanup()
             raise
 
+    def wait_until_ready(self, timeout: float = 60, interval: float = 0.5):
+        """
+        Wait until the game finished loading instead of a fixed sleep: the network goes idle and
+        #layaCanvas shows a settled picture on two polls in a row. Gives up after timeout seconds.
+        """
+        deadline = time.perf_counter() + timeout
+        canvas = self.page.locator("#layaCanvas")
+        try:
+            canvas.wait_for(state='visible', timeout=timeout * 1000)
+            self.page.wait_for_load_state('networkidle', timeout=max(deadline - time.perf_counter(), 0.001) * 1000)
+        except Exception as e:
+            log.debug("load state: %s", e)
+        previous, settled = None, 0
+        while time.perf_counter() < deadline:
+            thumbnail = canvas_thumbnail(canvas.screenshot(type='jpeg', quality=50))
+            settled = settled + 1 if canvas_settled(previous, thumbnail) else 0
+            if settled >= 2:
+                self.ready_at = time.perf_counter()
+                return True
+            previous = thumbnail
+            time.sleep(interval)
+        log.warning("Majsoul not ready after %.0f s, continuing", timeout)
+        self.ready_at = time.perf_counter()
+        return False
+
+    def login(self, account: str, password: str):
+        """Type the credentials into the login screen"""
+        self.page.locator("html").click()
+        points = [self.render.page_point(x, y) for x, y in LOGIN_CLICKS]
+        for (x, y), text in zip(points, (account, password)):
+            self.page.locator("#layaCanvas").click(position={"x": x, "y": y})
+            self.page.get_by_role("textbox").wait_for(state='visible', timeout=5000)
+            self.page.get_by_role("textbox").fill(text)
+        x, y = points[-1]
+        self.page.locator("#layaCanvas").click(position={"x": x, "y": y})
+        self.logged_in = True
+
+    def save_session(self):
+        """Keep the login session (cookies, local storage) for the next start"""
+        if not self.storage_state:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.storage_state) or '.', exist_ok=True)
+            self.context.storage_state(path=self.storage_state)
+            log.info("Saved login session to %s", self.storage_state)
+        except Exception as e:
+            log.warning("Error saving login session: %s", e)
+
     def get_box(self):
         """Get the game window position and size
-        Returns: tuple (left, top, right, bottom)
+        Returns: tuple (left, top, right, bottom) in frame pixels (page pixels * scale)
         """
         try:
             viewport_size = self.page.viewport_size
             if viewport_size:
-                width = viewport_size['width']
-                height = viewport_size['height']
+                width = int(round(viewport_size['width'] * self.scale))
+                height = int(round(viewport_size['height'] * self.scale))
                 return (0, 0, width, height)
         except Exception as e:
-            print(f"Error getting window box: {e}")
+            log.warning("Error getting window box: %s", e)
             return None
 
     def __call__(self):
         """Magic method as shortcut for get_box"""
         return self.get_box()
 
+    def grab(self, clip=None):
+        """
+        Get the current game frame from the configured capture backend
+        Args:
+            clip: Optional (left, top, right, bottom) relative to the frame, see ScreenshotCapture.grab
+        """
+        if self.capture is None:
+            _, _, width, height = self.get_box() or (0, 0, 1440, 900)
+            self.capture = make_capture(self.page, self.capture_backend, width, height, self.scale)
+        return self.capture.grab(clip)
+
     def cleanup(self):
         """Clean up resources"""
+        if getattr(self, 'capture', None) is not None:
+            self.capture.stop()
+            self.capture = None
+        if getattr(self, 'ws_state', None) is not None:
+            self.ws_state.stop()
+            self.ws_state = None
         if hasattr(self, 'browser'):
             self.browser.close()
         if hasattr(self, 'pw'):